@@ -0,0 +1,285 @@
+"""
+A fake ARGUS Oracle XML API for load testing and benchmarking this API without calling dbforms.ga.gov.au
+
+The stub serves synthetic ROWSET XML for the two ARGUS API calls this API makes, the single survey call and the
+SearchSurveys (register) call, with injectable latency, error rate and payload size. It counts every call made to it so
+that callers can report upstream call volumes.
+
+Run it stand-alone with:
+
+    python -m _bench.argus_stub --stub-port 8099 --surveys 9200 --latency 0.2
+
+then start this API with ARGUS_API_BASE=http://127.0.0.1:8099/www/ to point it at the stub.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+# the survey ID and the 31 ARGUS survey fields, in the order the ARGUS API delivers them
+ARGUS_FIELDS = [
+    'SURVEYID', 'SURVEYNAME', 'STATE', 'OPERATOR', 'CONTRACTOR', 'PROCESSOR', 'SURVEY_TYPE', 'DATATYPES', 'VESSEL',
+    'VESSEL_TYPE', 'RELEASEDATE', 'ONSHORE_OFFSHORE', 'STARTDATE', 'ENDDATE', 'WLONG', 'ELONG', 'SLAT', 'NLAT',
+    'LINE_KM', 'TOTAL_KM', 'LINE_SPACING', 'LINE_DIRECTION', 'TIE_SPACING', 'SQUARE_KM', 'CRYSTAL_VOLUME',
+    'UP_CRYSTAL_VOLUME', 'DIGITAL_DATA', 'GEODETIC_DATUM', 'ASL', 'AGL', 'MAG_INSTRUMENT', 'RAD_INSTRUMENT'
+]
+
+STATES = ['WA', 'NT', 'SA', 'QLD', 'NSW', 'VIC', 'TAS', 'ACT']
+COMPANIES = [
+    'Kevron Geophysics Pty Ltd', 'Stockdale Prospecting Ltd.', 'Geoscience Australia', 'UTS Geophysics',
+    'Fugro Airborne Surveys', 'Aerodata Holdings Limited', 'Thomson Aviation', 'GPX Surveys', 'Daishsat',
+    'Western Mining Corporation', 'Normandy Exploration', 'Geological Survey of Western Australia'
+]
+SURVEY_TYPES = ['Detailed', 'Regional', 'Reconnaissance', 'Semi-detailed']
+DATA_TYPES = ['MAG', 'RAL', 'ELE', 'GRAV', 'EM', 'DEM']
+VESSELS = [('Aero Commander', 'Plane'), ('Cessna 210', 'Plane'), ('AS350 Squirrel', 'Helicopter'),
+           ('RV Investigator', 'Ship'), ('Land Cruiser', 'Vehicle')]
+MAG_INSTRUMENTS = ['Scintrex CS2', 'Geometrics G822A', 'Scintrex CS3', None]
+RAD_INSTRUMENTS = ['Exploranium GR820', 'RSI RS500', None]
+
+
+def synthetic_row(survey_id):
+    """
+    Makes a deterministic, realistic-looking ARGUS survey row for a given survey ID
+
+    :param survey_id: an integer survey ID
+    :return: a dict of ARGUS field name to string value, or None for an empty element
+    """
+    rnd = random.Random(survey_id)
+    w_long = rnd.uniform(113.0, 152.0)
+    s_lat = rnd.uniform(-43.0, -11.0)
+    e_long = w_long + rnd.uniform(0.1, 2.0)
+    n_lat = s_lat + rnd.uniform(0.1, 2.0)
+    start_date = datetime(1960, 1, 1) + timedelta(days=rnd.randint(0, 20000))
+    end_date = start_date + timedelta(days=rnd.randint(1, 120))
+    vessel, vessel_type = rnd.choice(VESSELS)
+    state = rnd.choice(STATES)
+    contractor = rnd.choice(COMPANIES)
+    data_types = ','.join(sorted(rnd.sample(DATA_TYPES, rnd.randint(1, 3))))
+
+    def num(value, empty_chance=0.2):
+        return None if rnd.random() < empty_chance else str(value)
+
+    return {
+        'SURVEYID': str(survey_id),
+        'SURVEYNAME': '{} Survey {}, {}, {}'.format(rnd.choice(['Goomalling', 'Kalgoorlie', 'Tennant Creek',
+                                                                'Broken Hill', 'Mount Isa', 'Gawler', 'Pilbara']),
+                                                    survey_id, state, start_date.year),
+        'STATE': state,
+        'OPERATOR': rnd.choice(COMPANIES),
+        'CONTRACTOR': contractor,
+        'PROCESSOR': contractor if rnd.random() < 0.7 else rnd.choice(COMPANIES),
+        'SURVEY_TYPE': rnd.choice(SURVEY_TYPES),
+        'DATATYPES': data_types,
+        'VESSEL': vessel,
+        'VESSEL_TYPE': vessel_type,
+        'RELEASEDATE': (end_date + timedelta(days=rnd.randint(30, 900))).strftime('%Y-%m-%dT%H:%M:%S')
+        if rnd.random() < 0.8 else None,
+        'ONSHORE_OFFSHORE': 'Offshore' if vessel_type == 'Ship' else 'Onshore',
+        'STARTDATE': start_date.strftime('%Y-%m-%dT%H:%M:%S'),
+        'ENDDATE': end_date.strftime('%Y-%m-%dT%H:%M:%S'),
+        'WLONG': '{:.6f}'.format(w_long),
+        'ELONG': '{:.6f}'.format(e_long),
+        'SLAT': '{:.6f}'.format(s_lat),
+        'NLAT': '{:.6f}'.format(n_lat),
+        'LINE_KM': num(rnd.randint(500, 90000), 0.05),
+        'TOTAL_KM': num(rnd.randint(500, 95000)),
+        'LINE_SPACING': num(rnd.choice([100, 200, 250, 400, 800])),
+        'LINE_DIRECTION': num(rnd.choice([0, 45, 90, 180])),
+        'TIE_SPACING': num(rnd.choice([1000, 2500, 5000])),
+        'SQUARE_KM': num(rnd.randint(100, 40000)),
+        'CRYSTAL_VOLUME': num(round(rnd.uniform(10, 50), 1)),
+        'UP_CRYSTAL_VOLUME': num(round(rnd.uniform(1, 10), 1)),
+        'DIGITAL_DATA': data_types,
+        'GEODETIC_DATUM': rnd.choice(['WGS84', 'GDA94', 'AGD66']),
+        'ASL': num(rnd.randint(100, 500), 0.7),
+        'AGL': num(rnd.choice([40, 60, 80, 100])),
+        'MAG_INSTRUMENT': rnd.choice(MAG_INSTRUMENTS),
+        'RAD_INSTRUMENT': rnd.choice(RAD_INSTRUMENTS),
+    }
+
+
+def rowset_xml(rows, payload_size=0):
+    """
+    Serialises ARGUS rows as the ARGUS API does, as a ROWSET XML document
+
+    :param rows: an iterable of dicts as per synthetic_row()
+    :param payload_size: a number of bytes of padding to add to the document, to simulate larger upstream payloads
+    :return: an XML string
+    """
+    parts = ['<?xml version="1.0" ?>\n<ROWSET>\n']
+    for row in rows:
+        parts.append(' <ROW>\n')
+        for field in ARGUS_FIELDS:
+            value = row.get(field)
+            if value is None:
+                parts.append('  <{}/>\n'.format(field))
+            else:
+                parts.append('  <{0}>{1}</{0}>\n'.format(field, escape(value)))
+        parts.append(' </ROW>\n')
+    if payload_size > 0:
+        parts.append('<!-- {} -->\n'.format('x' * payload_size))
+    parts.append('</ROWSET>\n')
+    return ''.join(parts)
+
+
+class ArgusStub:
+    """
+    A configurable, threaded fake ARGUS HTTP server
+
+    :param surveys: the number of surveys in the fake catalogue, with IDs 1..surveys
+    :param latency: seconds of delay added to every response
+    :param jitter: maximum seconds of uniformly random delay added on top of latency
+    :param error_rate: the fraction (0-1) of calls answered with an HTTP 500
+    :param payload_size: bytes of padding added to every XML response
+    :param host: the interface to listen on
+    :param port: the port to listen on, 0 for any free port
+    """
+    def __init__(self, surveys=9200, latency=0.0, jitter=0.0, error_rate=0.0, payload_size=0,
+                 host='127.0.0.1', port=0):
+        self.surveys = surveys
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+
+        self._calls = Counter()
+        self._lock = threading.Lock()
+        self._rnd = random.Random(0)
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """The value to use for ARGUS_API_BASE to point this API at this stub"""
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/www/'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='argus-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls(self):
+        """
+        :return: a dict of ARGUS call name ('survey', 'register', 'other', 'error') to the number of calls received
+        """
+        with self._lock:
+            return dict(self._calls)
+
+    def reset_calls(self):
+        with self._lock:
+            self._calls.clear()
+
+    def _count(self, call):
+        with self._lock:
+            self._calls[call] += 1
+
+    def _should_fail(self):
+        with self._lock:
+            return self._rnd.random() < self.error_rate
+
+    def respond(self, path, query):
+        """
+        Makes the response to an ARGUS API call
+
+        :return: a tuple of (HTTP status, body string)
+        """
+        if path.endswith('argus.argus_api.survey'):
+            self._count('survey')
+            try:
+                survey_id = int(query.get('pSurveyNo', [''])[0])
+            except ValueError:
+                survey_id = 0
+            if not 1 <= survey_id <= self.surveys:
+                return 200, 'No data found'
+            return 200, rowset_xml([synthetic_row(survey_id)], self.payload_size)
+        elif path.endswith('argus.argus_api.SearchSurveys'):
+            self._count('register')
+            page = int(query.get('pPageno', ['1'])[0])
+            per_page = int(query.get('pNoOfRecordsPerPage', ['100'])[0])
+            first = (page - 1) * per_page + 1
+            last = min(first + per_page - 1, self.surveys)
+            return 200, rowset_xml((synthetic_row(i) for i in range(first, last + 1)), self.payload_size)
+        else:
+            self._count('other')
+            return 404, 'Not found'
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay = stub.latency + (random.uniform(0, stub.jitter) if stub.jitter else 0)
+                if delay > 0:
+                    time.sleep(delay)
+
+                if stub._should_fail():
+                    stub._count('error')
+                    status, body = 500, 'Injected ARGUS error'
+                else:
+                    url = urlparse(self.path)
+                    status, body = stub.respond(url.path, parse_qs(url.query))
+
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # silent: the stub serves many thousands of calls per run
+
+        return Handler
+
+
+def add_stub_arguments(parser):
+    """Adds the ArgusStub options to an argparse parser, shared by all the _bench scripts"""
+    parser.add_argument('--surveys', type=int, default=9200, help='number of surveys in the fake catalogue')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds of upstream latency per call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='max extra random seconds of upstream latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream calls that fail')
+    parser.add_argument('--payload-size', type=int, default=0, help='bytes of padding added to upstream XML')
+    parser.add_argument('--stub-port', type=int, default=0, help='port for the fake ARGUS server, 0 for any')
+
+
+def stub_from_arguments(args):
+    return ArgusStub(
+        surveys=args.surveys,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        payload_size=args.payload_size,
+        port=args.stub_port
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a fake ARGUS Oracle XML API')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    if args.stub_port == 0:
+        args.stub_port = 8099
+
+    stub = stub_from_arguments(args).start()
+    print('Fake ARGUS API serving {} surveys at {}'.format(args.surveys, stub.base_url))
+    print('Start this API with ARGUS_API_BASE={}'.format(stub.base_url))
+    try:
+        while True:
+            time.sleep(10)
+            print('upstream calls: {}'.format(stub.calls()))
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,101 @@
+"""
+Measures the cold-start latency of a fresh app process: its startup time and the latency of its first request of each
+kind, against a fake ARGUS API (see argus_stub.py)
+
+It compares three kinds of start:
+
+ * no warm-up, empty Jinja bytecode cache (how every worker used to start)
+ * warm-up, empty Jinja bytecode cache (the first worker after a deploy)
+ * warm-up, filled Jinja bytecode cache (every later worker)
+
+Run with:
+
+    python -m _bench.coldstart --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from _bench.argus_stub import add_stub_arguments, stub_from_arguments
+
+FIRST_REQUESTS = [
+    ('survey gapd html', '/survey/{id}'),
+    ('survey prov html', '/survey/{id}?_view=prov'),
+    ('survey gapd turtle', '/survey/{id}?_format=text/turtle'),
+    ('survey gapd rdf+xml', '/survey/{id}?_format=application/rdf+xml'),
+    ('register html', '/survey/'),
+]
+
+# run in a fresh interpreter so that nothing is already imported, compiled or cached
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from app import app
+startup = time.perf_counter() - start
+client = app.test_client()
+timings = {"startup": startup}
+for name, path in json.loads(sys.argv[1]):
+    start = time.perf_counter()
+    client.get(path).get_data()
+    timings[name] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def cold_start(stub, warm_up, bytecode_cache_dir, survey_id):
+    env = dict(
+        os.environ,
+        ARGUS_API_BASE=stub.base_url,
+        WARM_UP='true' if warm_up else 'false',
+        JINJA_BYTECODE_CACHE_DIR=bytecode_cache_dir
+    )
+    reqs = [(name, path.format(id=survey_id)) for name, path in FIRST_REQUESTS]
+    out = subprocess.check_output(
+        [sys.executable, '-c', CHILD, json.dumps(reqs)],
+        cwd=dirname(dirname(abspath(__file__))),
+        env=env
+    )
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures app cold-start and first request latencies')
+    add_stub_arguments(parser)
+    parser.add_argument('--runs', type=int, default=3, help='number of cold starts of each kind, medians reported')
+    parser.set_defaults(latency=0.0)
+    args = parser.parse_args()
+
+    stub = stub_from_arguments(args).start()
+    cache_dir = tempfile.mkdtemp(prefix='surveys-jinja-')
+    scenarios = [
+        ('no warm-up, no bytecode cache', False, True),
+        ('warm-up, empty bytecode cache', True, True),
+        ('warm-up, filled bytecode cache', True, False),
+    ]
+    results = {}
+    try:
+        for label, warm_up, empty_cache in scenarios:
+            runs = []
+            for i in range(args.runs):
+                if empty_cache:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                runs.append(cold_start(stub, warm_up, cache_dir, survey_id=i + 1))
+            results[label] = {k: sorted(r[k] for r in runs)[len(runs) // 2] for k in runs[0]}
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        stub.stop()
+
+    columns = ['startup'] + [name for name, _ in FIRST_REQUESTS]
+    print('\nmedian of {} cold starts, ms'.format(args.runs))
+    print('{:<32}'.format('') + ''.join('{:>22}'.format(c) for c in columns) + '{:>22}'.format('first requests'))
+    for label, _, _ in scenarios:
+        r = results[label]
+        print('{:<32}'.format(label)
+              + ''.join('{:>22.1f}'.format(r[c] * 1000) for c in columns)
+              + '{:>22.1f}'.format(sum(r[c] for c in columns[1:]) * 1000))
@@ -0,0 +1,68 @@
+"""
+Measures the throughput of the bulk N-Triples/N-Quads export (see model/export.py) over a synthetic catalogue of
+realistic-looking surveys (see argus_stub.py)
+
+Run with:
+
+    python -m _bench.export --surveys 100000 --workers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from _bench.argus_stub import synthetic_row
+from model import catalogue, export
+
+
+def synthetic_catalogue(surveys, path):
+    """
+    Writes a catalogue snapshot of synthetic surveys
+
+    :param surveys: the number of surveys
+    :param path: the snapshot file
+    """
+    records = []
+    for survey_id in range(1, surveys + 1):
+        record = {}
+        for tag, text in synthetic_row(survey_id).items():
+            attr, kind = catalogue.SURVEY_FIELDS_BY_TAG[tag]
+            record[attr] = catalogue.parse_value(text, kind)
+        records.append(record)
+    catalogue.write_snapshot(records, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures bulk RDF export throughput')
+    parser.add_argument('--surveys', type=int, default=100000, help='number of synthetic surveys')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='export processes, 0 for none')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--format', choices=sorted(export.MIMETYPES), default='nt')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='surveys-export-')
+    try:
+        snapshot_path = os.path.join(tmp, 'surveys.snapshot')
+        start = time.perf_counter()
+        synthetic_catalogue(args.surveys, snapshot_path)
+        print('Made a catalogue of {:,} synthetic surveys in {:.1f}s'.format(
+            args.surveys, time.perf_counter() - start))
+
+        output = os.path.join(tmp, 'surveys.{}.gz'.format(args.format))
+        start = time.perf_counter()
+        triples = export.write_export(output, snapshot_path, quads=args.format == 'nq', workers=args.workers,
+                                      chunk_size=args.chunk_size)
+        seconds = time.perf_counter() - start
+
+        print('Exported {:,} surveys, {:,} {} in {:.1f}s with {} worker processes'.format(
+            args.surveys, triples, 'quads' if args.format == 'nq' else 'triples', seconds, args.workers))
+        print('{:>14,.0f} triples/s'.format(triples / seconds))
+        print('{:>14,.0f} surveys/s'.format(args.surveys / seconds))
+        print('{:>14,} bytes gzipped, {:.1f} bytes/triple'.format(
+            os.path.getsize(output), os.path.getsize(output) / triples))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,118 @@
+"""
+Checks the JSON-LD of the survey and entity views written by model/jsonld.py against rdflib's json-ld serialization of
+the same views, and times the surveys', over a synthetic catalogue of realistic-looking surveys (see argus_stub.py)
+
+Every survey's JSON-LD, in every view, is parsed with its context and must be isomorphic to the view's rdflib Graph.
+Some surveys have their agents, platform, instruments and dates blanked, to check the documents' optional parts, and
+entities are made from the surveys' names and corners, some with no name or location.
+
+Run with:
+
+    python -m _bench.jsonld --surveys 2000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from rdflib import Graph
+from rdflib.compare import isomorphic
+from _bench.export import synthetic_catalogue
+from model import catalogue, jsonld
+from model.entity import EntityRenderer
+from model.survey import SurveyRenderer
+
+# the fields blanked in every nth survey
+BLANKED = {
+    3: ('contractor', 'vessel_type'),
+    5: ('mag_instrument', 'operator'),
+    7: ('mag_instrument', 'rad_instrument', 'start_date'),
+    11: ('processor', 'vessel', 'end_date'),
+}
+
+
+def surveys(snapshot):
+    """
+    :return: a generator of SurveyRenderers of every survey in a snapshot, some with fields blanked
+    """
+    for i, record in enumerate(snapshot):
+        survey = SurveyRenderer.from_record(record)
+        for n, attrs in BLANKED.items():
+            if i % n == n - 1:
+                for attr in attrs:
+                    setattr(survey, attr, None)
+        yield survey
+
+
+def entities(snapshot):
+    """
+    :return: a generator of EntityRenderers, with records made from the surveys in a snapshot
+    """
+    for i, record in enumerate(snapshot):
+        entity = EntityRenderer(record.survey_id)
+        entity.__dict__['record'] = {
+            'eno': record.survey_id,
+            'entity_name': record.survey_name if i % 3 else None,
+            'srid': 8311 if i % 4 else None,
+            'x': record.w_long if i % 5 else None,
+            'y': record.n_lat,
+            'z': record.agl,
+        }
+        yield entity
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks and times the surveys\' JSON-LD against rdflib\'s')
+    parser.add_argument('--surveys', type=int, default=2000, help='number of synthetic surveys')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='surveys-jsonld-')
+    try:
+        snapshot_path = os.path.join(tmp, 'surveys.snapshot')
+        synthetic_catalogue(args.surveys, snapshot_path)
+        snapshot = catalogue.CatalogueSnapshot(snapshot_path)
+
+        mismatches = 0
+        for survey in surveys(snapshot):
+            for view in jsonld.VIEWS:
+                expected = survey.make_graph(view)
+                doc = jsonld.survey_document(survey, view, context=jsonld.CONTEXT)
+                if not isomorphic(expected, Graph().parse(data=doc, format='json-ld')):
+                    mismatches += 1
+                    if mismatches <= 3:
+                        print('Survey {} {} view differs'.format(survey.survey_id, view))
+        print('Checked {:,} surveys\' {} views: {} mismatches'.format(len(snapshot), len(jsonld.VIEWS), mismatches))
+
+        entity_mismatches = 0
+        for entity in entities(snapshot):
+            for view in jsonld.ENTITY_VIEWS:
+                expected = entity.make_graph(view)
+                doc = jsonld.entity_document(entity, view, context=jsonld.CONTEXT)
+                if not isomorphic(expected, Graph().parse(data=doc, format='json-ld')):
+                    entity_mismatches += 1
+                    if entity_mismatches <= 3:
+                        print('Entity {} {} view differs'.format(entity.entity_id, view))
+        print('Checked {:,} entities\' {} views: {} mismatches'.format(
+            len(snapshot), len(jsonld.ENTITY_VIEWS), entity_mismatches))
+        mismatches += entity_mismatches
+
+        print('\n{:<8}{:>16}{:>16}{:>10}{:>16}{:>16}'.format(
+            'view', 'rdflib ms', 'direct ms', 'speedup', 'rdflib bytes', 'direct bytes'))
+        survey_list = list(surveys(snapshot))
+        for view in jsonld.VIEWS:
+            start = time.perf_counter()
+            rdflib_bytes = sum(len(s.make_graph(view).serialize(format='json-ld')) for s in survey_list)
+            rdflib_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            direct_bytes = sum(len(jsonld.survey_jsonld(s, view)) for s in survey_list)
+            direct_seconds = time.perf_counter() - start
+            print('{:<8}{:>16.3f}{:>16.3f}{:>9.0f}x{:>16,.0f}{:>16,.0f}'.format(
+                view, rdflib_seconds * 1000 / len(survey_list), direct_seconds * 1000 / len(survey_list),
+                rdflib_seconds / direct_seconds, rdflib_bytes / len(survey_list), direct_bytes / len(survey_list)))
+        sys.exit(1 if mismatches else 0)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
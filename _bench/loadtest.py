@@ -0,0 +1,182 @@
+"""
+An end-to-end load test of this API against a fake ARGUS API (see argus_stub.py)
+
+The harness starts the fake ARGUS server, drives this API with a concurrent, weighted mix of Survey view & format and
+Register page requests and reports throughput, p50/p95/p99 latencies per request type and upstream call counts.
+
+By default the Flask app is driven in-process via its test client. To size a real deployment, start it pointing at the
+stub (ARGUS_API_BASE=http://127.0.0.1:<stub port>/www/) and give its address with --target, e.g.:
+
+    python -m _bench.loadtest --stub-port 8099 --target http://127.0.0.1:8000 --requests 5000 --concurrency 32
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from _bench.argus_stub import add_stub_arguments, stub_from_arguments
+
+# (name, path template, weight). {id} is replaced by a survey ID, {page} by a register page number
+REQUEST_MIX = [
+    ('survey gapd html',        '/survey/{id}',                                                  30),
+    ('survey gapd turtle',      '/survey/{id}?_view=gapd&_format=text/turtle',                   10),
+    ('survey gapd rdf+xml',     '/survey/{id}?_view=gapd&_format=application/rdf+xml',            5),
+    ('survey gapd rdf+json',    '/survey/{id}?_view=gapd&_format=application/rdf+json',           5),
+    ('survey prov html',        '/survey/{id}?_view=prov',                                        5),
+    ('survey prov turtle',      '/survey/{id}?_view=prov&_format=text/turtle',                    5),
+    ('survey sosa turtle',      '/survey/{id}?_view=sosa&_format=text/turtle',                    5),
+    ('survey argus',            '/survey/{id}?_view=argus&_format=text/xml',                      5),
+    ('survey alternates',       '/survey/{id}?_view=alternates',                                  5),
+    ('register html',           '/survey/?page={page}',                                          10),
+    ('register turtle',         '/survey/?page={page}&_format=text/turtle',                       5),
+    ('register rdf+xml',        '/survey/?page={page}&_format=application/rdf+xml',               5),
+    ('landing page',            '/',                                                              5),
+]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float('nan')
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def make_requests(n, surveys, per_page, seed, hot_fraction):
+    """
+    Makes a reproducible list of (name, path) requests drawn from REQUEST_MIX
+
+    :param hot_fraction: the fraction of survey IDs that receive half of all survey requests, to exercise caches
+    """
+    rnd = random.Random(seed)
+    names, paths, weights = zip(*REQUEST_MIX)
+    last_page = max(1, (surveys + per_page - 1) // per_page)
+    hot = max(1, int(surveys * hot_fraction))
+    reqs = []
+    for i in rnd.choices(range(len(REQUEST_MIX)), weights=weights, k=n):
+        survey_id = rnd.randint(1, hot) if rnd.random() < 0.5 else rnd.randint(1, surveys)
+        reqs.append((names[i], paths[i].format(id=survey_id, page=rnd.randint(1, last_page))))
+    return reqs
+
+
+def in_process_client():
+    """A per-thread Flask test client for the in-process app"""
+    from app import app
+    local = threading.local()
+
+    def get(path):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        r = local.client.get(path)
+        r.get_data()
+        return r.status_code
+
+    return get
+
+
+def http_client(target):
+    """A per-thread pooled HTTP client for an API deployment at target"""
+    import requests
+    local = threading.local()
+
+    def get(path):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        r = local.session.get(target.rstrip('/') + path, allow_redirects=False, timeout=60)
+        return r.status_code
+
+    return get
+
+
+def run(get, reqs, concurrency):
+    """
+    Issues all requests with the given concurrency
+
+    :return: a tuple of (wall clock seconds, dict of name to list of latencies, Counter of (name, status))
+    """
+    latencies = defaultdict(list)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def one(req):
+        name, path = req
+        start = time.perf_counter()
+        try:
+            status = get(path)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[name].append(elapsed)
+            statuses[(name, status)] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, reqs))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def report(wall, latencies, statuses, upstream_calls, out=sys.stdout):
+    total = sum(len(v) for v in latencies.values())
+    out.write('\n{} requests in {:.2f}s: {:.1f} requests/s\n\n'.format(total, wall, total / wall))
+    out.write('{:<24} {:>7} {:>9} {:>9} {:>9}  {}\n'.format('request', 'count', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                             'statuses'))
+    everything = []
+    for name, _, _ in REQUEST_MIX:
+        values = sorted(latencies.get(name, []))
+        if not values:
+            continue
+        everything.extend(values)
+        codes = ', '.join('{}: {}'.format(s, c) for (n, s), c in sorted(statuses.items(), key=str) if n == name)
+        out.write('{:<24} {:>7} {:>9.1f} {:>9.1f} {:>9.1f}  {}\n'.format(
+            name, len(values),
+            percentile(values, 50) * 1000, percentile(values, 95) * 1000, percentile(values, 99) * 1000,
+            codes
+        ))
+    everything.sort()
+    out.write('{:<24} {:>7} {:>9.1f} {:>9.1f} {:>9.1f}\n'.format(
+        'ALL', len(everything),
+        percentile(everything, 50) * 1000, percentile(everything, 95) * 1000, percentile(everything, 99) * 1000
+    ))
+    upstream_total = sum(upstream_calls.values())
+    out.write('\nupstream ARGUS calls: {} ({:.2f} per request) {}\n'.format(
+        upstream_total, upstream_total / float(total) if total else 0, upstream_calls
+    ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load tests this API against a fake ARGUS API')
+    add_stub_arguments(parser)
+    parser.add_argument('--requests', type=int, default=2000, help='total number of requests to make')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--warmup', type=int, default=50, help='requests made, and not reported, before the run')
+    parser.add_argument('--per-page', type=int, default=100, help='register page size used to pick page numbers')
+    parser.add_argument('--hot-fraction', type=float, default=0.05,
+                        help='fraction of surveys that receive half of all survey requests')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the request mix')
+    parser.add_argument('--target', help='base URL of a running API deployment, instead of the in-process app')
+    args = parser.parse_args()
+
+    stub = stub_from_arguments(args).start()
+    if args.target is None:
+        # must be set before _config is first imported
+        os.environ['ARGUS_API_BASE'] = stub.base_url
+        get = in_process_client()
+    else:
+        print('Make sure the API at {} was started with ARGUS_API_BASE={}'.format(args.target, stub.base_url))
+        get = http_client(args.target)
+
+    reqs = make_requests(args.warmup + args.requests, args.surveys, args.per_page, args.seed, args.hot_fraction)
+    if args.warmup:
+        run(get, reqs[:args.warmup], args.concurrency)
+    stub.reset_calls()
+
+    wall, latencies, statuses = run(get, reqs[args.warmup:], args.concurrency)
+    report(wall, latencies, statuses, stub.calls())
+    stub.stop()
@@ -0,0 +1,93 @@
+"""
+Compares the dictionary-encoded RDF file of the survey catalogue (see model/rdfdict.py) with the gzipped N-Triples
+export (see model/export.py), over a synthetic catalogue of realistic-looking surveys (see argus_stub.py): their sizes,
+the time to get from the downloaded file to answering triple patterns and the time the patterns take
+
+Run with:
+
+    python -m _bench.rdfdict --surveys 9200
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from rdflib import Graph, URIRef, RDF
+from _bench.export import synthetic_catalogue
+from model import export, rdfdict
+import _config
+
+PROV_AGENT = 'http://www.w3.org/ns/prov#agent'
+PROV_ACTIVITY = 'http://www.w3.org/ns/prov#Activity'
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def patterns(survey_uri, agent_uri):
+    """
+    :return: (name, (s, p, o) of URI strings or None) of the triple patterns timed
+    """
+    return [
+        ('one survey, ?p ?o', (survey_uri, None, None)),
+        ('?s rdf:type prov:Activity', (None, str(RDF.type), PROV_ACTIVITY)),
+        ('?s prov:agent one agent', (None, PROV_AGENT, agent_uri)),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares dictionary-encoded RDF with gzipped N-Triples')
+    parser.add_argument('--surveys', type=int, default=9200, help='number of synthetic surveys')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='export processes, 0 for none')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='surveys-rdfdict-')
+    try:
+        snapshot_path = os.path.join(tmp, 'surveys.snapshot')
+        synthetic_catalogue(args.surveys, snapshot_path)
+
+        nt_path = os.path.join(tmp, 'surveys.nt.gz')
+        nt_triples, nt_write = timed(export.write_export, nt_path, snapshot_path, _config.EXPORT_VIEWS, False,
+                                     args.workers)
+        rdfd_path = os.path.join(tmp, 'surveys.rdfd')
+        (terms, rdfd_triples), rdfd_write = timed(rdfdict.write_rdfdict, rdfd_path, snapshot_path,
+                                                  _config.EXPORT_VIEWS, args.workers)
+
+        print('{:<32}{:>14}{:>16}{:>14}{:>14}'.format('', 'triples', 'bytes', 'bytes/triple', 'write s'))
+        for name, triples, path, seconds in (('gzipped N-Triples', nt_triples, nt_path, nt_write),
+                                             ('dictionary-encoded', rdfd_triples, rdfd_path, rdfd_write)):
+            size = os.path.getsize(path)
+            print('{:<32}{:>14,}{:>16,}{:>14.1f}{:>14.1f}'.format(name, triples, size, size / triples, seconds))
+        print('{:,} distinct terms; the N-Triples repeat the {:,} triples that are in more than one view'.format(
+            terms, nt_triples - rdfd_triples))
+
+        # from the downloaded file to answering patterns
+        print('\n{:<32}{:>14}'.format('load', 'seconds'))
+        _, seconds = timed(lambda: sum(1 for line in gzip.open(nt_path, 'rt') if line.strip()))
+        print('{:<32}{:>14.3f}'.format('gunzip and split N-Triples', seconds))
+        g, seconds = timed(lambda: Graph(bind_namespaces='none').parse(gzip.open(nt_path, 'rb'), format='nt'))
+        print('{:<32}{:>14.3f}'.format('rdflib Graph of N-Triples', seconds))
+        d, seconds = timed(rdfdict.RDFDict, rdfd_path)
+        print('{:<32}{:>14.3f}'.format('open dictionary-encoded', seconds))
+        n, seconds = timed(lambda: sum(1 for _ in d.triples()))
+        print('{:<32}{:>14.3f}'.format('decode every triple', seconds))
+
+        agent = next(d.triples(p='<{}>'.format(PROV_AGENT)))[2][1:-1]
+        print('\n{:<32}{:>10}{:>16}{:>16}'.format('pattern', 'triples', 'rdflib ms', 'dictionary ms'))
+        for name, pattern in patterns(export.graph_uri(1, 'gapd').split('?')[0], agent):
+            found, rdflib_seconds = timed(lambda: sum(1 for _ in g.triples(
+                tuple(URIRef(t) if t is not None else None for t in pattern))))
+            found_too, seconds = timed(lambda: d.count(*('<{}>'.format(t) if t is not None else None
+                                                         for t in pattern)))
+            print('{:<32}{:>10,}{:>16.3f}{:>16.3f}{}'.format(name, found, rdflib_seconds * 1000, seconds * 1000,
+                                                             '' if found == found_too else '  MISMATCH'))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,88 @@
+"""
+Measures the /sparql endpoint's store (see model/sparql.py) over a synthetic catalogue of realistic-looking surveys (see
+argus_stub.py): how long the store takes to load and how long typical queries take, uncached and cached
+
+Run with:
+
+    python -m _bench.sparql --surveys 9200
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from _bench.export import synthetic_catalogue
+from model import catalogue, sparql
+from model.generations import Generation
+
+QUERIES = [
+    ('survey types', '''
+        SELECT ?type (COUNT(?survey) AS ?surveys)
+        WHERE { ?survey a ?type }
+        GROUP BY ?type'''),
+    ('one survey', '''
+        SELECT ?p ?o
+        WHERE { <http://pid.geoscience.gov.au/survey/ga/42> ?p ?o }'''),
+    ('operators', '''
+        PREFIX prov: <http://www.w3.org/ns/prov#>
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        SELECT ?survey ?operator
+        WHERE {
+            ?survey prov:qualifiedAttribution ?a .
+            ?a prov:agent/rdfs:label ?operator .
+        }
+        LIMIT 1000'''),
+    ('polygons', '''
+        PREFIX geosp: <http://www.opengis.net/ont/geosparql#>
+        SELECT ?wkt
+        WHERE { ?geometry geosp:asWKT ?wkt }'''),
+]
+
+
+def time_query(generation, query_text, repeats):
+    """
+    :return: (the uncached seconds, the median cached seconds) of a query
+    """
+    sparql.results_cache.clear()
+    start = time.perf_counter()
+    sparql.query(generation, query_text)
+    cold = time.perf_counter() - start
+
+    cached = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sparql.query(generation, query_text)
+        cached.append(time.perf_counter() - start)
+    return cold, statistics.median(cached)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures SPARQL store loading and query latency')
+    parser.add_argument('--surveys', type=int, default=9200, help='number of synthetic surveys')
+    parser.add_argument('--repeats', type=int, default=100, help='cached runs of each query')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='surveys-sparql-')
+    try:
+        snapshot_path = os.path.join(tmp, 'surveys.snapshot')
+        synthetic_catalogue(args.surveys, snapshot_path)
+        generation = Generation(1, catalogue.CatalogueSnapshot(snapshot_path), {}, 0)
+
+        start = time.perf_counter()
+        generation.indexes['sparql'] = sparql.build_store(generation.snapshot, None)
+        seconds = time.perf_counter() - start
+        triples = len(generation.indexes['sparql'])
+        print('Loaded {:,} surveys, {:,} triples, in {:.1f}s, {:,.0f} triples/s'.format(
+            args.surveys, triples, seconds, triples / seconds))
+
+        print('{:<14}{:>14}{:>14}'.format('query', 'uncached ms', 'cached ms'))
+        for name, query_text in QUERIES:
+            cold, cached = time_query(generation, query_text, args.repeats)
+            print('{:<14}{:>14.1f}{:>14.3f}'.format(name, cold * 1000, cached * 1000))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,83 @@
+"""
+Measures the tabular exports of the survey catalogue (see model/tabular.py), CSV and Parquet, against getting every
+survey's page one at a time, as analysts have done, over a synthetic catalogue of realistic-looking surveys (see
+argus_stub.py)
+
+Run with:
+
+    python -m _bench.tabular --surveys 9200
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import _config
+from _bench.export import synthetic_catalogue
+from model import catalogue, tabular
+
+
+def per_survey_pages(snapshot, sample):
+    """
+    Renders the HTML page of each of a sample of surveys, as a scraper would get them
+
+    :return: the (seconds, bytes) of the sample's pages
+    """
+    _config.WARM_UP = False
+    from app import app
+    from model import generations
+    from model.survey import SurveyRenderer
+
+    # the pages' nearby surveys are of this catalogue, which is never harvested afresh
+    generations.holder.snapshot_path = snapshot.path
+    generations.holder.harvest_seconds = None
+    generations.holder.refresh()
+
+    step = max(1, len(snapshot) // sample)
+    size = 0
+    start = time.perf_counter()
+    with app.test_request_context():
+        for i in range(0, len(snapshot), step)[:sample]:
+            page = SurveyRenderer.from_record(snapshot.record(i)).render('gapd', 'text/html')
+            size += len(page.get_data() if hasattr(page, 'get_data') else page.encode('utf-8'))
+    return time.perf_counter() - start, size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures CSV and Parquet export time and size')
+    parser.add_argument('--surveys', type=int, default=9200, help='number of synthetic surveys')
+    parser.add_argument('--sample', type=int, default=500, help='surveys whose pages are rendered, to extrapolate from')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='surveys-tabular-')
+    try:
+        snapshot_path = os.path.join(tmp, 'surveys.snapshot')
+        synthetic_catalogue(args.surveys, snapshot_path)
+        snapshot = catalogue.CatalogueSnapshot(snapshot_path)
+
+        print('{:<28}{:>12}{:>16}{:>16}'.format('', 'seconds', 'bytes', 'gzipped bytes'))
+
+        seconds, size = per_survey_pages(snapshot, min(args.sample, len(snapshot)))
+        scale = len(snapshot) / min(args.sample, len(snapshot))
+        print('{:<28}{:>12.2f}{:>16,.0f}{:>16}'.format('per-survey HTML pages (est.)', seconds * scale, size * scale, ''))
+
+        start = time.perf_counter()
+        data = b''.join(tabular.csv_rows(snapshot))
+        print('{:<28}{:>12.2f}{:>16,}{:>16,}'.format(
+            'CSV', time.perf_counter() - start, len(data), len(gzip.compress(data, 6))))
+
+        if tabular.pyarrow is not None:
+            path = os.path.join(tmp, 'surveys.parquet')
+            start = time.perf_counter()
+            tabular.write_parquet(path, snapshot_path)
+            print('{:<28}{:>12.2f}{:>16,}{:>16}'.format(
+                'Parquet (zstd)', time.perf_counter() - start, os.path.getsize(path), ''))
+        else:
+            print('Parquet: pyarrow is not installed')
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
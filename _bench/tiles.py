@@ -0,0 +1,74 @@
+"""
+Measures making map tiles of survey footprints (see model/tiles.py) over a synthetic catalogue of realistic-looking
+surveys (see argus_stub.py): the tile index's build time and, for every tile over Australia at each zoom, tile making
+time and tile sizes
+
+Run with:
+
+    python -m _bench.tiles --surveys 9200 --max-zoom 10
+"""
+import argparse
+import gzip
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from _bench.export import synthetic_catalogue
+from model import catalogue, tiles
+
+# west, south, east, north of Australia, where the synthetic surveys are
+AUSTRALIA = (112.0, -44.0, 154.0, -10.0)
+
+
+def australian_tiles(z):
+    """
+    :return: the (x, y) of every tile over Australia at a zoom
+    """
+    w, s, e, n = AUSTRALIA
+    x0, y0 = tiles.tile_of(w, n, z)
+    x1, y1 = tiles.tile_of(e, s, z)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures map tile making time and tile sizes')
+    parser.add_argument('--surveys', type=int, default=9200, help='number of synthetic surveys')
+    parser.add_argument('--max-zoom', type=int, default=10)
+    parser.add_argument('--max-tiles', type=int, default=2000, help='the most tiles to make at each zoom')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='surveys-tiles-')
+    try:
+        snapshot_path = os.path.join(tmp, 'surveys.snapshot')
+        synthetic_catalogue(args.surveys, snapshot_path)
+        snapshot = catalogue.CatalogueSnapshot(snapshot_path)
+
+        start = time.perf_counter()
+        index = tiles.TileIndex(snapshot)
+        print('Indexed {:,} survey footprints in {:.2f}s'.format(len(index), time.perf_counter() - start))
+
+        for mimetype in tiles.MIMETYPES:
+            print('\n{}'.format(mimetype))
+            print('{:>4}{:>8}{:>12}{:>12}{:>12}{:>12}{:>14}'.format(
+                'zoom', 'tiles', 'mean ms', 'max ms', 'mean bytes', 'max bytes', 'mean gzipped'))
+            for z in range(args.max_zoom + 1):
+                xys = australian_tiles(z)[:args.max_tiles]
+                seconds = []
+                sizes = []
+                gzipped = []
+                for x, y in xys:
+                    start = time.perf_counter()
+                    data = tiles.make_tile(index, z, x, y, mimetype)
+                    seconds.append(time.perf_counter() - start)
+                    sizes.append(len(data))
+                    gzipped.append(len(gzip.compress(data, 6)))
+                print('{:>4}{:>8,}{:>12.2f}{:>12.2f}{:>12,.0f}{:>12,}{:>14,.0f}'.format(
+                    z, len(xys), statistics.mean(seconds) * 1000, max(seconds) * 1000, statistics.mean(sizes),
+                    max(sizes), statistics.mean(gzipped)))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,118 @@
+"""
+Measures what a restart costs with and without the cache checkpoint (see model/checkpoint.py): the cache hit rates of
+a fresh app process, and the calls it makes to a fake ARGUS API (see argus_stub.py), over its first requests
+
+A first process serves a trace of survey requests, with a Zipf-like popularity as real traffic has, and checkpoints its
+caches as it exits. Then two fresh processes serve the same, later, trace: one loading that checkpoint, one starting
+cold, as every worker used to. There's no catalogue snapshot, and none is harvested, so every survey's data comes from
+the stub.
+
+Run with:
+
+    python -m _bench.warmrestart --requests 5000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from _bench.argus_stub import add_stub_arguments, stub_from_arguments
+
+PATHS = ['/survey/{}', '/survey/{}?_view=prov', '/survey/{}?_format=text/turtle']
+
+# run in a fresh interpreter, which checkpoints its caches as it exits
+CHILD = '''
+import json, sys
+import _config
+_config.CATALOGUE_HARVEST_SECONDS = None
+from app import app
+from model import checkpoint, upstream
+client = app.test_client()
+windows = []
+before = dict(checkpoint.metrics(), calls=upstream.calls)
+for i, path in enumerate(json.loads(sys.argv[1]), 1):
+    client.get(path, headers={"Accept-Encoding": "gzip"}).get_data()
+    if i in json.loads(sys.argv[2]):
+        after = dict(checkpoint.metrics(), calls=upstream.calls)
+        windows.append({k: after[k] - before.get(k, 0) for k in after})
+        before = after
+print(json.dumps({"windows": windows, "restored": checkpoint.restored}))
+'''
+
+
+def trace(surveys, requests, seed, skew=1.1):
+    """
+    :return: request paths, of surveys chosen with Zipf-like popularity, the same surveys the most popular for every seed
+    """
+    rnd = random.Random(0)
+    ids = list(range(1, surveys + 1))
+    rnd.shuffle(ids)
+    weights = [1 / (rank ** skew) for rank in range(1, surveys + 1)]
+    rnd = random.Random(seed)
+    return [rnd.choice(PATHS).format(survey_id) for survey_id in rnd.choices(ids, weights, k=requests)]
+
+
+def run(stub, paths, windows, checkpoint_file, data_dir):
+    env = dict(
+        os.environ,
+        ARGUS_API_BASE=stub.base_url,
+        DATA_DIR=data_dir,
+        WARM_UP='false',
+        CACHE_CHECKPOINT_FILE=checkpoint_file
+    )
+    before = stub.calls().get('survey', 0)
+    out = subprocess.check_output(
+        [sys.executable, '-c', CHILD, json.dumps(paths), json.dumps(windows)],
+        cwd=dirname(dirname(abspath(__file__))),
+        env=env
+    )
+    result = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+    result['stub_calls'] = stub.calls().get('survey', 0) - before
+    return result
+
+
+def rate(window, cache):
+    asked = window[cache + '_hits'] + window[cache + '_misses']
+    return window[cache + '_hits'] / asked if asked else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures cache hit rates and upstream calls after a restart')
+    add_stub_arguments(parser)
+    parser.add_argument('--requests', type=int, default=5000, help='requests served by each process')
+    parser.set_defaults(latency=0.0)
+    args = parser.parse_args()
+
+    stub = stub_from_arguments(args).start()
+    tmp = tempfile.mkdtemp(prefix='surveys-warmrestart-')
+    windows = sorted(set([min(100, args.requests), min(1000, args.requests), args.requests]))
+    try:
+        checkpoint_file = os.path.join(tmp, 'caches.checkpoint')
+        first = run(stub, trace(args.surveys, args.requests, 1), [args.requests], checkpoint_file, tmp)
+        print('first process: {:,} requests, {:,} ARGUS calls, checkpoint of {:,} bytes'.format(
+            args.requests, first['stub_calls'], os.path.getsize(checkpoint_file)))
+
+        later = trace(args.surveys, args.requests, 2)
+        shutil.copy(checkpoint_file, checkpoint_file + '.kept')
+        warm = run(stub, later, windows, checkpoint_file + '.kept', tmp)
+        cold = run(stub, later, windows, os.path.join(tmp, 'none.checkpoint'), tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        stub.stop()
+
+    print('restored from the checkpoint: ' + ', '.join('{:,} {}'.format(n, name) for name, n in warm['restored'].items()))
+    print('\n{:<20}{:>16}{:>18}{:>20}{:>16}'.format('', 'requests', 'record hit rate', 'compression hits', 'ARGUS calls'))
+    for label, result in (('restart, cold', cold), ('restart, warm', warm)):
+        start = 0
+        for end, window in zip(windows, result['windows']):
+            print('{:<20}{:>16}{:>18.1%}{:>20.1%}{:>16,}'.format(
+                label, '{}-{}'.format(start + 1, end), rate(window, 'records'), rate(window, 'compression'),
+                window['calls']))
+            start = end
+        print('{:<20}{:>16}{:>18}{:>20}{:>16,}'.format(label, 'all', '', '', result['stub_calls']))
@@ -1,31 +1,159 @@
+import os
 from os.path import dirname, realpath, join, abspath
 
 APP_DIR = dirname(dirname(realpath(__file__)))
 TEMPLATES_DIR = join(dirname(dirname(abspath(__file__))), 'view', 'templates')
 STATIC_DIR = join(dirname(dirname(abspath(__file__))), 'view', 'static')
+# minified, precompressed & content-hashed copies of STATIC_ASSETS, made at startup by controller/assets_functions.py
+ASSETS_BUILD_DIR = join(dirname(dirname(abspath(__file__))), 'view', 'build')
+STATIC_ASSETS = [
+    'js/vis.js',
+    'css/vis-network.min.css',
+    'css/ga_theme.css'
+]
+# compiled templates are kept here so that new workers don't have to compile them again. None to turn off
+JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+    'JINJA_BYTECODE_CACHE_DIR',
+    join(dirname(dirname(abspath(__file__))), 'view', 'build', 'templates')
+)
+# compile templates and load rdflib plugins at startup, rather than in the first requests
+WARM_UP = os.environ.get('WARM_UP', 'true').lower() == 'true'
+# build the shared, read-only, state when the app is made, e.g. in a pre-forking server's master process, rather than
+# lazily in each worker. See _installation/gunicorn.conf.py
+PRELOAD = os.environ.get('PRELOAD', 'true').lower() == 'true'
 LOGFILE = APP_DIR + 'surveys-api.log'
 DEBUG = True
 
-XML_API_URL_SURVEY_REGISTER = 'http://dbforms.ga.gov.au/www/argus.argus_api.SearchSurveys' \
-                              '?pOrder=SURVEYID&pPageno={0}&pNoOfRecordsPerPage={1}'
-XML_API_URL_SURVEY = 'http://dbforms.ga.gov.au/www/argus.argus_api.survey?pSurveyNo={}'
+# the ARGUS Oracle XML API location, overridable so that the API can be pointed at a local stub (see _bench/)
+ARGUS_API_BASE = os.environ.get('ARGUS_API_BASE', 'http://dbforms.ga.gov.au/www/')
+
+XML_API_URL_SURVEY_REGISTER = ARGUS_API_BASE + 'argus.argus_api.SearchSurveys' \
+                                               '?pOrder=SURVEYID&pPageno={0}&pNoOfRecordsPerPage={1}'
+XML_API_URL_SURVEY = ARGUS_API_BASE + 'argus.argus_api.survey?pSurveyNo={}'
+
+# the entities Oracle XML API, likewise overridable. It has no register call yet: set XML_API_URL_ENTITY_REGISTER, paged
+# as SearchSurveys is by {0} the page number and {1} the page size, to serve the Entities Register
+ENTITIES_API_BASE = os.environ.get('ENTITIES_API_BASE', 'http://dbforms.ga.gov.au/www/')
+XML_API_URL_ENTITY = ENTITIES_API_BASE + 'a.entities_api.entities?pEno={}'
+XML_API_URL_ENTITY_REGISTER = os.environ.get('XML_API_URL_ENTITY_REGISTER', '')
+
+# calls to the XML APIs, other than the harvester's, share a pool of at most UPSTREAM_POOL_SIZE keep-alive connections
+# per host per process and give up after UPSTREAM_TIMEOUT_SECONDS. The last UPSTREAM_CACHE_ITEMS records got from them,
+# and the IDs they had no record of, are kept for UPSTREAM_CACHE_SECONDS.
+UPSTREAM_POOL_SIZE = 10
+UPSTREAM_TIMEOUT_SECONDS = 10
+UPSTREAM_CACHE_ITEMS = 5000
+UPSTREAM_CACHE_SECONDS = 3600
+
+# the survey catalogue snapshot, written by the harvester (python -m model.catalogue harvest) and mapped by all workers
+DATA_DIR = os.environ.get('DATA_DIR', join(dirname(dirname(abspath(__file__))), 'data'))
+CATALOGUE_SNAPSHOT = join(DATA_DIR, 'surveys.snapshot')
+# the upstream record, compression, tile and SPARQL result caches are written here every CACHE_CHECKPOINT_SECONDS and
+# when a worker exits, and loaded again when the app is made, so a restart doesn't send all its traffic to ARGUS. See
+# model/checkpoint.py. CACHE_CHECKPOINT_FILE= (empty) to turn off
+CACHE_CHECKPOINT_FILE = os.environ.get('CACHE_CHECKPOINT_FILE', join(DATA_DIR, 'caches.checkpoint')) or None
+CACHE_CHECKPOINT_SECONDS = 300
+# how often workers look for a new snapshot, and rebuild their catalogue indexes from it, in the background
+CATALOGUE_CHECK_SECONDS = 30
+# the snapshot age after which one worker per machine harvests a new one from ARGUS, None to only harvest via cron
+CATALOGUE_HARVEST_SECONDS = 86400
+# ARGUS SearchSurveys page size and concurrent calls used by the harvester
+HARVEST_PAGE_SIZE = 1000
+HARVEST_WORKERS = 8
+
+# bulk N-Triples/N-Quads exports of every survey (python -m model.export), the views exported, the processes turning
+# surveys into RDF and the surveys given to each at a time. The /survey/export endpoint only serves the export files,
+# answering 503 until they have been written.
+EXPORT_VIEWS = ['gapd', 'prov', 'sosa']
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', os.cpu_count() or 1))
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FILES = {
+    'nt': join(DATA_DIR, 'surveys.nt.gz'),
+    'nq': join(DATA_DIR, 'surveys.nq.gz'),
+}
+# the Retry-After, in seconds, of an export endpoint's 503 when its file hasn't been written yet
+EXPORT_RETRY_SECONDS = 3600
+# the Parquet file of the catalogue served by /survey/?_format=application/vnd.apache.parquet, written after each
+# harvest, with the exports
+PARQUET_FILE = join(DATA_DIR, 'surveys.parquet')
+# the dictionary-encoded binary RDF of the EXPORT_VIEWS of every survey, see model/rdfdict.py, served by
+# /survey/export?_format=application/x-rdf-dictionary and written after each harvest, with the exports
+RDFDICT_FILE = join(DATA_DIR, 'surveys.rdfd')
 
 BASE_URI_SURVEY = 'http://pid.geoscience.gov.au/survey/ga/'
+BASE_URI_AGENT = 'http://pid.geoscience.gov.au/agent/ga/'
+BASE_URI_ENTITY = 'http://pid.geoscience.gov.au/entity/ga/'
+BASE_URI_STATS = 'http://pid.geoscience.gov.au/survey/stats/'
+# the fixed @context of the surveys' and entities' JSON-LD, see model/jsonld.py, served at /survey/context.jsonld
+JSONLD_CONTEXT_URI = BASE_URI_SURVEY + 'context.jsonld'
+
+# the /sparql endpoint's store, of the EXPORT_VIEWS triples of every catalogue survey, is built by each worker when it
+# gets its first query. Each query runs in a forked process, killed if it runs longer than SPARQL_TIMEOUT_SECONDS, at most
+# SPARQL_MAX_RUNNING run at once and results are cut off after SPARQL_MAX_ROWS rows. The results of the last
+# SPARQL_CACHE_ITEMS distinct queries are kept.
+SPARQL_TIMEOUT_SECONDS = 10
+SPARQL_MAX_RUNNING = 2
+SPARQL_MAX_ROWS = 10000
+SPARQL_CACHE_ITEMS = 500
+
+# the /fragments Triple Pattern Fragments of the same triples, a page of FRAGMENTS_PAGE_SIZE triples at a time
+FRAGMENTS_PAGE_SIZE = 100
+
+# /survey/tiles/{z}/{x}/{y} map tiles of survey footprints, see model/tiles.py. Surveys are indexed by their home tiles to
+# TILES_INDEX_ZOOM and tiles are served to TILES_MAX_ZOOM. Tiles to TILES_CLUSTER_MAX_ZOOM give clusters of surveys'
+# centroids, by a grid of TILES_CLUSTER_CELL_PIXELS cells, rather than footprints. The last TILES_CACHE_ITEMS tiles
+# made are kept.
+TILES_INDEX_ZOOM = 16
+TILES_MAX_ZOOM = 18
+TILES_CLUSTER_MAX_ZOOM = 7
+TILES_CLUSTER_CELL_PIXELS = 32
+TILES_CACHE_ITEMS = 5000
+
+# the number of nearest surveys linked from each survey's page, given by ?_view=nearby and /survey/?near=lat,lon by
+# default, and the most that k= can ask for
+NEARBY_K = 5
+NEARBY_MAX_K = 100
+
+# where python -m model.prerender writes every survey's representations, and register pages, for a web server to serve
+PRERENDER_DIR = os.environ.get('PRERENDER_DIR', join(DATA_DIR, 'prerendered'))
+PRERENDER_WORKERS = int(os.environ.get('PRERENDER_WORKERS', os.cpu_count() or 1))
+
+# where python -m model.sitemap writes the sitemaps, VoID description and robots.txt, served as static files
+SITEMAP_DIR = os.environ.get('SITEMAP_DIR', join(DATA_DIR, 'sitemap'))
+
+# negotiated gzip/brotli compression of dynamic responses, per mimetype. Responses of unlisted mimetypes are never
+# compressed. 'gzip' is the gzip level (1-9) and 'br' the brotli quality (0-11) to use, None to not offer that encoding,
+# and 'min_size' is the smallest body, in bytes, worth compressing. Higher levels trade CPU for bandwidth.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION = {
+    'text/html': {'gzip': 6, 'br': 5},
+    'text/turtle': {'gzip': 6, 'br': 5},
+    'application/rdf+xml': {'gzip': 6, 'br': 5},
+    'application/rdf+json': {'gzip': 6, 'br': 5},
+    'application/ld+json': {'gzip': 6, 'br': 5},
+    'application/json': {'gzip': 6, 'br': 5},
+    'text/xml': {'gzip': 6, 'br': 5},
+    'application/geo+json': {'gzip': 6, 'br': 5},
+    'application/vnd.mapbox-vector-tile': {'gzip': 6, 'br': 5},
+    'text/plain': {'gzip': 6, 'br': None, 'min_size': 4096},
+}
+# the number, and total bytes, of compressed response bodies kept, so identical bodies aren't compressed again. A body
+# bigger than COMPRESSION_CACHE_BYTES is compressed each time it's sent
+COMPRESSION_CACHE_ITEMS = 1000
+COMPRESSION_CACHE_BYTES = 32 * 1024 * 1024
 
 ADMIN_EMAIL = 'dataman@ga.gov.au'
 
 XML_API = {
     'ENTITIES': {
         'GET_CAPABILITIES': 'http://dbforms.ga.gov.au/www/a.entities_api.getCapabilities',
-        'ENTITY': 'http://dbforms.ga.gov.au/www/a.entities_api.entities?pEno={}',
-        'ENTITY_REGISTER': ''
-
+        'ENTITY': XML_API_URL_ENTITY,
+        'ENTITY_REGISTER': XML_API_URL_ENTITY_REGISTER
     },
     'SURVEYS': {
-        'GET_CAPABILITIES': 'http://dbforms.ga.gov.au/www/argus.argus_api.getCapabilities',
-        'SURVEY': '',
-        'SURVEY_REGISTER': 'http://dbforms.ga.gov.au/www/argus.argus_api.SearchSurveys'
-                           '?pOrder=SURVEYID&pPageno={0}&pNoOfRecordsPerPage={1}'
+        'GET_CAPABILITIES': ARGUS_API_BASE + 'argus.argus_api.getCapabilities',
+        'SURVEY': XML_API_URL_SURVEY,
+        'SURVEY_REGISTER': XML_API_URL_SURVEY_REGISTER
     }
 }
 
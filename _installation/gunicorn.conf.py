@@ -0,0 +1,93 @@
+"""
+gunicorn settings for running this API in preload mode:
+
+    gunicorn -c _installation/gunicorn.conf.py
+
+The app, and all its shared read-only state (see preload_shared_state() in app.py), is made once in the master process
+and then frozen out of the garbage collector's reach so that forked workers share its memory pages copy-on-write rather
+than each building, and then touching, their own copy. Each worker's memory use is logged after it starts and then
+every memory_report_interval requests. Each worker checkpoints its caches as it exits, for the workers that replace it.
+"""
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+wsgi_app = 'app:app'
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WORKERS', (os.cpu_count() or 1) * 2 + 1))
+threads = int(os.environ.get('THREADS', 4))
+preload_app = True
+os.environ['PRELOAD'] = 'true'
+
+memory_report_interval = 1000
+
+# stop collections in the master from leaving freed holes all over the pages the workers will share
+gc.disable()
+
+
+def memory_usage(pid='self'):
+    """
+    Reads a process's memory use from /proc (Linux only)
+
+    :return: a dict of kB values: rss (resident), pss (proportional share of shared pages), shared and private, or an
+        empty dict if they can't be read
+    """
+    usage = {}
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] == 'Rss:':
+                    usage['rss'] = int(parts[1])
+                elif parts[0] == 'Pss:':
+                    usage['pss'] = int(parts[1])
+                elif parts[0] in ('Shared_Clean:', 'Shared_Dirty:'):
+                    usage['shared'] = usage.get('shared', 0) + int(parts[1])
+                elif parts[0] in ('Private_Clean:', 'Private_Dirty:'):
+                    usage['private'] = usage.get('private', 0) + int(parts[1])
+    except (IOError, IndexError, ValueError):
+        pass
+    return usage
+
+
+def log_memory_usage(log, worker, when):
+    usage = memory_usage()
+    if usage:
+        log.info('Worker {} memory {}: RSS {} kB, PSS {} kB, shared {} kB, private {} kB'.format(
+            worker.pid, when, usage.get('rss'), usage.get('pss'), usage.get('shared'), usage.get('private')
+        ))
+
+
+def when_ready(server):
+    usage = memory_usage()
+    if usage:
+        server.log.info('Master memory after preload: RSS {} kB'.format(usage.get('rss')))
+
+
+def pre_fork(server, worker):
+    # move everything made so far into the permanent generation, which is never collected, so that workers' collections
+    # never write to (and so copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    # before the worker's first request: load what recycled workers have checkpointed since the master started
+    from model import checkpoint
+    checkpoint.ensure_started()
+    log_memory_usage(server.log, worker, 'after fork')
+
+
+def worker_exit(server, worker):
+    # checkpoint the worker's caches for the workers that replace it, see model/checkpoint.py
+    from model import checkpoint
+    if checkpoint.caches:
+        checkpoint.save_on_exit()
+
+
+def post_request(worker, req, environ, resp):
+    worker.nr_requests_seen = getattr(worker, 'nr_requests_seen', 0) + 1
+    if worker.nr_requests_seen % memory_report_interval == 0:
+        log_memory_usage(worker.log, worker, 'after {} requests'.format(worker.nr_requests_seen))
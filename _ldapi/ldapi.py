@@ -1,3 +1,4 @@
+from functools import lru_cache
 from flask import Response
 
 
@@ -7,7 +8,7 @@ class LDAPI:
 
     This class is issued as a Python file, rather than a Git submodule so check the version number before use!
 
-    Version 1.0
+    Version 1.1
     """
 
     # maps HTTP MIMETYPES to rdflib's RDF parsing mimetypes
@@ -23,22 +24,107 @@ class LDAPI:
         ('text/n3', 'nt')
     ]
 
+    # lookup tables compiled from MIMETYPES_PARSERS, the first mapping of each parser being its mimetype
+    RDF_MIMETYPES = tuple(item[0] for item in MIMETYPES_PARSERS)
+    RDF_MIMETYPES_SET = frozenset(RDF_MIMETYPES)
+    PARSERS_BY_MIMETYPE = dict(MIMETYPES_PARSERS)
+    MIMETYPES_BY_PARSER = {parser: mimetype for mimetype, parser in reversed(MIMETYPES_PARSERS)}
+
+    FILE_EXTENSIONS = {
+        'text/html': '.html',
+        'text/turtle': '.ttl',
+        'application/rdf+xml': '.rdf',
+        'application/rdf+json': '.json',
+        'application/xml': '.xml',
+        'text/xml': '.xml',
+        'application/geo+json': '.geojson',
+        'text/csv': '.csv',
+        'application/vnd.apache.parquet': '.parquet',
+    }
+
     def __init__(self):
         pass
 
     @staticmethod
     def get_rdf_mimetypes_list():
-        return [item[0] for item in LDAPI.MIMETYPES_PARSERS]
+        return LDAPI.RDF_MIMETYPES
+
+    @staticmethod
+    def is_rdf_mimetype(mimetype):
+        return mimetype in LDAPI.RDF_MIMETYPES_SET
 
     @staticmethod
     def get_rdf_parser_for_mimetype(mimetype):
         if mimetype == 'text/html':  # HTML is the default controller so it could appear here
             mimetype = 'text/turtle'
-        return [item[1] for item in LDAPI.MIMETYPES_PARSERS if item[0] == mimetype][0]
+        return LDAPI.PARSERS_BY_MIMETYPE[mimetype]
 
     @staticmethod
     def get_mimetype_for_rdf_parser(rdf_parser):
-        return [item[0] for item in LDAPI.MIMETYPES_PARSERS if item[1] == rdf_parser][0]
+        return LDAPI.MIMETYPES_BY_PARSER[rdf_parser]
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse_accept(accept):
+        """
+        Parses an HTTP Accept header value. Results are memoised per distinct header value.
+
+        :param accept: the header value, e.g. 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+        :return: a tuple of (media range, q) tuples, in header order
+        """
+        ranges = []
+        for part in (accept or '').split(','):
+            params = part.strip().split(';')
+            media_range = params[0].strip().lower()
+            if media_range == '*':  # some old clients send this for */*
+                media_range = '*/*'
+            if '/' not in media_range:
+                continue
+            q = 1.0
+            for param in params[1:]:
+                name, _, value = param.strip().partition('=')
+                if name.strip().lower() == 'q':
+                    try:
+                        q = min(max(float(value), 0.0), 1.0)
+                    except ValueError:
+                        q = 0.0
+            ranges.append((media_range, q))
+        return tuple(ranges)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def negotiate_mimetype(accept, mimetypes):
+        """
+        Chooses the mimetype a client prefers, by its Accept header, from those available. Each available mimetype gets
+        the q value of the most specific media range matching it (type/subtype over type/* over */*) and, of those with
+        the highest non-zero q, the first available is chosen. Results are memoised per distinct header value and
+        mimetypes.
+
+        :param accept: the Accept header value
+        :param mimetypes: a tuple of the available mimetypes, in order of preference
+        :return: a mimetype or None if the client accepts none of them
+        """
+        ranges = LDAPI.parse_accept(accept)
+        best = None
+        best_q = 0.0
+        for mimetype in mimetypes:
+            main_type = mimetype.split('/')[0] + '/*'
+            q = None
+            specificity = -1
+            for media_range, range_q in ranges:
+                if media_range == mimetype:
+                    s = 2
+                elif media_range == main_type:
+                    s = 1
+                elif media_range == '*/*':
+                    s = 0
+                else:
+                    continue
+                if s > specificity:
+                    q, specificity = range_q, s
+            if q is not None and q > best_q:
+                best, best_q = mimetype, q
+        return best
 
     @staticmethod
     def get_file_extension(mimetype):
@@ -48,15 +134,7 @@ class LDAPI:
         :param mimetype: an HTTP mime type
         :return: a string
         """
-        file_extension = {
-            'text/turtle': '.ttl',
-            'application/rdf+xml': '.rdf',
-            'application/rdf+json': '.json',
-            'application/xml': '.xml',
-            'text/xml': '.xml',
-        }
-
-        return file_extension[mimetype]
+        return LDAPI.FILE_EXTENSIONS[mimetype]
 
     @staticmethod
     def an_int(s):
@@ -88,16 +166,17 @@ class LDAPI:
             else:
                 raise LdapiParameterError(
                     'The _view parameter is invalid. For this object, it must be one of {0}.'
-                    .format(', '.join(views_mimetypes.iterkeys()))
+                    .format(', '.join(views_mimetypes.keys()))
                 )
         else:
             # views_mimetypes will give us the default model
             return views_mimetypes['default']
 
     @staticmethod
-    def valid_mimetype(mimetype, view, views_mimetypes):
+    def valid_mimetype(mimetype, view, views_mimetypes, accept=None):
         """
-        Determines whether a requested mimetype for a particular model model is valid and, if it is, it returns it
+        Determines whether a requested mimetype for a particular model model is valid and, if it is, it returns it. If
+        no mimetype is requested, the one the Accept header prefers is chosen.
 
         :return: model name (string) or False
         """
@@ -109,21 +188,25 @@ class LDAPI:
                     'The _mimetype parameter is invalid. For this model model, mimetype should be one of {0}.'
                     .format(', '.join(views_mimetypes[view]))
                 )
+        elif accept:
+            # HTML is still the default if the client accepts none of this view's mimetypes
+            return LDAPI.negotiate_mimetype(accept, tuple(views_mimetypes[view])) or 'text/html'
         else:
             # HTML is default
             return 'text/html'
 
     @staticmethod
-    def get_valid_view_and_mimetype(view, mimetype, views_mimetypes):
+    def get_valid_view_and_mimetype(view, mimetype, views_mimetypes, accept=None):
         """
         If both the model and the mimetype are valid, return them
         :param view: the model model parameter
         :param mimetype: the MIMETYPE mimetype parameter
         :param views_mimetypes: the allowed model and their mimetypes in this instance
+        :param accept: the HTTP Accept header, used to choose the mimetype if no mimetype parameter is given
         :return: valid model and mimetype
         """
         view = LDAPI.valid_view(view, views_mimetypes)
-        mimetype = LDAPI.valid_mimetype(mimetype, view, views_mimetypes)
+        mimetype = LDAPI.valid_mimetype(mimetype, view, views_mimetypes, accept)
         if view and mimetype:
             # return valid model and mimetype
             return view, mimetype
@@ -1,11 +1,73 @@
 import logging
+import os
 import _config
 from flask import Flask
-from controller import pages, model_classes
+from jinja2 import FileSystemBytecodeCache
+from controller import pages, model_classes, model_classes_functions, assets, assets_functions, compression, warmup, \
+    sparql, fragments
 
-app = Flask(__name__, template_folder=_config.TEMPLATES_DIR, static_folder=_config.STATIC_DIR)
-app.register_blueprint(pages.pages)
-app.register_blueprint(model_classes.model_classes)
+
+def preload_shared_state(app):
+    """
+    Builds all the read-only state that requests share, so that it is made once rather than on each worker's first
+    requests. When the app is preloaded in a pre-forking server's master process (see _installation/gunicorn.conf.py),
+    the workers then share this state's memory pages copy-on-write.
+    """
+    # the routes import these lazily
+    import lxml.etree
+    import rdflib
+    from model import survey, register, generations
+
+    model_classes_functions.get_classes_views_mimetypes()
+    # a request context for the HTML views' relative URLs, which don't depend on the request
+    with app.test_request_context():
+        model_classes.precompute_alternates_views()
+    # map the catalogue snapshot and build its indexes, so forked workers inherit them
+    generations.holder.refresh()
+
+
+def create_app(preload=_config.PRELOAD):
+    """
+    Makes the Flask app
+
+    :param preload: whether to build the shared read-only state now, rather than lazily in each worker
+    :return: a Flask app
+    """
+    app = Flask(__name__, template_folder=_config.TEMPLATES_DIR, static_folder=_config.STATIC_DIR)
+    if _config.JINJA_BYTECODE_CACHE_DIR is not None:
+        os.makedirs(_config.JINJA_BYTECODE_CACHE_DIR, exist_ok=True)
+        app.jinja_options = dict(
+            app.jinja_options,
+            bytecode_cache=FileSystemBytecodeCache(_config.JINJA_BYTECODE_CACHE_DIR)
+        )
+    app.register_blueprint(pages.pages)
+    app.register_blueprint(model_classes.model_classes)
+    app.register_blueprint(sparql.sparql_endpoint)
+    app.register_blueprint(fragments.triple_pattern_fragments)
+    app.register_blueprint(assets.assets)
+    app.register_blueprint(compression.compression)
+
+    # minify, precompress & content-hash the large static assets, e.g. vis.js, if that hasn't already been done
+    assets_functions.build_assets()
+
+    if preload:
+        preload_shared_state(app)
+
+    # start with the cached records and representations the previous workers left, see model/checkpoint.py. Generation
+    # keyed ones are only loaded if the catalogue has been preloaded
+    if _config.CACHE_CHECKPOINT_FILE is not None:
+        from model import checkpoint
+        checkpoint.load()
+        app.before_request(checkpoint.ensure_started)
+
+    # do the slow one-off work before accepting traffic
+    if _config.WARM_UP:
+        warmup.warm_up(app)
+
+    return app
+
+
+app = create_app()
 
 
 # run the Flask app
@@ -0,0 +1,64 @@
+"""
+This file contains the HTTP route for built (minified, precompressed & content-hashed) static assets
+"""
+import mimetypes
+from os.path import join, exists
+from flask import Blueprint, Response, request, url_for, abort
+from controller import assets_functions
+from controller.routes_functions import accepted_encodings
+import _config
+
+assets = Blueprint('assets', __name__)
+
+# a year, the longest that HTTP/1.1 caches are asked to honour
+ASSET_MAX_AGE = 31536000
+
+
+def asset_url(filename):
+    """
+    Gives the URL of a static asset, to be used in templates instead of url_for('static', ...)
+
+    :param filename: the asset's path relative to the static folder, e.g. js/vis.js
+    :return: the URL of the built, content-hashed, asset or of the original static file if it was not built
+    """
+    built = assets_functions.get_built_filename(filename)
+    if built is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.asset', filename=built)
+
+
+@assets.app_context_processor
+def inject_asset_url():
+    return dict(asset_url=asset_url)
+
+
+@assets.route('/assets/<path:filename>')
+def asset(filename):
+    """
+    A built static asset, served in its precompressed form for clients that accept it
+
+    :return: HTTP Response
+    """
+    path = join(_config.ASSETS_BUILD_DIR, filename)
+    # only files named in the manifest may be served, which also rules out path traversal
+    if not assets_functions.is_built_filename(filename) or not exists(path):
+        abort(404)
+
+    encodings = accepted_encodings(request.headers.get('Accept-Encoding'))
+    content_encoding = None
+    for coding, suffix in [('br', '.br'), ('gzip', '.gz')]:
+        if coding in encodings and exists(path + suffix):
+            path += suffix
+            content_encoding = coding
+            break
+
+    with open(path, 'rb') as f:
+        body = f.read()
+
+    r = Response(body, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if content_encoding is not None:
+        r.headers['Content-Encoding'] = content_encoding
+    r.headers['Vary'] = 'Accept-Encoding'
+    # the filename changes whenever the content does so caches may keep it for as long as they like
+    r.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(ASSET_MAX_AGE)
+    return r
@@ -0,0 +1,155 @@
+"""
+Builds minified, precompressed and content-hashed copies of the large static assets, such as vis.js, for serving by the
+assets Blueprint (controller/assets.py) with long-lived cache headers.
+
+Run at app startup (idempotent: already built files are not rebuilt) or at build time with:
+
+    python -m controller.assets_functions
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from os.path import join, dirname, exists, splitext
+import _config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+# maps the original static filename, e.g. js/vis.js, to its built, hashed filename, e.g. js/vis.3f2a9c1b04de.js
+_manifest = {}
+
+
+def minify(filename, content):
+    """
+    Minifies JavaScript and CSS content, if the minifier packages are installed, otherwise returns it unchanged
+
+    :param filename: the asset's filename, used to determine its type
+    :param content: the asset's content as a string
+    :return: a string
+    """
+    ext = splitext(filename)[1]
+    if ext == '.js' and rjsmin is not None:
+        # keep /*! ... */ license comments
+        return rjsmin.jsmin(content, keep_bang_comments=True)
+    elif ext == '.css' and rcssmin is not None:
+        return rcssmin.cssmin(content, keep_bang_comments=True)
+    return content
+
+
+def _write_atomically(path, data):
+    # several workers may build at once so never expose a half-written file
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _load_build_manifest(build_dir):
+    try:
+        with open(join(build_dir, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def build_asset(filename, static_dir=_config.STATIC_DIR, build_dir=_config.ASSETS_BUILD_DIR, previous=None):
+    """
+    Builds the minified, content-hashed file for one static asset and its gzip and brotli precompressed variants
+
+    :param filename: the asset's path relative to the static folder, e.g. js/vis.js
+    :param previous: this asset's entry in the last build's manifest, if any, used to skip rebuilding unchanged assets
+    :return: a dict of the source file's hash ('source') and the built file's path relative to the build folder
+        ('built'), e.g. js/vis.3f2a9c1b04de.js
+    """
+    with open(join(static_dir, filename), 'rb') as f:
+        source = f.read()
+    source_hash = hashlib.sha256(source).hexdigest()
+
+    # minifying vis.js takes seconds so don't redo it in every worker if the source hasn't changed
+    if previous is not None and previous.get('source') == source_hash \
+            and exists(join(build_dir, previous.get('built', ''))):
+        return previous
+
+    content = minify(filename, source.decode('utf-8')).encode('utf-8')
+
+    root, ext = splitext(filename)
+    hashed = '{}.{}{}'.format(root, hashlib.sha256(content).hexdigest()[:12], ext)
+    path = join(build_dir, hashed)
+
+    os.makedirs(dirname(path), exist_ok=True)
+    if not exists(path):
+        _write_atomically(path, content)
+    if not exists(path + '.gz'):
+        # mtime=0 makes the gzip output reproducible
+        _write_atomically(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None and not exists(path + '.br'):
+        _write_atomically(path + '.br', brotli.compress(content, quality=11))
+
+    return {'source': source_hash, 'built': hashed}
+
+
+def build_assets(assets=_config.STATIC_ASSETS, static_dir=_config.STATIC_DIR, build_dir=_config.ASSETS_BUILD_DIR):
+    """
+    Builds all the configured static assets and loads the resulting manifest for use by asset_url()
+
+    :return: the manifest, a dict of original filename to built filename
+    """
+    previous = _load_build_manifest(build_dir)
+    build = {}
+    for filename in assets:
+        try:
+            build[filename] = build_asset(filename, static_dir, build_dir, previous.get(filename))
+        except IOError as e:
+            # an asset that can't be built is just served, uncompressed, from the static folder
+            logging.error('Could not build static asset {}: {}'.format(filename, e))
+
+    if build != previous:
+        os.makedirs(build_dir, exist_ok=True)
+        _write_atomically(join(build_dir, 'manifest.json'), json.dumps(build, indent=2).encode('utf-8'))
+
+    _manifest.clear()
+    _manifest.update({filename: b['built'] for filename, b in build.items()})
+    return dict(_manifest)
+
+
+def get_built_filename(filename):
+    """
+    :param filename: an original static filename, e.g. js/vis.js
+    :return: its built, hashed, filename or None if it has not been built
+    """
+    return _manifest.get(filename)
+
+
+def is_built_filename(built):
+    """
+    :param built: a built filename, e.g. js/vis.3f2a9c1b04de.js
+    :return: True if it is a current build output
+    """
+    return built in _manifest.values()
+
+
+if __name__ == '__main__':
+    for original, built in sorted(build_assets().items()):
+        sizes = []
+        for suffix in ['', '.gz', '.br']:
+            path = join(_config.ASSETS_BUILD_DIR, built + suffix)
+            if exists(path):
+                sizes.append('{}: {:,} bytes'.format(suffix or 'minified', os.path.getsize(path)))
+        print('{} ({:,} bytes) -> {} ({})'.format(
+            original,
+            os.path.getsize(join(_config.STATIC_DIR, original)),
+            built,
+            ', '.join(sizes)
+        ))
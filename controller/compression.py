@@ -0,0 +1,93 @@
+"""
+This file contains negotiated gzip/brotli compression of dynamic responses, such as RDF/XML and JSON-LD Survey and
+Register pages, configured per mimetype by _config.COMPRESSION
+"""
+import gzip
+import hashlib
+from flask import Blueprint, request
+from controller.routes_functions import accepted_encodings
+from model import checkpoint
+from model.cache import LRUCache
+import _config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+compression = Blueprint('compression', __name__)
+
+# compressed bodies keyed by (digest of the uncompressed body, encoding, level) so that a body that is sent again, e.g.
+# a cached representation, is only compressed once
+compressed_bodies = LRUCache(max_items=_config.COMPRESSION_CACHE_ITEMS, max_bytes=_config.COMPRESSION_CACHE_BYTES)
+checkpoint.register('compression', compressed_bodies)
+
+
+def compress(body, encoding, level):
+    """
+    Compresses a response body, reusing a previous compression of an identical body if there is one
+
+    :param body: the uncompressed body bytes
+    :param encoding: 'br' or 'gzip'
+    :param level: the brotli quality or gzip compression level
+    :return: the compressed body bytes
+    """
+    key = (hashlib.sha1(body).hexdigest(), encoding, level)
+    compressed = compressed_bodies.get(key)
+    if compressed is None:
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=level)
+        else:
+            compressed = gzip.compress(body, compresslevel=level, mtime=0)
+        compressed_bodies.set(key, compressed)
+    return compressed
+
+
+def choose_encoding(settings, accept_encoding):
+    """
+    Chooses the content encoding to use for a response
+
+    :param settings: this response's mimetype's entry in _config.COMPRESSION
+    :param accept_encoding: the request's Accept-Encoding header value
+    :return: a tuple of (encoding, level) or None if the response should not be compressed
+    """
+    encodings = accepted_encodings(accept_encoding)
+    # brotli gives smaller bodies than gzip, at the same CPU cost, for text
+    if 'br' in encodings and brotli is not None and settings.get('br') is not None:
+        return 'br', settings['br']
+    if 'gzip' in encodings and settings.get('gzip') is not None:
+        return 'gzip', settings['gzip']
+    return None
+
+
+@compression.after_app_request
+def compress_response(response):
+    settings = _config.COMPRESSION.get(response.mimetype)
+    if settings is None:
+        return response
+
+    # the body differs by Accept-Encoding, even if this one isn't compressed
+    response.vary.add('Accept-Encoding')
+
+    if response.status_code != 200 \
+            or response.direct_passthrough \
+            or response.is_streamed \
+            or 'Content-Encoding' in response.headers \
+            or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+
+    body = response.get_data()
+    if len(body) < settings.get('min_size', _config.COMPRESSION_MIN_SIZE):
+        return response
+
+    chosen = choose_encoding(settings, request.headers.get('Accept-Encoding'))
+    if chosen is None:
+        return response
+    encoding, level = chosen
+
+    response.set_data(compress(body, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag('{}-{}'.format(etag, encoding), weak)
+    return response
@@ -0,0 +1,67 @@
+"""
+This file contains the HTTP route of the Triple Pattern Fragments of the whole survey catalogue, see model/fragments.py
+"""
+from flask import Blueprint, Response, request
+from _ldapi.ldapi import LDAPI
+from controller import routes_functions
+from model import generations, fragments
+import _config
+
+triple_pattern_fragments = Blueprint('fragments', __name__)
+
+
+@triple_pattern_fragments.route('/fragments')
+def fragment():
+    """
+    A Triple Pattern Fragment: the triples matching ?subject=, ?predicate= and ?object=, a page at a time
+
+    :return: HTTP Response
+    """
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been loaded yet', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(_config.CATALOGUE_CHECK_SECONDS)})
+
+    mimetype = request.args.get('_format')
+    if mimetype is None:
+        mimetype = LDAPI.negotiate_mimetype(request.headers.get('Accept'), tuple(fragments.MIMETYPES)) \
+            or fragments.MIMETYPES[0]
+    elif mimetype not in fragments.MIMETYPES:
+        return Response('Fragments are available in {}, not {}'.format(', '.join(fragments.MIMETYPES), mimetype),
+                        status=400, mimetype='text/plain')
+    try:
+        page = int(request.args.get('page', '1'))
+        if page < 1:
+            raise ValueError()
+    except ValueError:
+        return Response('page must be a positive integer', status=400, mimetype='text/plain')
+
+    # the same fragment of the same generation is always the same, so clients and caches need only revalidate
+    etag = routes_functions.generation_etag(gen, mimetype)
+    not_modified = routes_functions.not_modified_Response(etag)
+    if not_modified is not None:
+        return not_modified
+
+    index = gen.lazy_index('fragments')
+    if index is None:
+        return Response('The fragments index is being built, please try again shortly', status=503,
+                        mimetype='text/plain', headers={'Retry-After': '30'})
+    try:
+        data = fragments.fragment_graph(
+            index,
+            request.base_url,
+            request.args.get('subject'),
+            request.args.get('predicate'),
+            request.args.get('object'),
+            page,
+            mimetype=mimetype
+        )
+    except ValueError as e:
+        return Response(str(e), status=400, mimetype='text/plain')
+
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age={}'.format(_config.CATALOGUE_CHECK_SECONDS)
+    if request.args.get('_format') is None:
+        response.headers.add('Vary', 'Accept')
+    return response
@@ -1,16 +1,94 @@
 """
 This file contains all the HTTP routes for classes from the IGSN model, such as Samples and the Sample Register
 """
-from flask import Blueprint, render_template, request, Response
+from flask import Blueprint, render_template, request, Response, send_file
 from controller import routes_functions
 from _ldapi.ldapi import LDAPI, LdapiParameterError
 from controller import model_classes_functions
-import urllib
+# these build indexes of each catalogue generation, so must be registered before the catalogue is loaded
+from model import agents, nearby, stats, tiles
+import math
+import urllib.parse
 from urllib.parse import urlparse
 import _config
 import requests
 
 model_classes = Blueprint('model_classes', __name__)
+model_classes.after_request(routes_functions.vary_accept)
+
+SURVEY_CLASS_URI = 'http://pid.geoscience.gov.au/def/ont/ga/pdm#Survey'
+REGISTER_CLASS_URI = 'http://purl.org/linked-data/registry#Register'
+AGENT_CLASS_URI = 'http://www.w3.org/ns/prov#Agent'
+ENTITY_CLASS_URI = 'http://www.w3.org/ns/prov#Entity'
+
+
+def nearby_k():
+    """
+    :return: the k query parameter, the number of nearby surveys wanted, or _config.NEARBY_K if there isn't one
+    :raises ValueError: if k isn't an integer from 1 to _config.NEARBY_MAX_K
+    """
+    try:
+        k = int(request.args.get('k', _config.NEARBY_K))
+    except ValueError:
+        k = None
+    if k is None or not 0 < k <= _config.NEARBY_MAX_K:
+        raise ValueError('k must be an integer from 1 to {}'.format(_config.NEARBY_MAX_K))
+    return k
+
+
+def views_formats(views_mimetypes):
+    """
+    :return: a class's views and their formats, i.e. its views_mimetypes without the renderer
+    """
+    return {k: v for k, v in views_mimetypes.items() if k != 'renderer'}
+
+
+def precompute_alternates_views():
+    """
+    Makes the alternates views of each class in every format, so that requests for them need only substitute in their
+    instance's URI. Needs a request context.
+    """
+    classes_views_mimetypes = model_classes_functions.get_classes_views_mimetypes()
+
+    survey_views_mimetypes = classes_views_mimetypes.get('http://pid.geoscience.gov.au/def/ont/gapd#Survey')
+    for mimetype in survey_views_mimetypes['alternates']:
+        routes_functions.get_alternates_view(
+            SURVEY_CLASS_URI.split('#')[1],
+            SURVEY_CLASS_URI,
+            True,
+            views_formats(survey_views_mimetypes),
+            mimetype
+        )
+
+    agent_views_mimetypes = classes_views_mimetypes.get(AGENT_CLASS_URI)
+    for mimetype in agent_views_mimetypes['alternates']:
+        routes_functions.get_alternates_view(
+            AGENT_CLASS_URI.split('#')[1],
+            AGENT_CLASS_URI,
+            True,
+            views_formats(agent_views_mimetypes),
+            mimetype
+        )
+
+    entity_views_mimetypes = classes_views_mimetypes.get(ENTITY_CLASS_URI)
+    for mimetype in entity_views_mimetypes['alternates']:
+        routes_functions.get_alternates_view(
+            ENTITY_CLASS_URI.split('#')[1],
+            ENTITY_CLASS_URI,
+            True,
+            views_formats(entity_views_mimetypes),
+            mimetype
+        )
+
+    register_views_mimetypes = classes_views_mimetypes.get(REGISTER_CLASS_URI)
+    for mimetype in register_views_mimetypes['alternates']:
+        routes_functions.get_alternates_view(
+            REGISTER_CLASS_URI,
+            urllib.parse.quote_plus(REGISTER_CLASS_URI),
+            False,
+            views_formats(register_views_mimetypes),
+            mimetype
+        )
 
 
 @model_classes.route('/survey/<string:survey_id>')
@@ -28,36 +106,300 @@ def survey(survey_id):
         view, mimetype = LDAPI.get_valid_view_and_mimetype(
             request.args.get('_view'),
             request.args.get('_format'),
-            views_mimetypes
+            views_mimetypes,
+            request.headers.get('Accept')
         )
 
-        # if alternates model, return this info from file
+        # if alternates model, return this info from the precomputed views
         if view == 'alternates':
-            class_uri = 'http://pid.geoscience.gov.au/def/ont/ga/pdm#Survey'
-            class_uri_name = class_uri.split('#')[1]
             instance_uri = 'http://pid.geoscience.gov.au/survey/ga/' + survey_id
-            del views_mimetypes['renderer']
             return routes_functions.render_alternates_view(
-                class_uri_name,
-                class_uri,
+                SURVEY_CLASS_URI.split('#')[1],
+                SURVEY_CLASS_URI,
                 instance_uri,
                 instance_uri,
-                views_mimetypes,
-                request.args.get('_format')
+                views_formats(views_mimetypes),
+                mimetype
             )
         else:
             from model.survey import SurveyRenderer
             try:
                 s = SurveyRenderer(survey_id)
+                if request.method == 'HEAD':
+                    head = s.render_head(view, mimetype)
+                    if head is not None:
+                        return head
+                if view == 'nearby':
+                    try:
+                        return s.render_nearby(mimetype, nearby_k())
+                    except ValueError as e:
+                        return routes_functions.client_error_Response(str(e))
                 return s.render(view, mimetype)
             except ValueError as e:
                 print(e)
                 return render_template('page_no_survey_record.html'), 404
+            except requests.RequestException:
+                return Response('The ARGUS API could not be reached.', status=502, mimetype='text/plain')
 
     except LdapiParameterError as e:
         return routes_functions.client_error_Response(e)
 
 
+@model_classes.route('/survey/tiles/<int:z>/<int:x>/<int:y>')
+def survey_tiles(z, x, y):
+    """
+    A web map tile of survey footprints, or clusters of surveys at low zooms, as a Mapbox Vector Tile or GeoJSON
+
+    :return: HTTP Response
+    """
+    from model import generations
+
+    if not (0 <= z <= _config.TILES_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return Response('No tile {}/{}/{}'.format(z, x, y), status=404, mimetype='text/plain')
+
+    mimetype = request.args.get('_format')
+    if mimetype is None:
+        mimetype = LDAPI.negotiate_mimetype(request.headers.get('Accept'), tuple(tiles.MIMETYPES)) or tiles.MIMETYPES[0]
+    elif mimetype.replace(' ', '+') not in tiles.MIMETYPES:
+        return routes_functions.client_error_Response(
+            'The _format parameter is invalid. For tiles, it must be one of {}.'.format(', '.join(tiles.MIMETYPES)))
+    mimetype = mimetype.replace(' ', '+')
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+
+    # a tile is the same until the next catalogue generation
+    etag = routes_functions.generation_etag(gen, mimetype)
+    not_modified = routes_functions.not_modified_Response(etag)
+    if not_modified is not None:
+        return not_modified
+    response = Response(tiles.get_tile(gen, z, x, y, mimetype), mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age={}'.format(_config.CATALOGUE_CHECK_SECONDS)
+    return response
+
+
+@model_classes.route('/survey/context.jsonld')
+def survey_jsonld_context():
+    """
+    The fixed @context of the surveys' JSON-LD
+
+    :return: HTTP Response
+    """
+    from model import jsonld
+
+    response = Response(jsonld.context_document(), mimetype='application/ld+json')
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+@model_classes.route('/survey/stats')
+def surveys_stats():
+    """
+    Survey counts and line km of the whole catalogue, all the cubes as JSON or one cube, chosen by ?by=, e.g. year,state,
+    as JSON or RDF Data Cube observations
+
+    :return: HTTP Response
+    """
+    from model import generations
+
+    mimetype = request.args.get('_format')
+    if mimetype is None:
+        mimetype = LDAPI.negotiate_mimetype(request.headers.get('Accept'), stats.MIMETYPES) or stats.JSON_MIMETYPE
+    elif mimetype.replace(' ', '+') not in stats.MIMETYPES:
+        return routes_functions.client_error_Response(
+            'The _format parameter is invalid. For statistics, it must be one of {}.'.format(', '.join(stats.MIMETYPES)))
+    mimetype = mimetype.replace(' ', '+')
+    try:
+        cube = stats.parse_cube(request.args['by']) if 'by' in request.args else None
+    except ValueError as e:
+        return routes_functions.client_error_Response(str(e))
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+
+    # the statistics are the same until the next catalogue generation
+    etag = routes_functions.generation_etag(gen, mimetype)
+    not_modified = routes_functions.not_modified_Response(etag)
+    if not_modified is not None:
+        return not_modified
+    try:
+        data = gen.index('stats').document(cube, mimetype)
+    except ValueError as e:
+        return routes_functions.client_error_Response(str(e))
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age={}'.format(_config.CATALOGUE_CHECK_SECONDS)
+    return response
+
+
+@model_classes.route('/survey/export')
+def surveys_export():
+    """
+    Every survey, in every RDF view, as gzipped N-Triples, as N-Quads with a named graph per survey view or as a
+    dictionary-encoded RDF file
+
+    :return: HTTP Response, of the export file written after the last harvest, or 503 if there isn't one yet
+    """
+    from model import export, generations, rdfdict
+
+    formats = {mimetype: export_format for export_format, mimetype in export.MIMETYPES.items()}
+    formats[rdfdict.MIMETYPE] = 'rdfd'
+    mimetype = request.args.get('_format', 'application/n-triples').replace(' ', '+')
+    if mimetype not in formats:
+        return routes_functions.client_error_Response(
+            'The _format parameter is invalid. For the export, it must be one of {}.'.format(', '.join(formats)))
+    export_format = formats[mimetype]
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+    # export files are written offline, after each harvest, never by a request
+    path = rdfdict.get_rdfdict_file() if export_format == 'rdfd' else export.get_export_file(export_format)
+    if path is None:
+        return Response('The export has not been written yet.', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(_config.EXPORT_RETRY_SECONDS)})
+    if export_format == 'rdfd':
+        # already compressed, and read in place by its users, so never gzipped
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True, download_name='surveys.rdfd',
+                             as_attachment=True)
+        response.headers['Cache-Control'] = 'public, max-age={}'.format(_config.CATALOGUE_CHECK_SECONDS)
+        return response
+
+    headers = {'Content-Disposition': 'attachment; filename=surveys.{}'.format(export_format)}
+    if 'gzip' in routes_functions.accepted_encodings(request.headers.get('Accept-Encoding')):
+        response = send_file(path, mimetype=mimetype, conditional=True)
+        response.headers.update(headers)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(export.gunzipped(path), mimetype=mimetype, headers=headers)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def surveys_geojson():
+    """
+    The Survey Register as a streamed GeoJSON FeatureCollection of survey footprints, of the surveys within ?bbox= and
+    matching any field filters, e.g. ?state=WA, and start_date/end_date, with coordinates rounded to ?precision= places
+
+    :return: HTTP Response
+    """
+    from model import generations, geojson
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+
+    try:
+        rows = matching_rows(gen.snapshot)
+        precision = geojson.parse_precision(request.args['precision']) if 'precision' in request.args else None
+    except ValueError as e:
+        return routes_functions.client_error_Response(str(e))
+
+    return streamed_Response(geojson.feature_collection(gen.snapshot, rows, precision), geojson.MIMETYPE)
+
+
+def surveys_csv():
+    """
+    The Survey Register as streamed CSV, of every field of the surveys chosen as for GeoJSON
+
+    :return: HTTP Response
+    """
+    from model import generations, tabular
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+    try:
+        rows = matching_rows(gen.snapshot)
+    except ValueError as e:
+        return routes_functions.client_error_Response(str(e))
+
+    response = streamed_Response(tabular.csv_rows(gen.snapshot, rows), tabular.CSV_MIMETYPE)
+    response.headers['Content-Disposition'] = 'attachment; filename=surveys.csv'
+    return response
+
+
+def surveys_parquet():
+    """
+    The whole Survey Register as a Parquet file, which supports conditional and range requests
+
+    :return: HTTP Response
+    """
+    from model import generations, tabular
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+    if tabular.pyarrow is None:
+        return Response('Parquet is not available on this server, as pyarrow is not installed.', status=501,
+                        mimetype='text/plain')
+    # written offline, after each harvest, never by a request
+    path = tabular.get_parquet_file()
+    if path is None:
+        return Response('The Parquet file has not been written yet.', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(_config.EXPORT_RETRY_SECONDS)})
+
+    response = send_file(path, mimetype=tabular.PARQUET_MIMETYPE, conditional=True, etag=True,
+                         download_name='surveys.parquet', as_attachment=True)
+    response.headers['Cache-Control'] = 'public, max-age={}'.format(_config.CATALOGUE_CHECK_SECONDS)
+    return response
+
+
+def matching_rows(snapshot):
+    """
+    :return: the record indexes of the surveys within ?bbox=, matching any field filters, e.g. ?state=WA, and within
+        ?start_date= and ?end_date=, as per model.geojson.matching_rows()
+    :raises ValueError: if a parameter isn't valid
+    """
+    from model import geojson
+
+    bbox = geojson.parse_bbox(request.args['bbox']) if 'bbox' in request.args else None
+    filters = {attr: request.args[attr] for attr in geojson.FILTERS if attr in request.args}
+    start_date = geojson.parse_date(request.args['start_date'], 'start_date') if 'start_date' in request.args else None
+    end_date = geojson.parse_date(request.args['end_date'], 'end_date') if 'end_date' in request.args else None
+    return geojson.matching_rows(snapshot, bbox, filters, start_date, end_date)
+
+
+def streamed_Response(chunks, mimetype):
+    """
+    :return: a Response streaming chunks of bytes, gzipped if the client accepts gzip
+    """
+    from model import export
+
+    gzip = 'gzip' in routes_functions.accepted_encodings(request.headers.get('Accept-Encoding'))
+    response = Response(export.gzipped(chunks) if gzip else chunks, mimetype=mimetype)
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def surveys_near(mimetype):
+    """
+    The k surveys nearest ?near=lat,lon, as HTML or GeoJSON
+
+    :return: HTTP Response
+    """
+    from model import generations
+
+    if mimetype not in ('text/html', 'application/geo+json'):
+        return routes_functions.client_error_Response(
+            'The surveys near a point are available as text/html or application/geo+json.')
+    try:
+        lat, lon = nearby.parse_near(request.args['near'])
+        k = nearby_k()
+    except ValueError as e:
+        return routes_functions.client_error_Response(str(e))
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+    return nearby.render(gen, lat, lon, k, mimetype)
+
+
 @model_classes.route('/survey/')
 def surveys():
     """
@@ -73,24 +415,32 @@ def surveys():
         view, mime_format = LDAPI.get_valid_view_and_mimetype(
             request.args.get('_view'),
             request.args.get('_format'),
-            views_mimetypes
+            views_mimetypes,
+            request.headers.get('Accept')
         )
 
-        # if alternates model, return this info from file
-        class_uri = 'http://purl.org/linked-data/registry#Register'
+        # if alternates model, return this info from the precomputed views
+        class_uri = REGISTER_CLASS_URI
 
         if view == 'alternates':
-            del views_mimetypes['renderer']
             return routes_functions.render_alternates_view(
                 class_uri,
                 urllib.parse.quote_plus(class_uri),
                 None,
                 None,
-                views_mimetypes,
-                request.args.get('_format')
+                views_formats(views_mimetypes),
+                mime_format
             )
+        elif 'near' in request.args:
+            return surveys_near(mime_format)
+        elif mime_format == 'application/geo+json':
+            return surveys_geojson()
+        elif mime_format == 'text/csv':
+            return surveys_csv()
+        elif mime_format == 'application/vnd.apache.parquet':
+            return surveys_parquet()
         else:
-            from model import register
+            from model import generations, register
 
             # pagination
             page = int(request.args.get('page')) if request.args.get('page') is not None else 1
@@ -118,10 +468,10 @@ def surveys():
 
             # add a link to "next" and "last"
             try:
-                # r = requests.get(_config.XML_API_URL_TOTAL_COUNT)
-                # no_of_samples = int(r.content.split('<RECORD_COUNT>')[1].split('</RECORD_COUNT>')[0])
-                no_of_samples = 9200  # TODO: implement a survey count Oracle XML API
-                last_page_no = int(round(no_of_samples / per_page, 0)) + 1  # same as math.ceil()
+                # the catalogue snapshot has every survey; without one, about as many as ARGUS has
+                gen = generations.current_generation()
+                no_of_samples = len(gen.snapshot) if gen is not None else 9200
+                last_page_no = max(math.ceil(no_of_samples / per_page), 1)
 
                 # if we've gotten the last page value successfully, we can choke if someone enters a larger value
                 if page > last_page_no:
@@ -151,3 +501,224 @@ def surveys():
 
     except LdapiParameterError as e:
         return routes_functions.client_error_Response(e)
+
+
+@model_classes.route('/agent/<string:slug>')
+def agent(slug):
+    """
+    A single Agent: a contractor, operator or processor of surveys
+
+    :return: HTTP Response
+    """
+    from model import generations
+
+    # agents' names in any spelling redirect to their canonical URI
+    canonical = agents.agent_slug(slug)
+    if canonical != slug:
+        if not canonical:
+            return Response('No agent {}'.format(slug), status=404, mimetype='text/plain')
+        location = _config.BASE_URI_AGENT + canonical
+        if request.query_string:
+            location += '?' + request.query_string.decode('utf-8')
+        return Response(status=301, headers={'Location': location})
+
+    views_mimetypes = model_classes_functions.get_classes_views_mimetypes().get(AGENT_CLASS_URI)
+    try:
+        view, mimetype = LDAPI.get_valid_view_and_mimetype(
+            request.args.get('_view'),
+            request.args.get('_format'),
+            views_mimetypes,
+            request.headers.get('Accept')
+        )
+    except LdapiParameterError as e:
+        return routes_functions.client_error_Response(e)
+
+    if view == 'alternates':
+        instance_uri = _config.BASE_URI_AGENT + slug
+        return routes_functions.render_alternates_view(
+            AGENT_CLASS_URI.split('#')[1],
+            AGENT_CLASS_URI,
+            instance_uri,
+            instance_uri,
+            views_formats(views_mimetypes),
+            mimetype
+        )
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+    a = gen.index('agents').get(slug)
+    if a is None:
+        return Response('No agent {}'.format(slug), status=404, mimetype='text/plain')
+    return agents.AgentRenderer(a).render(view, mimetype)
+
+
+@model_classes.route('/agent/')
+def agents_register():
+    """
+    The Register of Agents
+
+    :return: HTTP Response
+    """
+    from model import generations
+
+    views_mimetypes = model_classes_functions.get_classes_views_mimetypes().get(REGISTER_CLASS_URI)
+    try:
+        view, mimetype = LDAPI.get_valid_view_and_mimetype(
+            request.args.get('_view'),
+            request.args.get('_format'),
+            views_mimetypes,
+            request.headers.get('Accept')
+        )
+    except LdapiParameterError as e:
+        return routes_functions.client_error_Response(e)
+
+    if view == 'alternates':
+        return routes_functions.render_alternates_view(
+            REGISTER_CLASS_URI,
+            urllib.parse.quote_plus(REGISTER_CLASS_URI),
+            None,
+            None,
+            views_formats(views_mimetypes),
+            mimetype
+        )
+
+    if mimetype == 'application/geo+json':
+        return routes_functions.client_error_Response('Agents have no footprints, so no GeoJSON representation.')
+    if mimetype in ('text/csv', 'application/vnd.apache.parquet'):
+        return routes_functions.client_error_Response('The Agents Register has no tabular representation.')
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+    index = gen.index('agents')
+
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 100))
+    except ValueError:
+        return routes_functions.client_error_Response('page and per_page must be integers')
+    if not 0 < per_page <= 100:
+        return routes_functions.client_error_Response('You must enter either no value for per_page or an integer <= 100.')
+    last_page_no = max(1, math.ceil(len(index) / per_page))
+    if not 0 < page <= last_page_no:
+        return routes_functions.client_error_Response(
+            'You must enter either no value for page or an integer <= {} which is the last page number.'.format(
+                last_page_no))
+
+    links = [
+        '<http://www.w3.org/ns/ldp#Resource>; rel="type"',
+        '<http://www.w3.org/ns/ldp#Page>; rel="type"',
+        '<{}?per_page={}>; rel="first"'.format(_config.BASE_URI_AGENT, per_page)
+    ]
+    if page != 1:
+        links.append('<{}?per_page={}&page={}>; rel="prev"'.format(_config.BASE_URI_AGENT, per_page, page - 1))
+    if page != last_page_no:
+        links.append('<{}?per_page={}&page={}>; rel="next"'.format(_config.BASE_URI_AGENT, per_page, page + 1))
+    links.append('<{}?per_page={}&page={}>; rel="last"'.format(_config.BASE_URI_AGENT, per_page, last_page_no))
+
+    return agents.AgentRegisterRenderer(request, index, page, per_page)\
+        .render(view, mimetype, extra_headers={'Link': ', '.join(links)})
+
+
+@model_classes.route('/entity/<int:entity_id>')
+def entity(entity_id):
+    """
+    A single Entity
+
+    :return: HTTP Response
+    """
+    from model.entity import EntityRenderer
+
+    views_mimetypes = model_classes_functions.get_classes_views_mimetypes().get(ENTITY_CLASS_URI)
+    try:
+        view, mimetype = LDAPI.get_valid_view_and_mimetype(
+            request.args.get('_view'),
+            request.args.get('_format'),
+            views_mimetypes,
+            request.headers.get('Accept')
+        )
+    except LdapiParameterError as e:
+        return routes_functions.client_error_Response(e)
+
+    if view == 'alternates':
+        instance_uri = _config.BASE_URI_ENTITY + str(entity_id)
+        return routes_functions.render_alternates_view(
+            ENTITY_CLASS_URI.split('#')[1],
+            ENTITY_CLASS_URI,
+            instance_uri,
+            instance_uri,
+            views_formats(views_mimetypes),
+            mimetype
+        )
+
+    try:
+        return EntityRenderer(entity_id).render(view, mimetype)
+    except requests.RequestException:
+        return Response('The entities API could not be reached.', status=502, mimetype='text/plain')
+
+
+@model_classes.route('/entity/')
+def entities_register():
+    """
+    The Register of Entities, paged through the entities API's register
+
+    :return: HTTP Response
+    """
+    from model import register
+    from model.entity import ENTITY
+
+    views_mimetypes = model_classes_functions.get_classes_views_mimetypes().get(REGISTER_CLASS_URI)
+    try:
+        view, mimetype = LDAPI.get_valid_view_and_mimetype(
+            request.args.get('_view'),
+            request.args.get('_format'),
+            views_mimetypes,
+            request.headers.get('Accept')
+        )
+    except LdapiParameterError as e:
+        return routes_functions.client_error_Response(e)
+
+    if view == 'alternates':
+        return routes_functions.render_alternates_view(
+            REGISTER_CLASS_URI,
+            urllib.parse.quote_plus(REGISTER_CLASS_URI),
+            None,
+            None,
+            views_formats(views_mimetypes),
+            mimetype
+        )
+
+    if mimetype == 'application/geo+json':
+        return routes_functions.client_error_Response('The Entities Register has no GeoJSON representation.')
+    if mimetype in ('text/csv', 'application/vnd.apache.parquet'):
+        return routes_functions.client_error_Response('The Entities Register has no tabular representation.')
+    if not ENTITY.register_url:
+        return Response('No entities API register is configured (XML_API_URL_ENTITY_REGISTER).', status=501,
+                        mimetype='text/plain')
+
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 100))
+    except ValueError:
+        return routes_functions.client_error_Response('page and per_page must be integers')
+    if not 0 < per_page <= 100:
+        return routes_functions.client_error_Response('You must enter either no value for per_page or an integer <= 100.')
+    if page < 1:
+        return routes_functions.client_error_Response('page must be an integer >= 1')
+
+    # the entities API doesn't say how many entities there are, so there's no last page link
+    links = [
+        '<http://www.w3.org/ns/ldp#Resource>; rel="type"',
+        '<http://www.w3.org/ns/ldp#Page>; rel="type"',
+        '<{}?per_page={}>; rel="first"'.format(_config.BASE_URI_ENTITY, per_page)
+    ]
+    if page != 1:
+        links.append('<{}?per_page={}&page={}>; rel="prev"'.format(_config.BASE_URI_ENTITY, per_page, page - 1))
+    links.append('<{}?per_page={}&page={}>; rel="next"'.format(_config.BASE_URI_ENTITY, per_page, page + 1))
+
+    try:
+        return register.RegisterRenderer(request, REGISTER_CLASS_URI, None, page, per_page, None, ENTITY)\
+            .render(view, mimetype, extra_headers={'Link': ', '.join(links)})
+    except requests.RequestException:
+        return Response('The entities API could not be reached.', status=502, mimetype='text/plain')
@@ -1,18 +1,30 @@
 import json
 import os
-from werkzeug.contrib.cache import SimpleCache
-cache = SimpleCache()
+from types import MappingProxyType
+
+# the views & mimetypes of each class, loaded once per process (or, in preload mode, once in the master) and frozen
+_classes_views_mimetypes = None
+
+
+def _freeze(o):
+    if isinstance(o, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in o.items()})
+    elif isinstance(o, list):
+        return tuple(_freeze(v) for v in o)
+    return o
 
 
 def get_classes_views_mimetypes():
     """
-    Caches the classes_views_mimetypes.json file in memory as a Python object
-    :return: a Python object parsed from the classes_views_mimetypes.json file
+    Loads the classes_views_mimetypes.json file into memory, once, as a read-only Python object
+
+    The object is shared by all requests (and, when the app is preloaded, by all worker processes) so it can't be
+    modified; copy any part of it that needs to be.
+
+    :return: a read-only mapping parsed from the classes_views_mimetypes.json file
     """
-    cvf = cache.get('classes_views_mimetypes')
-    if cvf is None:
-        json_file = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classes_views_mimetypes.json'), 'r')
-        cvf = json.load(json_file)
-        # times out never (i.e. on app startup/shutdown)
-        cache.set('classes_views_mimetypes', cvf)
-    return cvf
+    global _classes_views_mimetypes
+    if _classes_views_mimetypes is None:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classes_views_mimetypes.json'), 'r') as f:
+            _classes_views_mimetypes = _freeze(json.load(f))
+    return _classes_views_mimetypes
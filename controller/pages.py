@@ -7,6 +7,7 @@ from lxml import etree
 from lxml.builder import ElementMaker
 from _ldapi.ldapi import LDAPI, LdapiParameterError
 from controller import routes_functions
+import _config
 
 pages = Blueprint('controller', __name__)
 
@@ -171,3 +172,51 @@ def index():
 @pages.route('/page/about')
 def about():
     return render_template('page_about.html')
+
+
+@pages.route('/metrics')
+def metrics():
+    """
+    Operational metrics, such as the age of the survey catalogue, in the Prometheus text format
+
+    :return: HTTP Response (text/plain only)
+    """
+    from model import checkpoint, generations, upstream
+
+    lines = []
+    for name, value in generations.holder.metrics().items():
+        if value is not None:
+            lines.append('surveys_catalogue_{} {}'.format(name, value))
+    for name, value in checkpoint.metrics().items():
+        lines.append('surveys_cache_{} {}'.format(name, value))
+    lines.append('surveys_upstream_calls {}'.format(upstream.calls))
+    return Response('\n'.join(lines) + '\n', status=200, mimetype='text/plain')
+
+
+@pages.route('/sitemaps/<string:filename>')
+def sitemap(filename):
+    """
+    The sitemap index and sitemaps of every survey URI, written by python -m model.sitemap
+
+    :return: HTTP Response
+    """
+    return send_from_directory(os.path.join(_config.SITEMAP_DIR, 'sitemaps'), filename, mimetype='application/gzip',
+                               max_age=_config.CATALOGUE_CHECK_SECONDS)
+
+
+@pages.route('/void.ttl')
+@pages.route('/.well-known/void')
+def void():
+    """
+    The VoID description of the survey dataset, written by python -m model.sitemap
+
+    :return: HTTP Response
+    """
+    return send_from_directory(_config.SITEMAP_DIR, 'void.ttl', mimetype='text/turtle',
+                               max_age=_config.CATALOGUE_CHECK_SECONDS)
+
+
+@pages.route('/robots.txt')
+def robots():
+    return send_from_directory(_config.SITEMAP_DIR, 'robots.txt', mimetype='text/plain',
+                               max_age=_config.CATALOGUE_CHECK_SECONDS)
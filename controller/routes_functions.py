@@ -1,11 +1,13 @@
 """
 A list of functions for use anywhere but particularly in routes.py
 """
-from flask import Response, render_template
+from flask import Response, render_template, request
+from markupsafe import escape
 from _ldapi.ldapi import LDAPI
 from rdflib import Graph, Namespace, Literal, URIRef, RDF, XSD, BNode, plugin
 import json
-import urllib
+import re
+import urllib.parse
 
 
 def client_error_Response(error_message):
@@ -16,69 +18,136 @@ def client_error_Response(error_message):
     )
 
 
-def render_alternates_view(class_uri, class_uri_encoded, instance_uri, instance_uri_encoded, views_formats, mimetype):
-    """Renders an HTML table, a JSON object string or a serialised RDF representation of the alternate views of an
-    object"""
-    if mimetype == 'application/json':
-        return Response(json.dumps(views_formats), status=200, mimetype='application/json')
-    elif mimetype in LDAPI.get_rdf_mimetypes_list():
-        g = Graph()
-        LDAPI_O = Namespace('http://promsns.org/def/_ldapi#')
-        g.bind('_ldapi', LDAPI_O)
-        DCT = Namespace('http://purl.org/dc/terms/')
-        g.bind('dct', DCT)
-
-        class_uri_ref = URIRef(urllib.unquote_plus(class_uri))
-
-        if instance_uri:
-            instance_uri_ref = URIRef(instance_uri)
-            g.add((instance_uri_ref, RDF.type, class_uri_ref))
+def accepted_encodings(accept_encoding):
+    """
+    Parses an Accept-Encoding header value into the set of encodings the client will take
+
+    :param accept_encoding: the header value, e.g. 'gzip, deflate, br' or 'gzip;q=1.0, br;q=0'
+    :return: a set of lowercase encoding names
+    """
+    encodings = set()
+    for part in (accept_encoding or '').split(','):
+        params = part.strip().split(';')
+        coding = params[0].strip().lower()
+        q = 1.0
+        for param in params[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            encodings.add(coding)
+    return encodings
+
+
+def generation_etag(gen, variant):
+    """
+    An ETag for a representation that is the same for as long as a catalogue snapshot is current. It's made from the
+    snapshot's write time and size, which every worker and host serving that snapshot share, not the Generation
+    number, which each process counts from 1.
+
+    :param gen: a model.generations.Generation
+    :param variant: what tells this representation from the resource's others, e.g. its mimetype
+    :return: the ETag, unquoted
+    """
+    return 's{}-{}-{}'.format(int(gen.snapshot.created * 1000), len(gen.snapshot), variant)
+
+
+def not_modified_Response(etag):
+    """
+    :param etag: the ETag of the representation that would be sent, unquoted
+    :return: a 304 Response if the request's If-None-Match has the ETag, as it is or with the content-encoding suffix
+        controller/compression.py gives compressed responses' ETags, else None
+    """
+    for tag in (etag, etag + '-gzip', etag + '-br'):
+        if request.if_none_match.contains(tag):
+            return Response(status=304, headers={'ETag': '"{}"'.format(tag)})
+    return None
+
+
+# stand-ins for the per-request parts of alternates views, made only of characters that no format escapes
+ALTERNATES_INSTANCE_URI = 'urn:x-alternates:instance-uri'
+ALTERNATES_INSTANCE_URI_ENCODED = 'urn:x-alternates:instance-uri-encoded'
+ALTERNATES_BASE_URL = 'urn:x-alternates:base-url'
+
+# instance URIs made only of these characters (the unreserved ones, the reserved ones that no format escapes and %) can
+# be put straight into a precomputed alternates view, others are percent-encoded first
+ALTERNATES_SAFE_URI_CHARACTERS = ':/?#[]@!$()*+,;=%'
+ALTERNATES_SAFE_URI = re.compile(r'^[A-Za-z0-9\-._~' + re.escape(ALTERNATES_SAFE_URI_CHARACTERS) + ']*$')
+
+# (class URI, whether for an instance, mimetype) -> alternates view body with stand-ins for the per-request parts
+_alternates_views = {}
+
+
+def make_alternates_graph(class_uri, instance_uri, views_formats):
+    """Makes an RDF graph of the alternate views of an object
+
+    :param class_uri: the object's class URI
+    :param instance_uri: the object's URI or None if the object is the class itself, e.g. a register
+    :param views_formats: a dict of view name -> formats, from classes_views_mimetypes.json
+    :return: an rdflib Graph
+    """
+    g = Graph()
+    LDAPI_O = Namespace('http://promsns.org/def/_ldapi#')
+    g.bind('_ldapi', LDAPI_O)
+    DCT = Namespace('http://purl.org/dc/terms/')
+    g.bind('dct', DCT)
+
+    class_uri_ref = URIRef(class_uri)
+
+    if instance_uri:
+        instance_uri_ref = URIRef(instance_uri)
+        g.add((instance_uri_ref, RDF.type, class_uri_ref))
+    else:
+        g.add((class_uri_ref, RDF.type, LDAPI_O.ApiResource))
+
+    # alternates model
+    alternates_view = BNode()
+    g.add((alternates_view, RDF.type, LDAPI_O.View))
+    g.add((alternates_view, DCT.title, Literal('alternates', datatype=XSD.string)))
+    g.add((class_uri_ref, LDAPI_O.view, alternates_view))
+
+    # default model
+    default_view = BNode()
+    g.add((default_view, DCT.title, Literal('default', datatype=XSD.string)))
+    g.add((class_uri_ref, LDAPI_O.defaultView, default_view))
+    default_title = views_formats['default']
+
+    # the ApiResource is incorrectly assigned to the class URI
+    for view_name, formats in views_formats.items():
+        if view_name == 'alternates':
+            for f in formats:
+                g.add((alternates_view, URIRef('http://purl.org/dc/terms/format'), Literal(f, datatype=XSD.string)))
+        elif view_name == 'default':
+            pass
+        elif view_name == 'renderer':
+            pass
         else:
-            g.add((class_uri_ref, RDF.type, LDAPI_O.ApiResource))
-
-        # alternates model
-        alternates_view = BNode()
-        g.add((alternates_view, RDF.type, LDAPI_O.View))
-        g.add((alternates_view, DCT.title, Literal('alternates', datatype=XSD.string)))
-        g.add((class_uri_ref, LDAPI_O.view, alternates_view))
-
-        # default model
-        default_view = BNode()
-        g.add((default_view, DCT.title, Literal('default', datatype=XSD.string)))
-        g.add((class_uri_ref, LDAPI_O.defaultView, default_view))
-        default_title = views_formats['default']
-
-        # the ApiResource is incorrectly assigned to the class URI
-        for view_name, formats in views_formats.iteritems():
-            if view_name == 'alternates':
-                for f in formats:
-                    g.add((alternates_view, URIRef('http://purl.org/dc/terms/format'), Literal(f, datatype=XSD.string)))
-            elif view_name == 'default':
-                pass
-            elif view_name == 'renderer':
-                pass
-            else:
-                x = BNode()
-                if view_name == default_title:
-                    g.add((default_view, RDF.type, x))
-                g.add((class_uri_ref, LDAPI_O.view, x))
-                g.add((x, DCT.title, Literal(view_name, datatype=XSD.string)))
-                for f in formats:
-                    g.add((x, URIRef('http://purl.org/dc/terms/format'), Literal(f, datatype=XSD.string)))
-
-        # make the static part of the graph
-        # REG = Namespace('http://purl.org/linked-data/registry#')
-        # self.g.bind('reg', REG)
-        #
-        # self.g.add((URIRef(self.request.url), RDF.type, REG.Register))
-        #
-        # # add all the items
-        # for item in self.register:
-        #     self.g.add((URIRef(item['uri']), RDF.type, URIRef(self.uri)))
-        #     self.g.add((URIRef(item['uri']), RDFS.label, Literal(item['label'], datatype=XSD.string)))
-        #     self.g.add((URIRef(item['uri']), REG.register, URIRef(self.request.url)))
-        rdflib_format = [item[1] for item in LDAPI.MIMETYPES_PARSERS if item[0] == mimetype][0]
-        return Response(g.serialize(format=rdflib_format), status=200, mimetype=mimetype)
+            x = BNode()
+            if view_name == default_title:
+                g.add((default_view, RDF.type, x))
+            g.add((class_uri_ref, LDAPI_O.view, x))
+            g.add((x, DCT.title, Literal(view_name, datatype=XSD.string)))
+            for f in formats:
+                g.add((x, URIRef('http://purl.org/dc/terms/format'), Literal(f, datatype=XSD.string)))
+
+    return g
+
+
+def make_alternates_view(class_uri, class_uri_encoded, instance_uri, instance_uri_encoded, views_formats, mimetype,
+                         base_url):
+    """Makes the body of an HTML table, a JSON object string or a serialised RDF representation of the alternate views of
+    an object
+
+    :return: a string
+    """
+    if mimetype == 'application/json':
+        return json.dumps(views_formats)
+    elif LDAPI.is_rdf_mimetype(mimetype):
+        g = make_alternates_graph(urllib.parse.unquote_plus(class_uri_encoded), instance_uri, views_formats)
+        return g.serialize(format=LDAPI.get_rdf_parser_for_mimetype(mimetype))
     else:  # HTML
         return render_template(
             'alternates_view.html',
@@ -86,5 +155,58 @@ def render_alternates_view(class_uri, class_uri_encoded, instance_uri, instance_
             class_uri_encoded=class_uri_encoded,
             instance_uri=instance_uri,
             instance_uri_encoded=instance_uri_encoded,
-            views_formats=views_formats
+            views_formats=views_formats,
+            base_url=base_url
+        )
+
+
+def get_alternates_view(class_uri, class_uri_encoded, for_instance, views_formats, mimetype):
+    """Gets the alternates view body for a class, and for either the class itself or any instance of it, with stand-ins
+    for the per-request parts. Each is made once and then reused.
+
+    :return: a string
+    """
+    key = (class_uri_encoded, for_instance, mimetype)
+    body = _alternates_views.get(key)
+    if body is None:
+        body = make_alternates_view(
+            class_uri,
+            class_uri_encoded,
+            ALTERNATES_INSTANCE_URI if for_instance else None,
+            ALTERNATES_INSTANCE_URI_ENCODED if for_instance else None,
+            views_formats,
+            mimetype,
+            ALTERNATES_BASE_URL
         )
+        _alternates_views[key] = body
+    return body
+
+
+def vary_accept(response):
+    """Marks a response as varying by the Accept header, if it was negotiated by it, i.e. no _format was given, so that
+    caches keep each variant separately"""
+    if request.args.get('_format') is None:
+        response.vary.add('Accept')
+    return response
+
+
+def render_alternates_view(class_uri, class_uri_encoded, instance_uri, instance_uri_encoded, views_formats, mimetype):
+    """Renders an HTML table, a JSON object string or a serialised RDF representation of the alternate views of an
+    object
+
+    The representations are made once per class and mimetype (see get_alternates_view()) and the instance URI and the
+    request's URL are substituted in, rather than building an RDF graph or rendering a template per request.
+    """
+    if not LDAPI.is_rdf_mimetype(mimetype) and mimetype != 'application/json':
+        mimetype = 'text/html'
+
+    body = get_alternates_view(class_uri, class_uri_encoded, instance_uri is not None, views_formats, mimetype)
+    if instance_uri is not None:
+        if not ALTERNATES_SAFE_URI.match(instance_uri):
+            instance_uri = urllib.parse.quote(instance_uri, safe=ALTERNATES_SAFE_URI_CHARACTERS)
+        body = body.replace(ALTERNATES_INSTANCE_URI_ENCODED, str(escape(instance_uri_encoded)))\
+            .replace(ALTERNATES_INSTANCE_URI, instance_uri)
+    if mimetype == 'text/html':
+        body = body.replace(ALTERNATES_BASE_URL, str(escape(request.base_url)))
+
+    return Response(body, status=200, mimetype=mimetype)
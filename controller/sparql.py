@@ -0,0 +1,52 @@
+"""
+This file contains the HTTP route of the SPARQL endpoint over the whole survey catalogue, see model/sparql.py
+"""
+from flask import Blueprint, Response, render_template, request
+from model import generations, sparql
+import _config
+
+sparql_endpoint = Blueprint('sparql', __name__)
+
+
+@sparql_endpoint.route('/sparql', methods=['GET', 'POST'])
+def sparql_query():
+    """
+    A SPARQL 1.1 Protocol query endpoint: queries by GET ?query=, POSTed form or POSTed application/sparql-query body.
+    Results are negotiated with the Accept header or chosen with _format.
+
+    :return: HTTP Response
+    """
+    if request.method == 'POST' and request.mimetype == 'application/sparql-query':
+        query_text = request.get_data(as_text=True)
+    else:
+        query_text = request.values.get('query')
+    if not query_text:
+        return render_template('page_sparql.html', max_rows=_config.SPARQL_MAX_ROWS,
+                               timeout=_config.SPARQL_TIMEOUT_SECONDS)
+
+    gen = generations.current_generation()
+    if gen is None:
+        return Response('The survey catalogue has not been loaded yet', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(_config.CATALOGUE_CHECK_SECONDS)})
+
+    try:
+        answer = sparql.query(gen, query_text, request.values.get('_format'), request.headers.get('Accept'))
+    except sparql.SparqlError as e:
+        return Response(str(e), status=400, mimetype='text/plain')
+    except sparql.SparqlTimeout:
+        return Response('The query took longer than {} seconds'.format(_config.SPARQL_TIMEOUT_SECONDS),
+                        status=503, mimetype='text/plain')
+    except sparql.SparqlBusy:
+        return Response('Too many queries are running, please try again shortly', status=503, mimetype='text/plain',
+                        headers={'Retry-After': '1'})
+    if answer is None:
+        return Response('The SPARQL store is being loaded, please try again shortly', status=503,
+                        mimetype='text/plain', headers={'Retry-After': '30'})
+
+    data, mimetype, truncated = answer
+    response = Response(data, mimetype=mimetype)
+    if request.values.get('_format') is None:
+        response.headers.add('Vary', 'Accept')
+    if truncated:
+        response.headers['Warning'] = '199 - "Results cut off at {} rows"'.format(_config.SPARQL_MAX_ROWS)
+    return response
@@ -0,0 +1,62 @@
+"""
+Warms up a freshly started app, before it accepts traffic, by doing the one-off work that would otherwise slow down each
+worker's first requests: compiling all the Jinja templates and importing & initialising rdflib's plugins and SPARQL
+engine
+"""
+import logging
+import time
+from rdflib import Graph, URIRef, Literal, RDFS, plugin
+from rdflib.parser import Parser
+from rdflib.serializer import Serializer
+from _ldapi.ldapi import LDAPI
+
+
+def compile_templates(app):
+    """
+    Compiles every template, which also fills the Jinja bytecode cache, if there is one, for the next worker
+
+    :return: the number of templates compiled
+    """
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def load_rdflib_plugins():
+    """
+    Imports all the rdflib serializers this API uses, the Turtle parser and the SPARQL query & update engine, by using
+    them once on a tiny graph
+    """
+    g = Graph()
+    g.add((URIRef('http://example.com/a'), RDFS.label, Literal('a')))
+
+    for rdflib_format in sorted(set(item[1] for item in LDAPI.MIMETYPES_PARSERS)):
+        plugin.get(rdflib_format, Serializer)
+        g.serialize(format=rdflib_format)
+    plugin.get('turtle', Parser)
+    Graph().parse(data=g.serialize(format='turtle'), format='turtle')
+
+    # the first query & update build the SPARQL grammar and algebra translators, which takes most of a second
+    list(g.query('SELECT * WHERE { ?s ?p ?o . OPTIONAL { ?s <http://example.com/p> ?x . } }'))
+    g.update('DELETE { ?s ?p ?o . } INSERT { ?o ?p ?s . } WHERE { ?s <http://example.com/p> ?o . }')
+
+
+def warm_up(app):
+    """
+    Does all the warm-up tasks and logs how long they took
+
+    :return: the number of seconds taken
+    """
+    start = time.perf_counter()
+    # the routes import these lazily
+    from model import survey, register
+    n = compile_templates(app)
+    templates_done = time.perf_counter()
+    load_rdflib_plugins()
+    end = time.perf_counter()
+
+    logging.info('Warm-up took {:.3f}s: {} templates compiled in {:.3f}s, rdflib plugins loaded in {:.3f}s'.format(
+        end - start, n, templates_done - start, end - templates_done
+    ))
+    return end - start
@@ -0,0 +1,246 @@
+"""
+The agents, contractors, operators and processors, of the surveys in the catalogue
+
+Agents are named in ARGUS as free text, so the same company is spelt in several ways across surveys. Each name is
+normalised, ignoring case, accents and punctuation, to a slug that gives the agent a stable URI,
+_config.BASE_URI_AGENT + slug, which the survey views use so that an agent's surveys can be joined. The slug depends only
+on the name, so the same agent keeps its URI across harvests.
+
+The AgentIndex, built with each catalogue Generation, holds every agent and, for each of its roles, the IDs of its
+surveys, for the /agent/ register and each agent's page.
+"""
+import re
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+from flask import Response, render_template
+from rdflib import Graph, URIRef, BNode, RDF, RDFS, XSD, Namespace, Literal
+from _ldapi.ldapi import LDAPI
+from model import generations
+from model.renderer import Renderer
+import _config
+
+PROV = Namespace('http://www.w3.org/ns/prov#')
+AUROLE = Namespace('http://communications.data.gov.au/def/role/')
+SKOS = Namespace('http://www.w3.org/2004/02/skos/core#')
+
+# catalogue field -> the role in which the survey views attribute a survey to the agent
+ROLES = OrderedDict([
+    ('contractor', AUROLE.PrincipalInvestigator),
+    ('operator', AUROLE.Sponsor),
+    ('processor', AUROLE.Processor),
+])
+
+
+def normalise_name(name):
+    """
+    :return: an agent's name in lower case ASCII letters and digits, single spaced, e.g. "kevron geophysics pty ltd" for
+        "Kevron Geophysics Pty. Ltd."
+    """
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').casefold()
+    return ' '.join(re.findall(r'[a-z0-9]+', name.replace('&', ' and ')))
+
+
+def agent_slug(name):
+    """
+    :return: the slug of an agent's name, e.g. "kevron-geophysics-pty-ltd", or '' if it has no letters or digits
+    """
+    return normalise_name(name).replace(' ', '-') if name else ''
+
+
+def agent_uri(name):
+    """
+    :return: the URI of the agent with a name, or None if the name is empty
+    """
+    slug = agent_slug(name)
+    return _config.BASE_URI_AGENT + slug if slug else None
+
+
+class Agent:
+    """
+    An agent in the catalogue: its slug, its most used name, all the names it has and its survey IDs in each role
+    """
+    __slots__ = ('slug', 'label', 'names', 'surveys')
+
+    def __init__(self, slug, label, names, surveys):
+        self.slug = slug
+        self.label = label
+        self.names = names
+        self.surveys = surveys
+
+    @property
+    def uri(self):
+        return _config.BASE_URI_AGENT + self.slug
+
+    def survey_count(self):
+        return len(set().union(*self.surveys.values()))
+
+
+class AgentIndex:
+    """
+    Every agent in a catalogue snapshot, by slug and in label order
+    """
+
+    def __init__(self, snapshot):
+        """
+        Reads only the snapshot's agent columns and decodes each distinct name once
+
+        :param snapshot: a model.catalogue.CatalogueSnapshot
+        """
+        ids = snapshot.columns['survey_id']
+        slugs_by_ref = {}
+        name_counts = {}  # slug -> Counter of name string refs
+        surveys = {}  # slug -> role -> array of survey IDs, ascending as the snapshot is in survey ID order
+        for role in ROLES:
+            column = snapshot.columns[role]
+            for i in range(len(snapshot)):
+                ref = column[i]
+                if ref == 0:
+                    continue
+                slug = slugs_by_ref.get(ref)
+                if slug is None:
+                    slug = slugs_by_ref[ref] = agent_slug(snapshot.string(ref))
+                if not slug:
+                    continue
+                if slug not in surveys:
+                    surveys[slug] = OrderedDict((r, array('i')) for r in ROLES)
+                    name_counts[slug] = Counter()
+                surveys[slug][role].append(ids[i])
+                name_counts[slug][ref] += 1
+
+        self.agents = {}
+        for slug, counts in name_counts.items():
+            names = [snapshot.string(ref) for ref, _ in counts.most_common()]
+            self.agents[slug] = Agent(slug, names[0], tuple(names), surveys[slug])
+        self.slugs = sorted(self.agents, key=lambda s: (self.agents[s].label.casefold(), s))
+
+    def __len__(self):
+        return len(self.agents)
+
+    def get(self, slug):
+        return self.agents.get(slug)
+
+    def page(self, page, per_page):
+        """
+        :return: a list of the Agents on a 1-based page of the register, in label order
+        """
+        return [self.agents[slug] for slug in self.slugs[(page - 1) * per_page:page * per_page]]
+
+
+@generations.register_index('agents')
+def build_agent_index(snapshot, previous):
+    return AgentIndex(snapshot)
+
+
+class AgentRenderer(Renderer):
+    """
+    An agent and the surveys it has been a contractor, operator or processor of
+    """
+
+    def __init__(self, agent):
+        Renderer.__init__(self, agent.uri)
+        self.agent = agent
+
+    def render(self, view, mimetype):
+        if view == 'prov':
+            if LDAPI.is_rdf_mimetype(mimetype):
+                return Response(
+                    self.make_graph().serialize(format=LDAPI.get_rdf_parser_for_mimetype(mimetype)),
+                    status=200,
+                    mimetype=mimetype
+                )
+            return Response(
+                render_template(
+                    'agent_prov.html',
+                    agent=self.agent,
+                    roles=list(ROLES),
+                    base_uri_survey=_config.BASE_URI_SURVEY
+                ),
+                mimetype='text/html'
+            )
+        return Response('The requested model model is not valid for this class', status=400, mimetype='text/plain')
+
+    def make_graph(self):
+        """
+        :return: an rdflib Graph of the agent, its names and its attributions to surveys, as per the survey views
+        """
+        g = Graph()
+        g.bind('prov', PROV)
+        g.bind('aurole', AUROLE)
+        g.bind('skos', SKOS)
+
+        agent = URIRef(self.agent.uri)
+        g.add((agent, RDF.type, PROV.Agent))
+        g.add((agent, RDFS.label, Literal(self.agent.label, datatype=XSD.string)))
+        for name in self.agent.names[1:]:
+            g.add((agent, SKOS.altLabel, Literal(name, datatype=XSD.string)))
+
+        for role, role_uri in ROLES.items():
+            for survey_id in self.agent.surveys[role]:
+                survey = URIRef(_config.BASE_URI_SURVEY + str(survey_id))
+                attribution = BNode()
+                g.add((survey, RDF.type, PROV.Activity))
+                g.add((survey, PROV.qualifiedAttribution, attribution))
+                g.add((attribution, RDF.type, PROV.Attribution))
+                g.add((attribution, PROV.agent, agent))
+                g.add((attribution, PROV.hadRole, role_uri))
+        return g
+
+
+class AgentRegisterRenderer(Renderer):
+    """
+    A page of the register of agents
+    """
+
+    def __init__(self, request, index, page, per_page):
+        Renderer.__init__(self, request.base_url)
+        self.request = request
+        self.index = index
+        self.page = page
+        self.per_page = per_page
+        self.agents = index.page(page, per_page)
+
+    def render(self, view, mimetype, extra_headers=None):
+        if view == 'reg':
+            if LDAPI.is_rdf_mimetype(mimetype):
+                return Response(
+                    self.make_graph().serialize(format=LDAPI.get_rdf_parser_for_mimetype(mimetype)),
+                    status=200,
+                    mimetype=mimetype,
+                    headers=extra_headers
+                )
+            return Response(
+                render_template(
+                    'agent_register.html',
+                    agents=self.agents,
+                    count=len(self.index),
+                    page=self.page,
+                    per_page=self.per_page
+                ),
+                mimetype='text/html',
+                headers=extra_headers
+            )
+        return Response('The requested model model is not valid for this class', status=400, mimetype='text/plain')
+
+    def make_graph(self):
+        g = Graph()
+        REG = Namespace('http://purl.org/linked-data/registry#')
+        g.bind('reg', REG)
+        LDP = Namespace('http://www.w3.org/ns/ldp#')
+        g.bind('ldp', LDP)
+        g.bind('prov', PROV)
+
+        register = URIRef(self.request.base_url)
+        g.add((register, RDF.type, REG.Register))
+        g.add((register, RDFS.label, Literal('Agents Register', datatype=XSD.string)))
+
+        page = URIRef('{}?per_page={}&page={}'.format(self.request.base_url, self.per_page, self.page))
+        g.add((page, RDF.type, LDP.Page))
+        g.add((page, LDP.pageOf, register))
+
+        for agent in self.agents:
+            agent_ref = URIRef(agent.uri)
+            g.add((agent_ref, RDF.type, PROV.Agent))
+            g.add((agent_ref, RDFS.label, Literal(agent.label, datatype=XSD.string)))
+            g.add((agent_ref, REG.register, page))
+        return g
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A thread-safe, in-memory, least-recently-used cache with optional per-item timeouts.
+
+    Its get()/set() interface follows werkzeug's SimpleCache, which this API used to use, but it is bounded by a number
+    of items, and optionally by the total length of their values, so it can hold large things, such as response bodies,
+    safely.
+    """
+
+    def __init__(self, max_items=1000, default_timeout=0, max_bytes=None):
+        """
+        :param max_items: the maximum number of items held, after which the least recently used are discarded
+        :param default_timeout: seconds an item lives for if set() isn't given a timeout; 0 means forever
+        :param max_bytes: the maximum total len() of the values held, e.g. bytes, after which the least recently used
+            are discarded, or None for no limit. A value longer than this is never held.
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.default_timeout = default_timeout
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expiry(self, timeout):
+        if timeout is None:
+            timeout = self.default_timeout
+        return time.time() + timeout if timeout > 0 else 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                expires, value = item
+                if expires == 0 or expires > time.time():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def _length(self, value):
+        return len(value) if self.max_bytes is not None else 0
+
+    def _remove(self, key):
+        _, value = self._items.pop(key)
+        self.size -= self._length(value)
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            if self.max_bytes is not None and len(value) > self.max_bytes:
+                return False
+            self._items[key] = (self._expiry(timeout), value)
+            self.size += self._length(value)
+            while len(self._items) > self.max_items or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._remove(next(iter(self._items)))
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self._items:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+        return True
+
+    def fitting(self, items, items_held=0, bytes_held=0):
+        """
+        :param items: a list of (key, expiry, value), least recently used first
+        :param items_held: the number of items already taking room
+        :param bytes_held: the total length of the values already taking room
+        :return: the most recently used of the items that fit in this cache's room, least recently used first
+        """
+        room_items = max(self.max_items - items_held, 0)
+        if self.max_bytes is None:
+            count = min(room_items, len(items))
+        else:
+            room, count = self.max_bytes - bytes_held, 0
+            for _, _, value in reversed(items):
+                if count == room_items or len(value) > room:
+                    break
+                room -= len(value)
+                count += 1
+        return items[len(items) - count:]
+
+    def dump(self):
+        """
+        :return: a list of (key, expiry, value) of the items that haven't expired, least recently used first. Expiries
+            are Unix times, or 0 for never, so they still hold when the items are loaded into another process.
+        """
+        now = time.time()
+        with self._lock:
+            return [(key, expires, value) for key, (expires, value) in self._items.items()
+                    if expires == 0 or expires > now]
+
+    def load(self, items):
+        """
+        Adds items dumped by dump(), keeping their expiries, as less recently used than every item already held. Items
+        that have expired since, or that are already held, are skipped.
+
+        :param items: an iterable of (key, expiry, value), least recently used first
+        :return: the number of items added
+        """
+        now = time.time()
+        with self._lock:
+            loaded = [(key, expires, value) for key, expires, value in items
+                      if (expires == 0 or expires > now) and key not in self._items]
+            # the most recently used of them, in the room there is
+            loaded = self.fitting(loaded, len(self._items), self.size)
+            items = OrderedDict((key, (expires, value)) for key, expires, value in loaded)
+            self.size += sum(self._length(value) for _, _, value in loaded)
+            items.update(self._items)
+            self._items = items
+        return len(loaded)
+
+    def __len__(self):
+        return len(self._items)
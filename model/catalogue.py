@@ -0,0 +1,506 @@
+"""
+The survey catalogue: every ARGUS survey record held in a compact, memory-mapped, binary snapshot file
+
+The harvester (run with "python -m model.catalogue harvest") reads all surveys from the ARGUS Oracle XML API and writes
+them to the snapshot. Every worker process then maps the same file read-only so the catalogue is held in memory once per
+node, in the OS page cache, no matter how many workers there are, and nothing is deserialised into Python objects until
+a record's field is read.
+
+Snapshot layout, all values in the byte order of the machine that wrote it:
+
+    header          64 bytes: magic, version, byte order, record count, string count, created time & section offsets
+    columns         one fixed-width column per field, each 8-byte aligned, in SURVEY_FIELDS order:
+                        INT & DATE fields   int32 (dates as proleptic Gregorian ordinals, 0 for none)
+                        FLOAT fields        float64 (NaN for none)
+                        STR fields          uint32 index into the offsets table (0 for none)
+    offsets table   uint32 heap offsets, one per string plus a leading 0, so string r is heap[offsets[r - 1]:offsets[r]]
+    string heap     UTF-8 text. Each distinct string, e.g. a contractor's name, is stored once
+
+Records are sorted by survey ID so a survey is found by binary search of the SURVEYID column.
+"""
+import argparse
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from lxml import etree
+import _config
+
+# field types
+INT = 'i'
+FLOAT = 'd'
+DATE = 'D'
+STR = 's'
+
+# (ARGUS XML element, SurveyRenderer/record attribute, type) for the survey ID and the 31 ARGUS survey fields
+SURVEY_FIELDS = [
+    ('SURVEYID', 'survey_id', INT),
+    ('SURVEYNAME', 'survey_name', STR),
+    ('STATE', 'state', STR),
+    ('OPERATOR', 'operator', STR),
+    ('CONTRACTOR', 'contractor', STR),
+    ('PROCESSOR', 'processor', STR),
+    ('SURVEY_TYPE', 'survey_type', STR),
+    ('DATATYPES', 'data_types', STR),
+    ('VESSEL', 'vessel', STR),
+    ('VESSEL_TYPE', 'vessel_type', STR),
+    ('RELEASEDATE', 'release_date', DATE),
+    ('ONSHORE_OFFSHORE', 'onshore_offshore', STR),
+    ('STARTDATE', 'start_date', DATE),
+    ('ENDDATE', 'end_date', DATE),
+    ('WLONG', 'w_long', FLOAT),
+    ('ELONG', 'e_long', FLOAT),
+    ('SLAT', 's_lat', FLOAT),
+    ('NLAT', 'n_lat', FLOAT),
+    ('LINE_KM', 'line_km', FLOAT),
+    ('TOTAL_KM', 'total_km', FLOAT),
+    ('LINE_SPACING', 'line_spacing', FLOAT),
+    ('LINE_DIRECTION', 'line_direction', FLOAT),
+    ('TIE_SPACING', 'tie_spacing', FLOAT),
+    ('SQUARE_KM', 'square_km', FLOAT),
+    ('CRYSTAL_VOLUME', 'crystal_volume', FLOAT),
+    ('UP_CRYSTAL_VOLUME', 'up_crystal_volume', FLOAT),
+    ('DIGITAL_DATA', 'digital_data', STR),
+    ('GEODETIC_DATUM', 'geodetic_datum', STR),
+    ('ASL', 'asl', FLOAT),
+    ('AGL', 'agl', FLOAT),
+    ('MAG_INSTRUMENT', 'mag_instrument', STR),
+    ('RAD_INSTRUMENT', 'rad_instrument', STR),
+]
+SURVEY_FIELDS_BY_TAG = {tag: (attr, kind) for tag, attr, kind in SURVEY_FIELDS}
+
+# ARGUS has delivered dates in both of these formats
+DATE_FORMATS = ['%Y-%m-%dT%H:%M:%S', '%d-%b-%y']
+
+MAGIC = b'SURVCAT\0'
+VERSION = 1
+HEADER = struct.Struct('<8sII?3xIIdQQQ')  # magic, version, header size, little endian?, records, strings, created,
+                                          # columns offset, offsets table offset, heap offset
+HEADER_SIZE = 64
+COLUMN_ITEM = {INT: 'i', DATE: 'i', FLOAT: 'd', STR: 'I'}
+
+
+class CatalogueError(ValueError):
+    pass
+
+
+def parse_value(text, kind):
+    """
+    Converts an ARGUS XML element's text to a Python value
+
+    :param text: the element's text, None for an empty element
+    :param kind: one of INT, FLOAT, DATE or STR
+    :return: the value, or None if it's empty or can't be read
+    """
+    if text is None or text.strip() == '':
+        return None
+    text = text.strip()
+    try:
+        if kind == STR:
+            return text
+        elif kind == INT:
+            return int(text)
+        elif kind == FLOAT:
+            v = float(text)
+            # as lxml.objectify would, give whole numbers as ints
+            return int(v) if v.is_integer() else v
+        elif kind == DATE:
+            for date_format in DATE_FORMATS:
+                try:
+                    return datetime.strptime(text, date_format)
+                except ValueError:
+                    pass
+            return None
+    except ValueError:
+        return None
+
+
+def parse_rows(xml, fields_by_tag=SURVEY_FIELDS_BY_TAG):
+    """
+    Reads all the ROWs of an ARGUS ROWSET XML document, in one pass over each ROW's elements
+
+    :param xml: the XML document, bytes or string
+    :param fields_by_tag: a dict of element tag to (attribute name, type), e.g. SURVEY_FIELDS_BY_TAG
+    :return: a list of dicts of attribute name to value, containing only the elements present in each ROW
+    """
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+    root = etree.fromstring(xml, etree.XMLParser(dtd_validation=False, resolve_entities=False))
+    rows = []
+    for row in root.iter('ROW'):
+        record = {}
+        for elem in row:
+            field = fields_by_tag.get(elem.tag)
+            if field is not None:
+                record[field[0]] = parse_value(elem.text, field[1])
+        rows.append(record)
+    return rows
+
+
+def _date_ordinal(d):
+    return d.toordinal() if d is not None else 0
+
+
+def write_snapshot(records, path):
+    """
+    Writes survey records to a snapshot file, atomically replacing any existing snapshot at that path. Processes that
+    have the old snapshot mapped keep reading it until they let it go.
+
+    :param records: an iterable of dicts of attribute name to value, as per parse_rows()
+    :param path: the snapshot file path
+    :return: the number of records written
+    """
+    records = sorted((r for r in records if r.get('survey_id') is not None), key=lambda r: r['survey_id'])
+
+    strings = {}  # string -> index into the offsets table; 0 is None
+    heap = bytearray()
+    offsets = array('I', [0])
+
+    def string_ref(s):
+        if s is None:
+            return 0
+        ref = strings.get(s)
+        if ref is None:
+            heap.extend(s.encode('utf-8'))
+            offsets.append(len(heap))
+            ref = strings[s] = len(offsets) - 1
+        return ref
+
+    columns = []
+    for _, attr, kind in SURVEY_FIELDS:
+        values = [r.get(attr) for r in records]
+        if kind == STR:
+            columns.append(array('I', [string_ref(v) for v in values]))
+        elif kind == DATE:
+            columns.append(array('i', [_date_ordinal(v) for v in values]))
+        elif kind == FLOAT:
+            columns.append(array('d', [v if v is not None else math.nan for v in values]))
+        else:
+            columns.append(array('i', [v if v is not None else 0 for v in values]))
+
+    def padded(n):
+        return (n + 7) // 8 * 8
+
+    columns_offset = HEADER_SIZE
+    offset = columns_offset
+    for column in columns:
+        offset += padded(len(column) * column.itemsize)
+    offsets_offset = offset
+    heap_offset = padded(offsets_offset + len(offsets) * offsets.itemsize)
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, 'wb') as f:
+        header = HEADER.pack(MAGIC, VERSION, HEADER_SIZE, sys.byteorder == 'little', len(records), len(offsets) - 1,
+                             time.time(), columns_offset, offsets_offset, heap_offset)
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for column in columns:
+            data = column.tobytes()
+            f.write(data.ljust(padded(len(data)), b'\0'))
+        data = offsets.tobytes()
+        f.write(data.ljust(heap_offset - offsets_offset, b'\0'))
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(records)
+
+
+def check_harvest(records, path, min_ratio=0.9):
+    """
+    Checks a harvest before it's written over a snapshot: a harvest that ARGUS cut short mustn't replace a good
+    catalogue, as every process that reads the snapshot afresh would take it as it is
+
+    :param records: the harvested record dicts
+    :param path: the snapshot file the harvest would replace
+    :param min_ratio: a harvest with fewer than this fraction of the snapshot's surveys is rejected
+    :raises CatalogueError: if the harvest is empty or too small
+    """
+    harvested = sum(1 for r in records if r.get('survey_id') is not None)
+    if harvested == 0:
+        raise CatalogueError('No surveys harvested, not replacing the snapshot')
+    try:
+        current = len(CatalogueSnapshot(path))
+    except (OSError, ValueError, struct.error):
+        return  # no snapshot, or none that can be read, to keep
+    if harvested < current * min_ratio:
+        raise CatalogueError('Harvested {} surveys, too few compared to the snapshot\'s {}, not replacing it'.format(
+            harvested, current))
+
+
+def same_as_snapshot(records, path):
+    """
+    :param records: the harvested record dicts
+    :param path: the snapshot file the harvest would replace
+    :return: True if the records are those of the snapshot, value for value, so it needn't be written again
+    """
+    try:
+        snapshot = CatalogueSnapshot(path)
+    except (OSError, ValueError, struct.error):
+        return False
+    harvested = {r['survey_id']: record_digest(r) for r in records if r.get('survey_id') is not None}
+    return len(harvested) == len(snapshot) and all(harvested.get(r.survey_id) == r.digest() for r in snapshot)
+
+
+def harvested_marker(path):
+    """
+    :return: the file whose modification time is when a harvest last found the snapshot at a path unchanged. The
+        snapshot itself isn't touched, as its modification time is part of its file_id, which would have every worker
+        build a new Generation of the same catalogue.
+    """
+    return path + '.harvested'
+
+
+def last_harvested(path):
+    """
+    :return: the Unix time the snapshot at a path was last written or found unchanged by a harvest, None if there's no
+        snapshot
+    """
+    try:
+        written = os.path.getmtime(path)
+    except OSError:
+        return None
+    try:
+        return max(written, os.path.getmtime(harvested_marker(path)))
+    except OSError:
+        return written
+
+
+def mark_harvested(path):
+    """
+    Records that a harvest found the snapshot at a path unchanged, so that it's as old, as far as harvesting goes, as if
+    it had been written again
+    """
+    with open(harvested_marker(path), 'a'):
+        pass
+    os.utime(harvested_marker(path))
+
+
+class CatalogueSnapshot:
+    """
+    A read-only, memory-mapped, survey catalogue snapshot file. Its columns are zero-copy views of the mapping.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.file_id = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_size, little_endian, self.count, self.string_count, self.created, \
+            columns_offset, offsets_offset, heap_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise CatalogueError('{} is not a version {} survey catalogue snapshot'.format(path, VERSION))
+        if little_endian != (sys.byteorder == 'little'):
+            raise CatalogueError('{} was written on a machine of a different byte order'.format(path))
+
+        view = memoryview(self._mm)
+        self.columns = {}
+        offset = columns_offset
+        for _, attr, kind in SURVEY_FIELDS:
+            item = COLUMN_ITEM[kind]
+            size = self.count * struct.calcsize(item)
+            self.columns[attr] = view[offset:offset + size].cast(item)
+            offset += (size + 7) // 8 * 8
+        self._offsets = view[offsets_offset:offsets_offset + (self.string_count + 1) * 4].cast('I')
+        self._heap_offset = heap_offset
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield SurveyRecord(self, i)
+
+    def string(self, ref):
+        """
+        :param ref: an index into the offsets table, as held in STR columns
+        :return: the string, or None for ref 0
+        """
+        if ref == 0:
+            return None
+        start = self._heap_offset + self._offsets[ref - 1]
+        end = self._heap_offset + self._offsets[ref]
+        return self._mm[start:end].decode('utf-8')
+
+    def index_of(self, survey_id):
+        """
+        :return: the record index of a survey ID, or None if it's not in this snapshot
+        """
+        try:
+            survey_id = int(survey_id)
+        except (TypeError, ValueError):
+            return None
+        ids = self.columns['survey_id']
+        i = bisect_left(ids, survey_id)
+        if i < self.count and ids[i] == survey_id:
+            return i
+        return None
+
+    def get(self, survey_id):
+        """
+        :return: a SurveyRecord view of a survey, or None if it's not in this snapshot
+        """
+        i = self.index_of(survey_id)
+        return SurveyRecord(self, i) if i is not None else None
+
+    def record(self, i):
+        return SurveyRecord(self, i)
+
+
+def _column_getter(attr, kind):
+    if kind == STR:
+        def get(self):
+            return self._snapshot.string(self._snapshot.columns[attr][self._i])
+    elif kind == DATE:
+        def get(self):
+            ordinal = self._snapshot.columns[attr][self._i]
+            return datetime.fromordinal(ordinal) if ordinal != 0 else None
+    elif kind == FLOAT:
+        def get(self):
+            v = self._snapshot.columns[attr][self._i]
+            if math.isnan(v):
+                return None
+            # as parse_value() does, give whole numbers as ints
+            return int(v) if v.is_integer() else v
+    else:
+        def get(self):
+            return self._snapshot.columns[attr][self._i]
+    return property(get)
+
+
+class SurveyRecord:
+    """
+    A lightweight view of one survey in a CatalogueSnapshot. Its attributes, named as per SURVEY_FIELDS, are read from
+    the snapshot's columns when they are accessed.
+    """
+    __slots__ = ('_snapshot', '_i')
+
+    def __init__(self, snapshot, i):
+        self._snapshot = snapshot
+        self._i = i
+
+    def as_dict(self):
+        return {attr: getattr(self, attr) for _, attr, _ in SURVEY_FIELDS}
+
+    def digest(self):
+        """
+        :return: a hex digest of all this survey's values, which changes when any of them does
+        """
+        return record_digest(self.as_dict())
+
+
+def record_digest(record):
+    """
+    :param record: a dict of attribute name to value, as per parse_rows(), or a SurveyRecord's as_dict()
+    :return: a hex digest of all the record's values
+    """
+    values = tuple(record.get(attr) for _, attr, _ in SURVEY_FIELDS)
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+for _, _attr, _kind in SURVEY_FIELDS:
+    setattr(SurveyRecord, _attr, _column_getter(_attr, _kind))
+
+
+def harvest(page_size=_config.HARVEST_PAGE_SIZE, workers=_config.HARVEST_WORKERS):
+    """
+    Reads every survey from the ARGUS API: pages through the SearchSurveys register and, for any row that doesn't carry
+    the full survey record, gets the survey itself
+
+    :return: a list of record dicts, as per parse_rows()
+    """
+    from model import upstream
+
+    session = upstream.new_session(workers)
+
+    rows = {}
+    page = 1
+    while True:
+        r = session.get(_config.XML_API_URL_SURVEY_REGISTER.format(page, page_size), timeout=60)
+        r.raise_for_status()
+        page_rows = [row for row in parse_rows(r.content) if row.get('survey_id') is not None]
+        # only an empty page ends the register, as ARGUS may give fewer rows a page than were asked for, or a page of
+        # surveys already seen, if it ignores the page number
+        new_rows = [row for row in page_rows if row['survey_id'] not in rows]
+        if len(new_rows) == 0:
+            break
+        rows.update((row['survey_id'], row) for row in new_rows)
+        logging.info('Harvested register page {}, {} surveys so far'.format(page, len(rows)))
+        page += 1
+    rows = list(rows.values())
+
+    def full_record(row):
+        if row.get('survey_name') is not None:
+            return row
+        r = session.get(_config.XML_API_URL_SURVEY.format(row['survey_id']), timeout=60)
+        r.raise_for_status()
+        if 'No data' in r.text:
+            return None
+        found = parse_rows(r.content)
+        return found[0] if found else None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [record for record in pool.map(full_record, rows) if record is not None]
+
+
+def write_derived_files(snapshot_path=_config.CATALOGUE_SNAPSHOT):
+    """
+    Writes the files made from a snapshot that the API serves but never makes in a request, as they take minutes and a
+    pool of processes: the N-Triples and N-Quads exports, the dictionary-encoded RDF and, if pyarrow is installed, the
+    Parquet file. Run after each harvest that changes the snapshot. A file that can't be written is logged and skipped,
+    leaving the last one written to be served.
+    """
+    from model import export, rdfdict, tabular
+
+    writers = [
+        ('N-Triples export', lambda: export.write_export(_config.EXPORT_FILES['nt'], snapshot_path)),
+        ('N-Quads export', lambda: export.write_export(_config.EXPORT_FILES['nq'], snapshot_path, quads=True)),
+        ('dictionary-encoded RDF', lambda: rdfdict.write_rdfdict(_config.RDFDICT_FILE, snapshot_path)),
+    ]
+    if tabular.pyarrow is not None:
+        writers.append(('Parquet file', lambda: tabular.write_parquet(_config.PARQUET_FILE, snapshot_path)))
+    for name, write in writers:
+        start = time.time()
+        try:
+            write()
+            logging.info('Wrote the {} of {} in {:.1f}s'.format(name, snapshot_path, time.time() - start))
+        except Exception:
+            logging.exception('Could not write the {} of {}'.format(name, snapshot_path))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description='Harvests the survey catalogue from ARGUS or shows its snapshot')
+    parser.add_argument('command', choices=['harvest', 'info'])
+    parser.add_argument('--snapshot', default=_config.CATALOGUE_SNAPSHOT, help='the snapshot file')
+    args = parser.parse_args()
+
+    if args.command == 'harvest':
+        start = time.time()
+        records = harvest()
+        check_harvest(records, args.snapshot)
+        if same_as_snapshot(records, args.snapshot):
+            mark_harvested(args.snapshot)
+            print('No surveys have changed since {} was written, leaving it and the files made from it'.format(
+                args.snapshot))
+        else:
+            n = write_snapshot(records, args.snapshot)
+            print('Wrote {} surveys to {} ({:,} bytes) in {:.1f}s'.format(
+                n, args.snapshot, os.path.getsize(args.snapshot), time.time() - start))
+            if args.snapshot == _config.CATALOGUE_SNAPSHOT:
+                write_derived_files(args.snapshot)
+    else:
+        s = CatalogueSnapshot(args.snapshot)
+        print('{}: {} surveys, {} distinct strings, {:,} bytes, written {}'.format(
+            s.path, len(s), s.string_count, os.path.getsize(s.path),
+            datetime.fromtimestamp(s.created).isoformat()))
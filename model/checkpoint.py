@@ -0,0 +1,214 @@
+"""
+Checkpoints of this process's caches, so that a restarted or recycled worker starts with the records and representations
+its predecessor had rather than sending all its traffic to ARGUS until it has got them again
+
+The caches that are worth keeping, the upstream records, the compressed bodies, the tiles and the SPARQL results, are
+registered here by the modules that make them. Every CACHE_CHECKPOINT_SECONDS, and when a process exits, their items are
+written to CACHE_CHECKPOINT_FILE, merged with those the other workers wrote there, and they're loaded again, with their
+expiry times, when the app is made and again in each worker that starts after the checkpoint has changed, e.g. one
+gunicorn forks to replace a recycled worker. Items keyed by a catalogue Generation are only kept while the catalogue
+snapshot they were made from is the current one.
+"""
+import atexit
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+import _config
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where workers' checkpoints then overwrite, rather than merge with, each other
+    fcntl = None
+
+VERSION = 1
+
+# name -> (LRUCache, whether its keys start with a Generation number)
+caches = OrderedDict()
+# name -> items loaded from the checkpoint for caches not registered yet, i.e. whose modules haven't been imported
+_pending = {}
+restored = {}
+
+_thread_pid = None
+_exit_saved_pid = None
+# the modification time of the checkpoint when this process, or the process it was forked from, last loaded it
+_loaded_mtime = None
+
+
+def register(name, cache, per_generation=False):
+    """
+    Has a cache checkpointed, and loads into it any of its items the checkpoint has already been read for
+
+    :param name: the cache's name in the checkpoint file
+    :param cache: a model.cache.LRUCache
+    :param per_generation: whether its keys are (Generation number, ...), as the tiles' and SPARQL results' are
+    """
+    caches[name] = (cache, per_generation)
+    items = _pending.pop(name, None)
+    if items:
+        restored[name] = cache.load(items)
+
+
+def _snapshot_id():
+    """
+    :return: the (Generation number, snapshot file ID) of the current catalogue Generation, or (None, None)
+    """
+    from model import generations
+    gen = generations.holder.current()
+    return (gen.number, gen.snapshot.file_id) if gen is not None else (None, None)
+
+
+def _read(path):
+    """
+    :return: the checkpoint's dict, or None if there isn't one or it can't be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning('Could not read the cache checkpoint {}: {}'.format(path, e))
+        return None
+    return checkpoint if isinstance(checkpoint, dict) and checkpoint.get('version') == VERSION else None
+
+
+def load(path=_config.CACHE_CHECKPOINT_FILE):
+    """
+    Loads the caches' unexpired items from the checkpoint, keeping the items the caches already hold. Generation-keyed
+    items are loaded into the current Generation, if its snapshot is the one they were made from.
+
+    :return: a dict of cache name to the number of items loaded, including those kept for caches not registered yet
+    """
+    global _loaded_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    checkpoint = _read(path)
+    _loaded_mtime = mtime
+    if checkpoint is None:
+        return {}
+    number, file_id = _snapshot_id()
+    same_snapshot = number is not None and checkpoint['snapshot'] == file_id
+
+    loaded = {}
+    for name, (per_generation, items) in checkpoint['caches'].items():
+        if per_generation:
+            if not same_snapshot:
+                continue
+            items = [((number,) + key, expires, value) for key, expires, value in items]
+        if name in caches:
+            restored[name] = loaded[name] = caches[name][0].load(items)
+        else:
+            _pending[name] = items
+            loaded[name] = len(items)
+    logging.info('Loaded cache checkpoint {}: {}'.format(
+        path, ', '.join('{} {}'.format(n, name) for name, n in loaded.items())))
+    return loaded
+
+
+def _dump(cache, per_generation, number):
+    items = cache.dump()
+    if per_generation:
+        # only the current Generation's, without its number, which another process will give its own
+        items = [(key[1:], expires, value) for key, expires, value in items if key[0] == number]
+    return items
+
+
+def save(path=_config.CACHE_CHECKPOINT_FILE):
+    """
+    Writes the caches' unexpired items to the checkpoint, atomically, merged with those already there: this process's
+    are taken as more recently used, and each cache keeps at most its max_items and max_bytes. Checkpointing processes
+    on this machine take turns.
+
+    :return: the number of items written
+    """
+    number, file_id = _snapshot_id()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            previous = _read(path) or {'snapshot': None, 'caches': {}}
+            now = time.time()
+            merged = {}
+            for name, (per_generation, items) in previous['caches'].items():
+                if per_generation and previous['snapshot'] != file_id:
+                    continue
+                merged[name] = (per_generation, [item for item in items if item[1] == 0 or item[1] > now])
+            for name, (cache, per_generation) in caches.items():
+                ours = _dump(cache, per_generation, number)
+                keys = set(key for key, _, _ in ours)
+                theirs = [item for item in merged.get(name, (per_generation, []))[1] if item[0] not in keys]
+                merged[name] = (per_generation, cache.fitting(theirs + ours))
+
+            tmp = '{}.{}.tmp'.format(path, os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump({'version': VERSION, 'saved': now, 'snapshot': file_id, 'caches': merged}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return sum(len(items) for _, items in merged.values())
+
+
+def _save_quietly():
+    try:
+        save()
+    except Exception:
+        logging.exception('Could not write the cache checkpoint')
+
+
+def save_on_exit():
+    """
+    Writes the checkpoint as this process exits, once however many exit hooks call it
+    """
+    global _exit_saved_pid
+    if _config.CACHE_CHECKPOINT_FILE is not None and _exit_saved_pid != os.getpid():
+        _exit_saved_pid = os.getpid()
+        _save_quietly()
+
+
+def _run():
+    while True:
+        time.sleep(_config.CACHE_CHECKPOINT_SECONDS)
+        _save_quietly()
+
+
+def ensure_started():
+    """
+    Starts this process's periodic checkpoints and has it checkpoint when it exits, if it isn't already. Threads don't
+    survive fork() so this is called in each worker, not in a preloading master process.
+
+    A worker forked from a preloading master has the caches the master loaded when it started, so one that replaces a
+    recycled worker loads the checkpoint again, for what its predecessors have written there since.
+    """
+    global _thread_pid
+    if _config.CACHE_CHECKPOINT_FILE is not None and _thread_pid != os.getpid():
+        _thread_pid = os.getpid()
+        try:
+            changed = os.path.getmtime(_config.CACHE_CHECKPOINT_FILE) != _loaded_mtime
+        except OSError:
+            changed = False
+        if changed:
+            load()
+        atexit.register(save_on_exit)
+        threading.Thread(target=_run, name='cache-checkpoint', daemon=True).start()
+
+
+def metrics():
+    """
+    :return: a dict of metric name to value of each checkpointed cache: its items, hits and misses since this process
+        started and the items it was given from the checkpoint
+    """
+    values = OrderedDict()
+    for name, (cache, _) in caches.items():
+        values[name + '_items'] = len(cache)
+        values[name + '_hits'] = cache.hits
+        values[name + '_misses'] = cache.misses
+        values[name + '_restored'] = restored.get(name, 0)
+    return values
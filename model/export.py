@@ -0,0 +1,200 @@
+"""
+Bulk exports of every survey in the catalogue, in every RDF view, e.g. for loading into a triplestore
+
+    python -m model.export --format nq
+
+N-Triples exports are one graph of all the surveys' views. N-Quads exports put each survey's view in its own named
+graph, <{survey URI}?_view={view}>, so that a triplestore can replace one survey view's triples at a time.
+
+Exporting is a generator pipeline: chunks of the catalogue snapshot are turned into RDF by a pool of processes, each
+mapping the snapshot itself so that no records are pickled between processes, and the RDF is gzipped, in catalogue
+order, as each chunk arrives. Nothing holds more than a few chunks in memory. Export files are written offline, after each
+harvest, and the /survey/export endpoint only serves them: it never starts an export itself.
+"""
+import argparse
+import gzip
+import logging
+import multiprocessing
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os.path import dirname, abspath
+from rdflib import Graph
+from model import catalogue
+import _config
+
+MIMETYPES = {
+    'nt': 'application/n-triples',
+    'nq': 'application/n-quads',
+}
+
+# the catalogue snapshot mapped by this process, for export chunks
+_snapshot = None
+
+
+def graph_uri(survey_id, view):
+    return '{}{}?_view={}'.format(_config.BASE_URI_SURVEY, survey_id, view)
+
+
+def _open_snapshot(path, file_id=None):
+    global _snapshot
+    _snapshot = catalogue.CatalogueSnapshot(path)
+    if file_id is not None and _snapshot.file_id != file_id:
+        raise catalogue.CatalogueError('The catalogue snapshot was replaced during the export')
+
+
+def survey_ntriples(record, views, quads=False):
+    """
+    Makes N-Triples, or N-Quads, of one survey's views
+
+    :param record: a model.catalogue.SurveyRecord
+    :param views: the names of the views to export
+    :param quads: whether to put each view in its own named graph
+    :return: a string of N-Triples or N-Quads lines
+    """
+    from model.survey import SurveyRenderer
+
+    survey = SurveyRenderer.from_record(record)
+    out = []
+    for view in views:
+        # N-Triples has no prefixes so skip binding rdflib's default namespaces, much of the cost of a small graph
+        nt = survey.make_graph(view, Graph(bind_namespaces='none')).serialize(format='nt')
+        if quads:
+            # a line's only unescaped ' .\n' is its end
+            nt = nt.replace(' .\n', ' <{}> .\n'.format(graph_uri(survey.survey_id, view)))
+        out.append(nt)
+    return ''.join(out)
+
+
+def _export_chunk(task):
+    start, stop, views, quads = task
+    lines = []
+    for i in range(start, stop):
+        lines.append(survey_ntriples(_snapshot.record(i), views, quads))
+    data = ''.join(lines).encode('utf-8')
+    return data, data.count(b'\n')
+
+
+def export_chunks(snapshot_path=_config.CATALOGUE_SNAPSHOT, views=_config.EXPORT_VIEWS, quads=False,
+                  workers=_config.EXPORT_WORKERS, chunk_size=_config.EXPORT_CHUNK_SIZE):
+    """
+    Generates the RDF of every survey in a catalogue snapshot, a chunk of surveys at a time, in catalogue order
+
+    :param snapshot_path: the catalogue snapshot file
+    :param views: the names of the views to export
+    :param quads: N-Quads, with a named graph per survey view, rather than N-Triples
+    :param workers: the number of processes making RDF, 0 to make it in this process
+    :param chunk_size: the number of surveys given to a process at a time
+    :return: a generator of (UTF-8 bytes, number of triples) tuples
+    """
+    snapshot = catalogue.CatalogueSnapshot(snapshot_path)
+    tasks = ((i, min(i + chunk_size, len(snapshot)), tuple(views), quads) for i in range(0, len(snapshot), chunk_size))
+
+    if workers == 0:
+        global _snapshot
+        _snapshot = snapshot
+        for task in tasks:
+            yield _export_chunk(task)
+        return
+
+    # spawned, not forked, processes as the caller may be a threaded web server
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_open_snapshot,
+            initargs=(snapshot_path, snapshot.file_id)) as pool:
+        # keep only a few chunks in flight, so that a slow consumer doesn't have the whole export pile up in memory
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_export_chunk, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def gzipped(chunks, level=6):
+    """
+    Gzips a stream of bytes incrementally
+
+    :param chunks: an iterable of bytes
+    :param level: the gzip level, 1-9
+    :return: a generator of gzipped bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: a gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def get_export_file(export_format):
+    """
+    :return: the path of the export file of this format, 'nt' or 'nq', if one has been written, else None. It's of the
+        snapshot it was written after, until the export is run again.
+    """
+    path = _config.EXPORT_FILES[export_format]
+    return path if os.path.exists(path) else None
+
+
+def gunzipped(path, chunk_size=1 << 16):
+    """
+    :return: a generator of the uncompressed bytes of a gzipped export file, read a chunk at a time
+    """
+    with gzip.open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def write_export(path, snapshot_path=_config.CATALOGUE_SNAPSHOT, views=_config.EXPORT_VIEWS, quads=False,
+                 workers=_config.EXPORT_WORKERS, chunk_size=_config.EXPORT_CHUNK_SIZE, level=6):
+    """
+    Writes a gzipped export file, atomically replacing any existing one
+
+    :return: the number of triples written
+    """
+    counts = []
+
+    def data():
+        for chunk, triples in export_chunks(snapshot_path, views, quads, workers, chunk_size):
+            counts.append(triples)
+            yield chunk
+
+    os.makedirs(dirname(abspath(path)), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            for compressed in gzipped(data(), level):
+                f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return sum(counts)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description='Exports every survey in the catalogue as gzipped N-Triples or N-Quads')
+    parser.add_argument('--format', choices=sorted(MIMETYPES), default='nt')
+    parser.add_argument('--output', help='the export file, by default the one the /survey/export endpoint serves')
+    parser.add_argument('--snapshot', default=_config.CATALOGUE_SNAPSHOT, help='the catalogue snapshot file')
+    parser.add_argument('--views', default=','.join(_config.EXPORT_VIEWS), help='comma-separated views to export')
+    parser.add_argument('--workers', type=int, default=_config.EXPORT_WORKERS, help='0 to not use other processes')
+    parser.add_argument('--chunk-size', type=int, default=_config.EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    output = args.output or _config.EXPORT_FILES[args.format]
+    start = time.time()
+    n = write_export(output, args.snapshot, args.views.split(','), args.format == 'nq', args.workers, args.chunk_size)
+    seconds = time.time() - start
+    print('Wrote {:,} triples to {} ({:,} bytes) in {:.1f}s, {:,.0f} triples/s'.format(
+        n, output, os.path.getsize(output), seconds, n / seconds))
@@ -0,0 +1,337 @@
+"""
+Triple Pattern Fragments (https://linkeddatafragments.org/specification/triple-pattern-fragments/) of the whole survey
+catalogue: the triples matching one ?s ?p ?o pattern, a page at a time, with their count and the hypermedia controls
+that let clients, such as Comunica, answer SPARQL queries themselves
+
+The triples, of the _config.EXPORT_VIEWS of every survey, are held as a lazy index of each catalogue Generation (see
+model/generations.py). Each term is given an integer ID and each triple is packed into a single integer key in three
+orders, subject-predicate-object, predicate-object-subject and object-subject-predicate, which are sorted, so that any
+pattern's triples are one contiguous range of one of the orders, found by binary search. Every fragment therefore
+costs two binary searches and a slice, however many triples match, and its count is exact.
+
+Fragments are the same bytes from every worker, as their ETags, made from the catalogue snapshot, say: blank nodes are
+labelled by their survey, view and neighbourhood, terms are numbered in N3 order and fragments are serialized in order.
+"""
+import io
+import json
+import re
+from array import array
+from bisect import bisect_left
+from urllib.parse import urlencode
+from rdflib import Graph, Dataset, Namespace, URIRef, BNode, Literal, RDF
+from rdflib.plugins.serializers.trig import TrigSerializer
+from model import generations
+import _config
+
+HYDRA = Namespace('http://www.w3.org/ns/hydra/core#')
+VOID = Namespace('http://rdfs.org/ns/void#')
+
+MIMETYPES = [
+    'text/turtle',
+    'application/trig',
+    'application/n-triples',
+    'application/ld+json',
+]
+FORMATS = {
+    'text/turtle': 'turtle',
+    'application/trig': 'trig',
+    'application/n-triples': 'nt',
+    'application/ld+json': 'json-ld',
+}
+
+# a literal in the TPF query parameter form: "value", "value"@lang or "value"^^<datatype>
+LITERAL = re.compile(r'^"(?P<value>.*)"(?:@(?P<lang>[a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^<?(?P<datatype>[^<>]+)>?)?$',
+                     re.DOTALL)
+
+# for each combination of bound (subject, predicate, object), the order whose keys start with the bound terms
+ORDERS_BY_BOUND = {
+    (True, True, True): 'spo',
+    (True, True, False): 'spo',
+    (True, False, False): 'spo',
+    (False, False, False): 'spo',
+    (True, False, True): 'osp',
+    (False, False, True): 'osp',
+    (False, True, False): 'pos',
+    (False, True, True): 'pos',
+}
+# the positions, in a subject-predicate-object triple, of each order's terms
+POSITIONS = {
+    'spo': (0, 1, 2),
+    'pos': (1, 2, 0),
+    'osp': (2, 0, 1),
+}
+
+
+def parse_term(value):
+    """
+    Parses a subject, predicate or object query parameter
+
+    :param value: an IRI, a "literal", a _:blank node, or a ?variable or nothing for any term
+    :return: an rdflib term, or None for any term
+    """
+    if value is None or value == '' or value.startswith('?'):
+        return None
+    if value.startswith('"'):
+        m = LITERAL.match(value)
+        if m is None:
+            raise ValueError('Not a literal: {}'.format(value))
+        return Literal(m.group('value'), lang=m.group('lang'),
+                       datatype=URIRef(m.group('datatype')) if m.group('datatype') else None)
+    if value.startswith('_:'):
+        return BNode(value[2:])
+    return URIRef(value)
+
+
+class TripleIndex:
+    """
+    A set of triples, dictionary encoded and sorted in three orders
+    """
+
+    def __init__(self, triples):
+        """
+        :param triples: an iterable of rdflib (subject, predicate, object) triples, duplicates allowed
+        """
+        self.ids = {}
+        self.terms = []
+        encoded = (array('L'), array('L'), array('L'))
+        for triple in triples:
+            for position, term in enumerate(triple):
+                term_id = self.ids.get(term)
+                if term_id is None:
+                    term_id = self.ids[term] = len(self.terms)
+                    self.terms.append(term)
+                encoded[position].append(term_id)
+
+        # the terms are numbered in their N3 order, not the order they were met in, so that the same triples give the
+        # same IDs, and the same pages, in every process
+        order = sorted(range(len(self.terms)), key=lambda term_id: self.terms[term_id].n3())
+        renumbered = array('L', [0]) * len(order)
+        for new_id, old_id in enumerate(order):
+            renumbered[old_id] = new_id
+        self.terms = [self.terms[old_id] for old_id in order]
+        self.ids = {term: term_id for term_id, term in enumerate(self.terms)}
+        encoded = tuple(array('L', (renumbered[term_id] for term_id in ids)) for ids in encoded)
+
+        self.bits = max(1, (len(self.terms) - 1).bit_length())
+        self.mask = (1 << self.bits) - 1
+        self.orders = {}
+        for order, (a, b, c) in POSITIONS.items():
+            keys = sorted(set(
+                (x << (2 * self.bits)) | (y << self.bits) | z
+                for x, y, z in zip(encoded[a], encoded[b], encoded[c])
+            ))
+            # packed 64-bit keys when the terms are few enough, else Python ints
+            self.orders[order] = array('Q', keys) if 3 * self.bits <= 64 else keys
+        self.count = len(self.orders['spo'])
+
+    def __len__(self):
+        return self.count
+
+    def _range(self, subject, predicate, object_):
+        pattern = (subject, predicate, object_)
+        order = ORDERS_BY_BOUND[tuple(term is not None for term in pattern)]
+        prefix = 0
+        bound = 0
+        for position in POSITIONS[order]:
+            if pattern[position] is None:
+                break
+            term_id = self.ids.get(pattern[position])
+            if term_id is None:
+                return order, 0, 0
+            prefix = (prefix << self.bits) | term_id
+            bound += 1
+        shift = self.bits * (3 - bound)
+        keys = self.orders[order]
+        return order, bisect_left(keys, prefix << shift), bisect_left(keys, (prefix + 1) << shift)
+
+    def count_matches(self, subject=None, predicate=None, object_=None):
+        """
+        :return: the number of triples matching a pattern, None for any term
+        """
+        order, lo, hi = self._range(subject, predicate, object_)
+        return hi - lo
+
+    def match(self, subject=None, predicate=None, object_=None, offset=0, limit=None):
+        """
+        Finds a page of the triples matching a pattern
+
+        :param subject: an rdflib term or None for any
+        :param predicate: an rdflib term or None for any
+        :param object_: an rdflib term or None for any
+        :param offset: the number of matching triples to skip
+        :param limit: the most triples to give, None for all
+        :return: a (number of matching triples, list of the page's rdflib triples) tuple
+        """
+        order, lo, hi = self._range(subject, predicate, object_)
+        start = min(lo + offset, hi)
+        stop = hi if limit is None else min(start + limit, hi)
+        positions = POSITIONS[order]
+        triples = []
+        for key in self.orders[order][start:stop]:
+            ids = (key >> (2 * self.bits), (key >> self.bits) & self.mask, key & self.mask)
+            triple = [None, None, None]
+            for position, term_id in zip(positions, ids):
+                triple[position] = self.terms[term_id]
+            triples.append(tuple(triple))
+        return hi - lo, triples
+
+
+def catalogue_triples(snapshot, views=_config.EXPORT_VIEWS):
+    """
+    :return: a generator of the triples of the given views of every survey in a catalogue snapshot. Blank nodes are
+        labelled by their survey and view and the order they are first met in, e.g. _:s921-gapd-b1, as rdflib's labels
+        are random, so that every process gives the same ones and a blank node's fragment can be asked of any of them.
+    """
+    from model.survey import SurveyRenderer
+
+    for record in snapshot:
+        survey = SurveyRenderer.from_record(record)
+        for view in views:
+            graph = survey.make_graph(view, Graph(bind_namespaces='none'))
+            yield from label_bnodes(graph, 's{}-{}-b'.format(record.survey_id, view))
+
+
+def label_bnodes(triples, prefix):
+    """
+    Gives the blank nodes of a small graph, such as a survey's view, labels that depend only on the graph: each is
+    described by the sorted terms around it, and those around its blank neighbours, and they're numbered in the order of
+    those descriptions. rdflib gives them random labels and iterates graphs in an order that differs between processes.
+
+    :param triples: an iterable of rdflib triples
+    :param prefix: the start of each label, e.g. s921-gapd-b for _:s921-gapd-b1, _:s921-gapd-b2...
+    :return: a list of the triples with their blank nodes relabelled
+    """
+    triples = list(triples)
+    edges = {}
+    for s, p, o in triples:
+        if isinstance(s, BNode):
+            edges.setdefault(s, []).append(('>', p, o))
+        if isinstance(o, BNode):
+            edges.setdefault(o, []).append(('<', p, s))
+    if not edges:
+        return triples
+
+    def describe(names):
+        return {
+            bnode: sorted((d, p.n3(), names[t] if isinstance(t, BNode) else t.n3()) for d, p, t in around)
+            for bnode, around in edges.items()
+        }
+
+    # blank neighbours are first described as anonymous, then by their own descriptions
+    described = describe(dict.fromkeys(edges, '_'))
+    described = describe({bnode: repr(description) for bnode, description in described.items()})
+    labels = {bnode: BNode(prefix + str(n)) for n, bnode in enumerate(sorted(edges, key=described.get), 1)}
+    return [tuple(labels.get(term, term) if isinstance(term, BNode) else term for term in triple)
+            for triple in triples]
+
+
+@generations.register_index('fragments', lazy=True)
+def build_fragments_index(snapshot, previous):
+    return TripleIndex(catalogue_triples(snapshot))
+
+
+def fragment_url(base_url, params):
+    """
+    :param base_url: the URL of the fragments endpoint
+    :param params: an iterable of (query parameter, value) pairs, those with None values left out
+    """
+    query = urlencode([(k, v) for k, v in params if v is not None])
+    return base_url + ('?' + query if query else '')
+
+
+def fragment_graph(index, base_url, subject, predicate, object_, page, page_size=_config.FRAGMENTS_PAGE_SIZE,
+                   mimetype='text/turtle'):
+    """
+    Makes one page of a Triple Pattern Fragment: its triples, count and hypermedia controls
+
+    :param index: a TripleIndex
+    :param base_url: the URL of the fragments endpoint
+    :param subject: the subject query parameter value, or None
+    :param predicate: the predicate query parameter value, or None
+    :param object_: the object query parameter value, or None
+    :param page: the 1-based page number
+    :return: the fragment's bytes in the mimetype
+    :raises ValueError: if a term is not valid
+    """
+    count, triples = index.match(parse_term(subject), parse_term(predicate), parse_term(object_),
+                                 (page - 1) * page_size, page_size)
+
+    pattern = [('subject', subject), ('predicate', predicate), ('object', object_)]
+    fragment = URIRef(fragment_url(base_url, pattern + [('page', str(page) if page > 1 else None)]))
+    dataset = URIRef(base_url + '#dataset')
+
+    meta = Graph()
+    meta.bind('hydra', HYDRA)
+    meta.bind('void', VOID)
+    meta.add((dataset, RDF.type, VOID.Dataset))
+    meta.add((dataset, RDF.type, HYDRA.Collection))
+    meta.add((dataset, VOID.subset, fragment))
+    meta.add((dataset, VOID.triples, Literal(len(index))))
+    # the controls' blank nodes are labelled, rather than given random labels, so every process gives the same bytes
+    search = BNode('search')
+    meta.add((dataset, HYDRA.search, search))
+    meta.add((search, HYDRA.template, Literal(base_url + '{?subject,predicate,object}')))
+    meta.add((search, HYDRA.variableRepresentation, HYDRA.ExplicitRepresentation))
+    for variable, prop in (('subject', RDF.subject), ('predicate', RDF.predicate), ('object', RDF.object)):
+        mapping = BNode('mapping-' + variable)
+        meta.add((search, HYDRA.mapping, mapping))
+        meta.add((mapping, HYDRA.variable, Literal(variable)))
+        meta.add((mapping, HYDRA.property, prop))
+
+    meta.add((fragment, RDF.type, HYDRA.PartialCollectionView))
+    meta.add((fragment, VOID.triples, Literal(count)))
+    meta.add((fragment, HYDRA.totalItems, Literal(count)))
+    meta.add((fragment, HYDRA.itemsPerPage, Literal(page_size)))
+    meta.add((fragment, HYDRA.first, URIRef(fragment_url(base_url, pattern))))
+    if page > 1:
+        meta.add((fragment, HYDRA.previous, URIRef(fragment_url(base_url, pattern + [('page', str(page - 1))]))))
+    if page * page_size < count:
+        meta.add((fragment, HYDRA.next, URIRef(fragment_url(base_url, pattern + [('page', str(page + 1))]))))
+
+    if mimetype == 'application/trig':
+        # the triples in the default graph and the controls in a graph of their own, as the TPF specification suggests
+        ds = Dataset()
+        for prefix, namespace in meta.namespaces():
+            ds.bind(prefix, namespace)
+        for triple in triples:
+            ds.add(triple)
+        metadata = ds.graph(URIRef(str(fragment) + '#metadata'))
+        for triple in meta:
+            metadata.add(triple)
+        return serialize(ds, mimetype)
+    for triple in triples:
+        meta.add(triple)
+    return serialize(meta, mimetype)
+
+
+def _sorted_json(o):
+    """
+    :return: a JSON-LD value with every array's items, but those of @lists, in order
+    """
+    if isinstance(o, list):
+        return sorted((_sorted_json(v) for v in o), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(o, dict):
+        return {k: v if k == '@list' else _sorted_json(v) for k, v in o.items()}
+    return o
+
+
+def serialize(graph, mimetype):
+    """
+    Serializes a fragment the same way in every process. rdflib writes Turtle's subjects in order but N-Triples'
+    triples, TriG's graphs and JSON-LD's nodes in the order its store iterates them in, which differs between processes.
+
+    :param graph: an rdflib Graph, or a Dataset for TriG
+    :return: the bytes in the mimetype
+    """
+    if mimetype == 'application/trig':
+        serializer = TrigSerializer(graph)
+        serializer.contexts.sort(key=lambda context: str(context.identifier))
+        out = io.BytesIO()
+        serializer.serialize(out, encoding='utf-8')
+        return out.getvalue()
+    data = graph.serialize(format=FORMATS[mimetype], encoding='utf-8')
+    if mimetype == 'application/n-triples':
+        return b''.join(sorted(data.splitlines(True)))
+    if mimetype == 'application/ld+json':
+        return json.dumps(_sorted_json(json.loads(data)), indent=2, sort_keys=True).encode('utf-8')
+    return data
@@ -0,0 +1,307 @@
+"""
+Generations of the survey catalogue: a catalogue snapshot plus all the in-process indexes built from it
+
+A CatalogueHolder keeps the current Generation. Its background thread notices new snapshots (harvesting them itself,
+if it's the harvest leader and the snapshot is due a refresh), builds and validates a complete new Generation off the
+request path and then publishes it with a single reference swap. Requests never see a half-built Generation and keep
+the one they started with, via current_generation(), for their whole life.
+
+Indexes are added by registering a builder function:
+
+    @generations.register_index('my_index')
+    def build_my_index(snapshot, previous):
+        ...
+
+where snapshot is the new model.catalogue.CatalogueSnapshot and previous is the Generation being replaced, or None,
+for incremental builds. A builder may raise an Exception to reject the new Generation.
+
+Indexes that are large or slow to build, and not needed by every worker, can be registered with lazy=True. They are
+built, on a background thread, when a request first asks for one with Generation.lazy_index().
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+from model import catalogue
+import _config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# how long to wait before trying again after a failed harvest
+HARVEST_RETRY_SECONDS = 600
+
+# index name -> builder function(snapshot, previous Generation or None)
+INDEX_BUILDERS = OrderedDict()
+LAZY_INDEX_BUILDERS = OrderedDict()
+
+
+def register_index(name, lazy=False):
+    """
+    Registers a function that builds an index for each new Generation
+
+    :param lazy: build the index only when it's first asked for, rather than with the Generation
+    """
+    def decorator(builder):
+        if lazy:
+            LAZY_INDEX_BUILDERS[name] = builder
+        else:
+            INDEX_BUILDERS[name] = builder
+        return builder
+    return decorator
+
+
+class GenerationError(ValueError):
+    pass
+
+
+class Generation:
+    """
+    An immutable catalogue snapshot and the indexes built from it
+    """
+
+    def __init__(self, number, snapshot, indexes, build_seconds):
+        self.number = number
+        self.snapshot = snapshot
+        self.indexes = indexes
+        self.build_seconds = build_seconds
+        self.created = time.time()
+        self._lazy_lock = threading.Lock()
+        self._lazy_building = set()
+
+    def index(self, name):
+        return self.indexes[name]
+
+    def lazy_index(self, name):
+        """
+        Gets a lazy index, starting to build it on a background thread if it isn't already built or being built
+
+        :return: the index, or None while it's being built
+        """
+        index = self.indexes.get(name)
+        if index is None:
+            with self._lazy_lock:
+                if name not in self.indexes and name not in self._lazy_building:
+                    self._lazy_building.add(name)
+                    threading.Thread(target=self._build_lazy_index, args=(name,), name='index-' + name,
+                                     daemon=True).start()
+        return index
+
+    def _build_lazy_index(self, name):
+        start = time.perf_counter()
+        try:
+            self.indexes[name] = LAZY_INDEX_BUILDERS[name](self.snapshot, None)
+            logging.info('Built the {} index of catalogue generation {} in {:.1f}s'.format(
+                name, self.number, time.perf_counter() - start))
+        except Exception:
+            logging.exception('Could not build the {} index of catalogue generation {}'.format(name, self.number))
+        finally:
+            with self._lazy_lock:
+                self._lazy_building.discard(name)
+
+    def get_record(self, survey_id):
+        return self.snapshot.get(survey_id)
+
+
+class CatalogueHolder:
+    """
+    Holds the current catalogue Generation and rebuilds it, on a background thread, when the snapshot changes
+    """
+
+    def __init__(self, snapshot_path, check_seconds, harvest_seconds=None, min_ratio=0.9):
+        """
+        :param snapshot_path: the catalogue snapshot file
+        :param check_seconds: how often the background thread looks for a changed snapshot
+        :param harvest_seconds: the age after which the snapshot is harvested afresh from ARGUS, None to never harvest
+        :param min_ratio: a new catalogue with fewer than this fraction of the current one's surveys is rejected as
+            a probably broken harvest
+        """
+        self.snapshot_path = snapshot_path
+        self.check_seconds = check_seconds
+        self.harvest_seconds = harvest_seconds
+        self.min_ratio = min_ratio
+
+        self._generation = None
+        self._build_lock = threading.Lock()
+        self._thread_pid = None
+        self.build_failures = 0
+        self.harvest_failures = 0
+        self.last_error = None
+        self._next_harvest_attempt = 0
+
+    def current(self):
+        """
+        :return: the current Generation, or None if none has been built yet
+        """
+        return self._generation
+
+    def _snapshot_file_id(self):
+        try:
+            st = os.stat(self.snapshot_path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+    def build(self, snapshot, previous):
+        """
+        Builds and validates a new Generation from a snapshot, without publishing it
+
+        :raises GenerationError: if the new Generation is not valid
+        """
+        start = time.perf_counter()
+        if len(snapshot) == 0:
+            raise GenerationError('The catalogue snapshot is empty')
+        if previous is not None and len(snapshot) < len(previous.snapshot) * self.min_ratio:
+            raise GenerationError('The catalogue snapshot has {} surveys, too few compared to the current {}'.format(
+                len(snapshot), len(previous.snapshot)))
+
+        indexes = {}
+        for name, builder in INDEX_BUILDERS.items():
+            indexes[name] = builder(snapshot, previous)
+
+        number = previous.number + 1 if previous is not None else 1
+        return Generation(number, snapshot, indexes, time.perf_counter() - start)
+
+    def refresh(self):
+        """
+        Builds and publishes a new Generation if the snapshot file has changed since the current one was built
+
+        :return: True if a new Generation was published
+        """
+        with self._build_lock:
+            file_id = self._snapshot_file_id()
+            previous = self._generation
+            if file_id is None or (previous is not None and previous.snapshot.file_id == file_id):
+                return False
+            try:
+                new = self.build(catalogue.CatalogueSnapshot(self.snapshot_path), previous)
+            except Exception as e:
+                self.build_failures += 1
+                self.last_error = '{}: {}'.format(type(e).__name__, e)
+                logging.exception('Could not build a new catalogue generation')
+                return False
+
+            # the swap: requests already holding the previous Generation carry on with it
+            self._generation = new
+            logging.info('Published catalogue generation {}: {} surveys, built in {:.3f}s'.format(
+                new.number, len(new.snapshot), new.build_seconds))
+            return True
+
+    def harvest_if_due(self):
+        """
+        Harvests a new snapshot from ARGUS if the current one is older than harvest_seconds and no other process on this
+        machine is already doing so
+
+        A harvest that finds no survey changed leaves the snapshot, and the files made from it, as they are, so their
+        ETags hold, and only records when it was done.
+
+        :return: True if a new snapshot was written
+        """
+        if self.harvest_seconds is None or fcntl is None or time.time() < self._next_harvest_attempt:
+            return False
+        harvested = catalogue.last_harvested(self.snapshot_path)
+        if harvested is not None and time.time() - harvested < self.harvest_seconds:
+            return False
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        with open(self.snapshot_path + '.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False  # another worker is the harvest leader
+            try:
+                # another worker may have just finished harvesting
+                harvested = catalogue.last_harvested(self.snapshot_path)
+                if harvested is not None and time.time() - harvested < self.harvest_seconds:
+                    return False
+                records = catalogue.harvest()
+                # validated before, not after, it replaces the snapshot on disk
+                catalogue.check_harvest(records, self.snapshot_path, self.min_ratio)
+                if catalogue.same_as_snapshot(records, self.snapshot_path):
+                    catalogue.mark_harvested(self.snapshot_path)
+                    logging.info('Harvested {}: no surveys have changed'.format(self.snapshot_path))
+                    return False
+                catalogue.write_snapshot(records, self.snapshot_path)
+                return True
+            except Exception as e:
+                self.harvest_failures += 1
+                self.last_error = '{}: {}'.format(type(e).__name__, e)
+                # don't hammer a struggling ARGUS
+                self._next_harvest_attempt = time.time() + HARVEST_RETRY_SECONDS
+                logging.exception('Could not harvest the survey catalogue')
+                return False
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _run(self):
+        while True:
+            try:
+                harvested = self.harvest_if_due()
+                self.refresh()
+                if harvested:
+                    # after this worker has the new catalogue, as they take minutes
+                    catalogue.write_derived_files(self.snapshot_path)
+            except Exception:
+                logging.exception('Catalogue refresh failed')
+            time.sleep(self.check_seconds)
+
+    def ensure_started(self):
+        """
+        Starts this process's background refresh thread, if it isn't running. Threads don't survive fork() so this is
+        called in each worker, not in a preloading master process.
+        """
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name='catalogue-refresh', daemon=True).start()
+
+    def metrics(self):
+        """
+        :return: a dict of metric name to value describing the current Generation
+        """
+        gen = self._generation
+        now = time.time()
+        harvested = catalogue.last_harvested(self.snapshot_path)
+        return OrderedDict([
+            ('generation', gen.number if gen else 0),
+            ('generation_age_seconds', now - gen.created if gen else None),
+            ('build_seconds', gen.build_seconds if gen else None),
+            ('surveys', len(gen.snapshot) if gen else 0),
+            ('snapshot_age_seconds', now - gen.snapshot.created if gen else None),
+            ('harvest_age_seconds', now - harvested if harvested is not None else None),
+            ('build_failures', self.build_failures),
+            ('harvest_failures', self.harvest_failures),
+        ])
+
+
+holder = CatalogueHolder(
+    _config.CATALOGUE_SNAPSHOT,
+    _config.CATALOGUE_CHECK_SECONDS,
+    _config.CATALOGUE_HARVEST_SECONDS
+)
+
+
+def current_generation():
+    """
+    Gives the catalogue Generation for the current request: the one that was current when the request first asked, so
+    that a request never mixes data from two Generations
+
+    :return: a Generation or None if there isn't a catalogue
+    """
+    if not has_app_context():
+        return holder.current()
+    if 'catalogue_generation' not in g:
+        holder.ensure_started()
+        g.catalogue_generation = holder.current()
+    return g.catalogue_generation
+
+
+def get_record(survey_id):
+    """
+    :return: the current catalogue's SurveyRecord for a survey ID, or None if there's no catalogue or no such survey
+    """
+    gen = current_generation()
+    return gen.get_record(survey_id) if gen is not None else None
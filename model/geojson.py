@@ -0,0 +1,165 @@
+"""
+The Survey Register as a GeoJSON (RFC 7946) FeatureCollection of survey footprints, streamed straight from the columns
+of the catalogue snapshot
+
+Each survey is a Feature whose geometry is its bounding box polygon and whose properties are its core fields. Surveys
+are chosen by a bounding box and by filters on their fields, all tested on the snapshot's columns, so that no record is
+read unless it's in the collection, and coordinates can be rounded to fewer decimal places for smaller payloads.
+"""
+import json
+import math
+from datetime import date
+import _config
+
+MIMETYPE = 'application/geo+json'
+
+# the fields that are each Feature's properties
+PROPERTIES = [
+    'survey_name',
+    'state',
+    'survey_type',
+    'data_types',
+    'operator',
+    'contractor',
+    'processor',
+    'onshore_offshore',
+    'start_date',
+    'end_date',
+    'release_date',
+    'line_km',
+]
+# the fields that can be filtered on, case-insensitively, e.g. ?state=WA
+FILTERS = ['state', 'survey_type', 'onshore_offshore', 'operator', 'contractor', 'processor']
+
+# Features are streamed in batches of this many
+BATCH_SIZE = 500
+
+
+def parse_bbox(value):
+    """
+    :param value: a bbox query parameter, "west,south,east,north" in decimal degrees
+    :return: a (west, south, east, north) tuple of floats
+    :raises ValueError: if the bbox is not valid
+    """
+    try:
+        w, s, e, n = (float(v) for v in value.split(','))
+    except ValueError:
+        raise ValueError('bbox must be west,south,east,north in decimal degrees')
+    if not (-180 <= w <= e <= 180 and -90 <= s <= n <= 90):
+        raise ValueError('bbox must be west,south,east,north with west <= east and south <= north')
+    return w, s, e, n
+
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value).toordinal()
+    except ValueError:
+        raise ValueError('{} must be a date, YYYY-MM-DD'.format(name))
+
+
+def parse_precision(value):
+    """
+    :return: a precision query parameter, the number of decimal places of coordinates, as an int
+    :raises ValueError: if it's not an integer from 0 to 15
+    """
+    try:
+        precision = int(value)
+    except ValueError:
+        precision = None
+    if precision is None or not 0 <= precision <= 15:
+        raise ValueError('precision must be an integer from 0 to 15')
+    return precision
+
+
+def _refs_matching(snapshot, attr, value):
+    """
+    :return: the set of string refs in a string column whose strings equal value, ignoring case
+    """
+    value = value.casefold()
+    return {ref for ref in set(snapshot.columns[attr]) if ref != 0 and snapshot.string(ref).casefold() == value}
+
+
+def matching_rows(snapshot, bbox=None, filters=None, start_date=None, end_date=None):
+    """
+    Finds the surveys in a collection by testing the snapshot's columns
+
+    :param snapshot: a model.catalogue.CatalogueSnapshot
+    :param bbox: a (west, south, east, north) tuple, to choose surveys whose footprints intersect it
+    :param filters: a dict of field name, from FILTERS, to the value it must have
+    :param start_date: a date ordinal, to choose surveys that ended on or after it
+    :param end_date: a date ordinal, to choose surveys that started on or before it
+    :return: a list of record indexes
+    """
+    rows = range(len(snapshot))
+    for attr, value in (filters or {}).items():
+        column = snapshot.columns[attr]
+        refs = _refs_matching(snapshot, attr, value)
+        rows = [i for i in rows if column[i] in refs]
+    if start_date is not None:
+        column = snapshot.columns['end_date']
+        rows = [i for i in rows if column[i] >= start_date]
+    if end_date is not None:
+        column = snapshot.columns['start_date']
+        rows = [i for i in rows if 0 < column[i] <= end_date]
+    if bbox is not None:
+        w, s, e, n = bbox
+        w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+        s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+        # comparisons with NaN, i.e. no footprint, are False
+        rows = [i for i in rows if w_long[i] <= e and e_long[i] >= w and s_lat[i] <= n and n_lat[i] >= s]
+    return list(rows)
+
+
+def footprint(w, s, e, n, precision=None):
+    """
+    :return: a GeoJSON Polygon geometry of a bounding box, its ring anticlockwise as per RFC 7946, or None if the box
+        isn't known
+    """
+    if any(math.isnan(v) for v in (w, s, e, n)):
+        return None
+    if precision is not None:
+        w, s, e, n = (round(v, precision) for v in (w, s, e, n))
+    return {'type': 'Polygon', 'coordinates': [[[w, s], [e, s], [e, n], [w, n], [w, s]]]}
+
+
+def features(snapshot, rows, precision=None):
+    """
+    :return: a generator of the GeoJSON Feature dicts of the surveys at some record indexes
+    """
+    w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+    s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+    for i in rows:
+        record = snapshot.record(i)
+        properties = {'uri': _config.BASE_URI_SURVEY + str(record.survey_id)}
+        for attr in PROPERTIES:
+            value = getattr(record, attr)
+            properties[attr] = value.date().isoformat() if hasattr(value, 'date') else value
+        yield {
+            'type': 'Feature',
+            'id': record.survey_id,
+            'geometry': footprint(w_long[i], s_lat[i], e_long[i], n_lat[i], precision),
+            'properties': properties,
+        }
+
+
+def feature_collection(snapshot, rows, precision=None):
+    """
+    Streams a FeatureCollection, a batch of Features at a time
+
+    :param snapshot: a model.catalogue.CatalogueSnapshot
+    :param rows: the record indexes of the surveys, as per matching_rows()
+    :param precision: the number of decimal places to round coordinates to, None to not round them
+    :return: a generator of UTF-8 bytes
+    """
+    yield b'{"type":"FeatureCollection","features":['
+    batch = []
+    first = True
+    for feature in features(snapshot, rows, precision):
+        batch.append(json.dumps(feature, separators=(',', ':')))
+        if len(batch) == BATCH_SIZE:
+            yield ((',' if not first else '') + ','.join(batch)).encode('utf-8')
+            first = False
+            batch = []
+    if batch:
+        yield ((',' if not first else '') + ','.join(batch)).encode('utf-8')
+    yield b']}'
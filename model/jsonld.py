@@ -0,0 +1,204 @@
+"""
+JSON-LD of the survey and entity views, written straight from their values rather than by serializing an rdflib Graph
+
+rdflib's json-ld serializer writes expanded JSON-LD, every IRI in full and every value an object, and is the slowest of
+its serializers. These documents are compacted against one fixed context, published at _config.JSONLD_CONTEXT_URI, and
+made as dicts for json.dumps(), so that they cost little more than the JSON encoding itself. Each view's document has
+exactly the triples of SurveyRenderer.make_graph(), or EntityRenderer.make_graph(), for that view, which
+_bench/jsonld.py checks, by parsing both and comparing the graphs for isomorphism, and times against rdflib.
+"""
+import json
+from urllib.parse import quote
+from model.agents import agent_uri
+import _config
+
+CONTEXT = {
+    'prov': 'http://www.w3.org/ns/prov#',
+    'aurole': 'http://communications.data.gov.au/def/role/',
+    'geosp': 'http://www.opengis.net/ont/geosparql#',
+    'samfl': 'http://def.seegrid.csiro.au/ontology/om/sam-lite#',
+    'gapd': 'http://pid.geoscience.gov.au/def/ont/gapd#',
+    'sosa': 'http://www.w3.org/ns/sosa/',
+    'time': 'http://www.w3.org/2006/time#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'xsd': 'http://www.w3.org/2001/XMLSchema#',
+    'label': {'@id': 'rdfs:label', '@type': 'xsd:string'},
+    'comment': {'@id': 'rdfs:comment', '@type': 'xsd:string'},
+    'subClassOf': {'@id': 'rdfs:subClassOf', '@type': '@id'},
+    'qualifiedAttribution': {'@id': 'prov:qualifiedAttribution', '@type': '@id'},
+    'agent': {'@id': 'prov:agent', '@type': '@id'},
+    'wasAttributedTo': {'@id': 'prov:wasAttributedTo', '@type': '@id'},
+    'hadRole': {'@id': 'prov:hadRole', '@type': '@id'},
+    'hadLocation': {'@id': 'prov:hadLocation', '@type': '@id'},
+    'wasAssociatedWith': {'@id': 'prov:wasAssociatedWith', '@type': '@id'},
+    'asWKT': {'@id': 'geosp:asWKT', '@type': 'geosp:wktLiteral'},
+    'hasGeometry': {'@id': 'geosp:hasGeometry', '@type': '@id'},
+    'hasTime': {'@id': 'time:hasTime', '@type': '@id'},
+    'hasBeginning': {'@id': 'time:hasBeginning', '@type': '@id'},
+    'hasEnd': {'@id': 'time:hasEnd', '@type': '@id'},
+    'inXSDDateTime': {'@id': 'time:inXSDDateTime', '@type': 'xsd:date'},
+    'madeSampling': {'@id': 'sosa:madeSampling', '@type': '@id'},
+    'isHostedBy': {'@id': 'sosa:isHostedBy', '@type': '@id'},
+    'hasFeatureOfInterest': {'@id': 'sosa:hasFeatureOfInterest', '@type': '@id'},
+    'hasResult': {'@id': 'sosa:hasResult', '@type': '@id'},
+    'hasSample': {'@id': 'sosa:hasSample', '@type': '@id'},
+    'isSampleOf': {'@id': 'sosa:isSampleOf', '@type': '@id'},
+}
+
+VIEWS = ('gapd', 'prov', 'sosa')
+ENTITY_VIEWS = ('prov', 'sosa')
+
+URI_FOI = 'http://pid.geoscience.gov.au/feature/earthSusbsurface'
+URI_PLATFORM = 'http://pid.geoscience.gov.au/platform/'
+
+
+def context_document():
+    """
+    :return: the JSON of the context document published at _config.JSONLD_CONTEXT_URI
+    """
+    return json.dumps({'@context': CONTEXT}, indent=2)
+
+
+def _attributions(survey, nodes):
+    """
+    Adds the agent nodes of a survey's attributions to nodes
+
+    :return: the survey's prov:qualifiedAttribution objects and its agents' IDs, in the order of SurveyRenderer
+        .make_graph()
+    """
+    attributions = []
+    agents = []
+    for key, name, role in (('contractor', survey.contractor, 'aurole:PrincipalInvestigator'),
+                            ('operator', survey.operator, 'aurole:Sponsor'),
+                            ('processor', survey.processor, 'aurole:Processor')):
+        # as the graph does, an agent with no name is a blank node, labelled "None"
+        agent_id = agent_uri(name) or '_:{}-{}'.format(key, survey.survey_id)
+        nodes.append({'@id': agent_id, '@type': 'prov:Agent', 'label': str(name)})
+        attributions.append({'@type': 'prov:Attribution', 'agent': agent_id, 'hadRole': role})
+        agents.append(agent_id)
+    attributions.append({'@type': 'prov:Attribution', 'agent': survey.URI_GA, 'hadRole': 'aurole:Publisher'})
+    return attributions, agents
+
+
+def _gapd_prov_nodes(survey, view, uri):
+    nodes = []
+    attributions, agents = _attributions(survey, nodes)
+    ga = {'@id': survey.URI_GA, '@type': ['prov:Org'], 'label': 'Geoscience Australia'}
+    nodes.append(ga)
+    this_survey = {'@id': uri, '@type': ['prov:Activity'], 'qualifiedAttribution': attributions}
+    if view == 'gapd':
+        this_survey['@type'].append('gapd:PublicSurvey')
+        this_survey['hadLocation'] = {'@type': 'samfl:Polygon', 'asWKT': survey.wkt_polygon}
+    else:
+        this_survey['label'] = 'Survey ' + survey.survey_id
+        this_survey['wasAssociatedWith'] = agents + [survey.URI_GA]
+        ga['@type'].append('prov:Agent')
+    return [this_survey] + nodes
+
+
+def _sosa_nodes(survey, uri):
+    this_survey = {'@id': uri, '@type': 'sosa:Sampling'}
+    if survey.start_date is not None and survey.end_date is not None:
+        this_survey['hasTime'] = {
+            '@type': 'time:ProperInterval',
+            'hasBeginning': {'@type': 'time:Instant', 'inXSDDateTime': survey.start_date.date().isoformat()},
+            'hasEnd': {'@type': 'time:Instant', 'inXSDDateTime': survey.end_date.date().isoformat()},
+        }
+    elif survey.start_date is not None:
+        this_survey['hasTime'] = {'@type': 'time:Instant', 'inXSDDateTime': survey.start_date.date().isoformat()}
+    sample_id = '_:sample-{}'.format(survey.survey_id)
+    this_survey['hasFeatureOfInterest'] = URI_FOI
+    this_survey['hasResult'] = sample_id
+
+    platform_id = '_:platform-{}'.format(survey.survey_id)
+    platform = {'@id': platform_id, 'subClassOf': 'sosa:Platform', 'label': str(survey.vessel)}
+    if survey.vessel_type is not None:
+        platform['@type'] = URI_PLATFORM + quote(survey.vessel_type)
+
+    nodes = [this_survey, platform]
+    for instrument in (survey.mag_instrument, survey.rad_instrument):
+        if instrument is not None:
+            nodes.append({
+                '@type': survey.URI_INSTRUMENT + quote(instrument),
+                'subClassOf': 'sosa:Sampler',
+                'madeSampling': uri,
+                'isHostedBy': platform_id,
+            })
+    if survey.mag_instrument is None and survey.rad_instrument is None:
+        nodes.append({'@type': 'sosa:Sampler', 'isHostedBy': platform_id})
+
+    nodes.append({
+        '@id': URI_FOI,
+        'label': 'Earth Subsurface',
+        'comment': 'Below the earth\'s terrestrial surface',
+        'hasSample': sample_id,
+    })
+    nodes.append({
+        '@id': sample_id,
+        '@type': 'sosa:Sample',
+        'hasGeometry': {'@type': 'geosp:Geometry', 'asWKT': survey.wkt_polygon},
+    })
+    return nodes
+
+
+def survey_document(survey, view, context=None):
+    """
+    Makes the JSON-LD of a survey's view
+
+    :param survey: a populated model.survey.SurveyRenderer
+    :param view: one of VIEWS
+    :param context: the @context, by default the URI of the published context
+    :return: a JSON-LD document dict
+    """
+    uri = _config.BASE_URI_SURVEY + survey.survey_id
+    if view == 'sosa':
+        nodes = _sosa_nodes(survey, uri)
+    else:
+        nodes = _gapd_prov_nodes(survey, view, uri)
+    return {'@context': context if context is not None else _config.JSONLD_CONTEXT_URI, '@graph': nodes}
+
+
+def survey_jsonld(survey, view):
+    """
+    :return: the JSON-LD of a survey's view, as a string
+    """
+    return _dumps(survey_document(survey, view))
+
+
+def entity_document(entity, view, context=None):
+    """
+    Makes the JSON-LD of an entity's view
+
+    :param entity: a model.entity.EntityRenderer with a record
+    :param view: one of ENTITY_VIEWS
+    :param context: the @context, by default the URI of the published context
+    :return: a JSON-LD document dict
+    """
+    from model.entity import URI_GA
+
+    if view == 'sosa':
+        this_entity = {'@id': entity.uri, '@type': 'sosa:Sample', 'isSampleOf': URI_FOI}
+        if entity.wkt_point is not None:
+            this_entity['hasGeometry'] = {'@type': 'geosp:Geometry', 'asWKT': entity.wkt_point}
+        nodes = [this_entity, {
+            '@id': URI_FOI,
+            'label': 'Earth Subsurface',
+            'comment': 'Below the earth\'s terrestrial surface',
+        }]
+    else:
+        nodes = [
+            {'@id': entity.uri, '@type': 'prov:Entity', 'label': entity.label, 'wasAttributedTo': URI_GA},
+            {'@id': URI_GA, '@type': 'prov:Org', 'label': 'Geoscience Australia'},
+        ]
+    return {'@context': context if context is not None else _config.JSONLD_CONTEXT_URI, '@graph': nodes}
+
+
+def entity_jsonld(entity, view):
+    """
+    :return: the JSON-LD of an entity's view, as a string
+    """
+    return _dumps(entity_document(entity, view))
+
+
+def _dumps(document):
+    return json.dumps(document, separators=(',', ':'), ensure_ascii=False)
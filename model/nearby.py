@@ -0,0 +1,162 @@
+"""
+Nearest-neighbour search of survey centroids, for "nearby surveys"
+
+The centroids of every survey's bounding box are held in a KD-tree, built with each catalogue Generation. Centroids are
+points on the unit sphere in 3D, so that the straight-line (chord) distances the tree prunes by order points just as
+great-circle distances do, with no special cases at the poles or the antimeridian. The tree is implicit: the points are
+kept in arrays, ordered so that each node is the median of its range of the arrays, which makes a query of k nearest
+surveys take logarithmic time, about a tenth of a millisecond, cheap enough to do for every survey page.
+"""
+import heapq
+import json
+import math
+from array import array
+from model import generations
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def unit_vector(lat, lon):
+    """
+    :return: the (x, y, z) point on the unit sphere at a latitude and longitude in decimal degrees
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def chord_to_km(chord_squared):
+    """
+    :return: the great-circle distance, in km, between two points on the unit sphere a squared chord distance apart
+    """
+    return 2 * math.asin(min(1.0, math.sqrt(chord_squared) / 2)) * EARTH_RADIUS_KM
+
+
+def parse_near(value):
+    """
+    :param value: a near query parameter, "lat,lon" in decimal degrees
+    :return: a (lat, lon) tuple of floats
+    :raises ValueError: if the value is not valid
+    """
+    try:
+        lat, lon = (float(v) for v in value.split(','))
+    except ValueError:
+        raise ValueError('near must be lat,lon in decimal degrees')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('near must be lat,lon with -90 <= lat <= 90 and -180 <= lon <= 180')
+    return lat, lon
+
+
+class NearbyIndex:
+    """
+    A KD-tree of the centroids of the surveys of a catalogue snapshot
+    """
+
+    def __init__(self, snapshot):
+        w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+        s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+        points = []
+        for i in range(len(snapshot)):
+            lat, lon = (s_lat[i] + n_lat[i]) / 2, (w_long[i] + e_long[i]) / 2
+            # NaN, no footprint, fails every comparison
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                points.append(unit_vector(lat, lon) + (i,))
+
+        # order the points so that each node of the tree is the median, on the axis of greatest spread, of its range
+        axes = array('b', bytes(len(points)))
+        stack = [(0, len(points))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= 1:
+                continue
+            spreads = [max(p[a] for p in points[lo:hi]) - min(p[a] for p in points[lo:hi]) for a in range(3)]
+            axis = spreads.index(max(spreads))
+            points[lo:hi] = sorted(points[lo:hi], key=lambda p: p[axis])
+            mid = (lo + hi) // 2
+            axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+        self.axes = axes
+        self.coordinates = tuple(array('d', (p[a] for p in points)) for a in range(3))
+        self.rows = array('i', (p[3] for p in points))
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.rows)
+
+    def nearest(self, lat, lon, k, exclude_row=None):
+        """
+        Finds the surveys with centroids nearest a point
+
+        :param lat: the point's latitude
+        :param lon: the point's longitude
+        :param k: the number of surveys to find
+        :param exclude_row: the record index of a survey not to give, e.g. the one whose neighbours are wanted
+        :return: a list of (distance in km, record index) tuples, nearest first
+        """
+        query = unit_vector(lat, lon)
+        qx, qy, qz = query
+        xs, ys, zs = self.coordinates
+        axes, rows, coordinates = self.axes, self.rows, self.coordinates
+        best = []  # a max-heap, by negated squared distance, of the k nearest found so far
+
+        def search(lo, hi):
+            mid = (lo + hi) // 2
+            d = (xs[mid] - qx) ** 2 + (ys[mid] - qy) ** 2 + (zs[mid] - qz) ** 2
+            if rows[mid] != exclude_row:
+                if len(best) < k:
+                    heapq.heappush(best, (-d, rows[mid]))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, rows[mid]))
+            if hi - lo == 1:
+                return
+            axis = axes[mid]
+            diff = query[axis] - coordinates[axis][mid]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            if near[0] < near[1]:
+                search(*near)
+            # the far side can only hold nearer points if the splitting plane is nearer than the kth nearest so far
+            if far[0] < far[1] and (len(best) < k or diff * diff < -best[0][0]):
+                search(*far)
+
+        if len(rows) > 0 and k > 0:
+            search(0, len(rows))
+        return sorted((chord_to_km(-d), row) for d, row in best)
+
+
+@generations.register_index('nearby')
+def build_nearby_index(snapshot, previous):
+    return NearbyIndex(snapshot)
+
+
+def render(generation, lat, lon, k, mimetype, survey_id=None):
+    """
+    Renders the k surveys nearest a point, or a survey, as an HTML page or a GeoJSON FeatureCollection whose Features
+    have their distance_km
+
+    :param generation: the catalogue Generation
+    :param survey_id: the survey whose neighbours these are, which isn't one of them, or None for a point
+    :return: a Flask Response
+    """
+    from flask import Response, render_template
+    from model import geojson
+
+    snapshot = generation.snapshot
+    exclude_row = snapshot.index_of(survey_id) if survey_id is not None else None
+    neighbours = generation.index('nearby').nearest(lat, lon, k, exclude_row)
+
+    if mimetype == geojson.MIMETYPE:
+        features = list(geojson.features(snapshot, [row for _, row in neighbours]))
+        for feature, (km, _) in zip(features, neighbours):
+            feature['properties']['distance_km'] = round(km, 3)
+        return Response(json.dumps({'type': 'FeatureCollection', 'features': features}), mimetype=mimetype)
+    return Response(
+        render_template(
+            'surveys_nearby.html',
+            survey_id=survey_id,
+            lat=lat,
+            lon=lon,
+            neighbours=[(km, snapshot.record(row)) for km, row in neighbours]
+        ),
+        mimetype='text/html'
+    )
@@ -0,0 +1,382 @@
+"""
+Pre-rendering: writes every survey's HTML and RDF representations, and the Survey Register's pages, to files that a web
+server, e.g. nginx, can serve without calling this app
+
+    python -m model.prerender --base-url http://pid.geoscience.gov.au/
+
+Files are named by view and by extension, as per LDAPI.get_file_extension(), under the output directory:
+
+    survey/{survey ID}/{view}{extension}    e.g. survey/921/gapd.html, survey/921/sosa.ttl
+    register/{view}-{page}{extension}       the register's pages of 100 surveys, e.g. register/reg-1.html
+    manifest.json                           the digest of each survey's catalogue record, and of its nearby surveys',
+                                            when it was rendered
+    nginx-maps.conf, nginx-locations.conf   a rewrite map from requests, by _view and _format or else the Accept header,
+                                            to these files, falling back to the app for anything else
+
+Each file is what this app serves for that survey, view and format, got with the Flask test client, plus a gzipped copy
+for nginx's gzip_static. Surveys are rendered in parallel by a pool of processes. Rebuilds only render the surveys whose
+catalogue records, or whose nearby surveys, listed on their HTML pages, have changed since they were last rendered,
+delete those no longer in the catalogue and render the register again only if surveys have been added or removed. Use
+--full after changing templates or code.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join
+from urllib.parse import quote
+from _ldapi.ldapi import LDAPI
+from model import catalogue, nearby
+import _config
+
+SURVEY_CLASS = 'http://pid.geoscience.gov.au/def/ont/gapd#Survey'
+REGISTER_CLASS = 'http://purl.org/linked-data/registry#Register'
+# views that aren't representations of their own, or depend on other surveys, so are always left to the app
+NOT_PRERENDERED = ('default', 'renderer', 'alternates', 'argus', 'nearby')
+# the register's default, and most, surveys per page, the only page size pre-rendered
+REGISTER_PAGE_SIZE = 100
+# formats that are the whole, filtered, catalogue rather than a page of it, so are always streamed by the app
+NOT_PRERENDERED_MIMETYPES = ('application/geo+json', 'text/csv', 'application/vnd.apache.parquet')
+
+# this process's test client of the app, for rendering, and the base URL its requests are for
+_client = None
+_base_url = None
+
+
+def representations(class_uri):
+    """
+    :return: the (view, mimetype) representations of a class that are pre-rendered, in classes_views_mimetypes.json
+        order
+    """
+    from controller import model_classes_functions
+
+    views_mimetypes = model_classes_functions.get_classes_views_mimetypes()[class_uri]
+    return [(view, mimetype) for view, mimetypes in views_mimetypes.items() if view not in NOT_PRERENDERED
+            for mimetype in mimetypes if mimetype not in NOT_PRERENDERED_MIMETYPES]
+
+
+def _write(path, data):
+    """Writes a file, and a gzipped copy of it, atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for p, d in ((path, data), (path + '.gz', gzip.compress(data, 9, mtime=0))):
+        tmp = '{}.{}.tmp'.format(p, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(d)
+        os.replace(tmp, p)
+
+
+def _init_worker(base_url):
+    global _client, _base_url
+    from app import app
+    from model import generations
+
+    # render from the snapshot as it is, never harvesting a new one part way through
+    generations.holder.harvest_seconds = None
+    _client = app.test_client()
+    _base_url = base_url
+
+
+def _render_surveys(task):
+    """
+    Renders every representation of some surveys
+
+    :return: a list of (survey ID, whether every representation rendered)
+    """
+    output, survey_ids = task
+    results = []
+    for survey_id in survey_ids:
+        ok = True
+        for view, mimetype in representations(SURVEY_CLASS):
+            r = _client.get('/survey/{}'.format(survey_id), base_url=_base_url,
+                            query_string={'_view': view, '_format': mimetype})
+            if r.status_code == 200:
+                _write(join(output, 'survey', str(survey_id), view + LDAPI.get_file_extension(mimetype)), r.get_data())
+            else:
+                logging.warning('Survey {} {} {} gave HTTP {}'.format(survey_id, view, mimetype, r.status_code))
+                ok = False
+        results.append((survey_id, ok))
+    return results
+
+
+def _render_register(output):
+    """
+    Renders every representation of every page, of REGISTER_PAGE_SIZE surveys, of the Survey Register, as many as the
+    catalogue fills, and deletes those of any pages after them
+
+    :return: a dict of page number to the page's Link header
+    """
+    from model import generations
+
+    gen = generations.current_generation()
+    if gen is None:
+        logging.warning('There is no catalogue snapshot, so the register has not been rendered')
+        return {}
+    pages = max(math.ceil(len(gen.snapshot) / REGISTER_PAGE_SIZE), 1)
+
+    links = {}
+    for page in range(1, pages + 1):
+        for view, mimetype in representations(REGISTER_CLASS):
+            r = _client.get('/survey/', base_url=_base_url,
+                            query_string={'_view': view, '_format': mimetype, 'page': page})
+            if r.status_code != 200:
+                logging.warning('Page {} of the register, {} as {}, gave {}'.format(page, view, mimetype, r.status))
+                continue
+            _write(join(output, 'register', '{}-{}{}'.format(view, page, LDAPI.get_file_extension(mimetype))),
+                   r.get_data())
+            links[page] = r.headers.get('Link')
+
+    # pages from when the catalogue was bigger
+    for name in os.listdir(join(output, 'register')) if os.path.isdir(join(output, 'register')) else []:
+        number = name.split('-')[-1].split('.')[0]
+        if number.isdigit() and int(number) > pages:
+            os.remove(join(output, 'register', name))
+    return links
+
+
+def nginx_maps(output):
+    """
+    Makes the nginx http-level map directives that choose a pre-rendered file for a request, and the Link headers of
+    register pages, as per nginx_locations()
+    """
+    from controller import model_classes_functions
+
+    classes = model_classes_functions.get_classes_views_mimetypes()
+    mimetypes = sorted(set(mimetype for c in (SURVEY_CLASS, REGISTER_CLASS) for _, mimetype in representations(c)))
+
+    lines = [
+        '# Made by python -m model.prerender. Include in nginx\'s http block, with nginx-locations.conf in the server',
+        '# block.',
+        '',
+        '# the file extension for the _format parameter, "none" (no such file) for formats that aren\'t pre-rendered',
+        'map $arg__format $prerender_format_ext {',
+        '    default none;',
+        '    "" "";',
+    ]
+    for mimetype in mimetypes:
+        # as it may be sent: raw, with its + as a space, or percent-encoded
+        spellings = {mimetype, mimetype.replace('+', '%20'), quote(mimetype, safe='/'), quote(mimetype, safe='')}
+        for value in sorted(spellings):
+            lines.append('    "{}" {};'.format(value, LDAPI.get_file_extension(mimetype)))
+    lines += [
+        '}',
+        '',
+        '# with no _format, the Accept header\'s first media range chooses the file, else HTML. The app negotiates any',
+        '# request that this doesn\'t match to a file.',
+        'map $http_accept $prerender_accept_ext {',
+        '    default .html;',
+    ]
+    for mimetype in mimetypes:
+        lines.append('    "~*^{}" {};'.format(mimetype.replace('+', '\\+'), LDAPI.get_file_extension(mimetype)))
+    for mimetype in NOT_PRERENDERED_MIMETYPES:
+        lines.append('    "~*^{}" none;'.format(mimetype.replace('+', '\\+')))
+    lines += [
+        '}',
+        '',
+        'map $prerender_format_ext $prerender_ext {',
+        '    "" $prerender_accept_ext;',
+        '    default $prerender_format_ext;',
+        '}',
+        '',
+    ]
+    for name, class_uri in (('survey', SURVEY_CLASS), ('register', REGISTER_CLASS)):
+        lines += [
+            'map $arg__view $prerender_{}_view {{'.format(name),
+            '    default none;',
+            '    "" {};'.format(classes[class_uri]['default']),
+        ]
+        for view in sorted(set(view for view, _ in representations(class_uri))):
+            lines.append('    "{0}" {0};'.format(view))
+        lines += ['}', '']
+    lines += [
+        '# register pages are only pre-rendered with the default of 100 surveys per page',
+        'map $arg_per_page $prerender_register {',
+        '    default none;',
+        '    "" register;',
+        '    "100" register;',
+        '}',
+        '',
+        'map $arg_page $prerender_page {',
+        '    default none;',
+        '    "" 1;',
+        '    "~^(?<page>[1-9][0-9]*)$" $page;',
+        '}',
+        '',
+    ]
+    links = _read_json(join(output, 'manifest.json')).get('register_links', {})
+    lines += [
+        'map $prerender_page $prerender_register_link {',
+        '    default "";',
+    ]
+    for page, link in sorted(links.items(), key=lambda item: int(item[0])):
+        if link:
+            lines.append('    "{}" \'{}\';'.format(page, link))
+    lines += ['}', '']
+    return '\n'.join(lines)
+
+
+def nginx_locations(output):
+    """
+    Makes the nginx server-level locations that serve pre-rendered files, falling back to a location named @app, which
+    proxies to this app, for everything else
+    """
+    types = ''.join('        {} {};\n'.format(mimetype, LDAPI.get_file_extension(mimetype).lstrip('.'))
+                    for mimetype in sorted(set(
+                        m for c in (SURVEY_CLASS, REGISTER_CLASS) for _, m in representations(c))))
+    return '''# Made by python -m model.prerender. Include in nginx's server block, which must have a location @app
+# proxying to the app, with nginx-maps.conf in the http block.
+
+location ~ ^/survey/(?<prerender_id>[0-9]+)$ {{
+    root {root};
+    types {{
+{types}    }}
+    gzip_static on;
+    add_header Vary "Accept, Accept-Encoding";
+    try_files /survey/$prerender_id/$prerender_survey_view$prerender_ext @app;
+}}
+
+location = /survey/ {{
+    root {root};
+    types {{
+{types}    }}
+    gzip_static on;
+    add_header Vary "Accept, Accept-Encoding";
+    add_header Link $prerender_register_link;
+    try_files /$prerender_register/$prerender_register_view-$prerender_page$prerender_ext @app;
+}}
+'''.format(root=os.path.abspath(output), types=types)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write_json(path, o):
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(o, f)
+    os.replace(tmp, path)
+
+
+def page_digests(snapshot):
+    """
+    :param snapshot: a model.catalogue.CatalogueSnapshot
+    :return: a dict of survey ID to a digest of everything its pages show: its catalogue record and, as its HTML page
+        lists its _config.NEARBY_K nearest surveys, theirs, which changes when any of them changes or another survey
+        becomes one of them
+    """
+    index = nearby.NearbyIndex(snapshot)
+    w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+    s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+    records = [record.digest() for record in snapshot]
+    digests = {}
+    for i, record in enumerate(snapshot):
+        lat, lon = (s_lat[i] + n_lat[i]) / 2, (w_long[i] + e_long[i]) / 2
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            neighbours = [row for _, row in index.nearest(lat, lon, _config.NEARBY_K, i)]
+        else:
+            neighbours = []
+        page = hashlib.sha1(records[i].encode('ascii'))
+        for row in neighbours:
+            page.update(' {}:{}'.format(snapshot.record(row).survey_id, records[row]).encode('ascii'))
+        digests[str(record.survey_id)] = page.hexdigest()
+    return digests
+
+
+def prerender(output=_config.PRERENDER_DIR, base_url='http://localhost/', full=False,
+              workers=_config.PRERENDER_WORKERS, chunk_size=100):
+    """
+    Renders all the surveys whose catalogue records, or nearby surveys, have changed since they were last rendered,
+    deletes those no longer in the catalogue and renders the register if any were added or removed
+
+    :param output: the directory to write to
+    :param base_url: the scheme and host, e.g. http://pid.geoscience.gov.au/, the app sees requests for, for the URIs in
+        the register's pages
+    :param full: render everything, e.g. after template changes
+    :param workers: the number of rendering processes, 0 to render in this process
+    :param chunk_size: the number of surveys given to a process at a time
+    :return: a dict of counts of the surveys rendered, failed, removed and unchanged and the register pages rendered
+    """
+    os.makedirs(output, exist_ok=True)
+    manifest = {} if full else _read_json(join(output, 'manifest.json'))
+    previous = manifest.get('surveys', {})
+
+    snapshot = catalogue.CatalogueSnapshot(_config.CATALOGUE_SNAPSHOT)
+    digests = page_digests(snapshot)
+    changed = [survey_id for survey_id, digest in digests.items() if previous.get(survey_id) != digest]
+    removed = [survey_id for survey_id in previous if survey_id not in digests]
+    for survey_id in removed:
+        shutil.rmtree(join(output, 'survey', survey_id), ignore_errors=True)
+    render_register = full or len(removed) > 0 or any(survey_id not in previous for survey_id in changed)
+
+    surveys = {survey_id: digest for survey_id, digest in previous.items() if survey_id in digests}
+    failed = 0
+    tasks = [(output, changed[i:i + chunk_size]) for i in range(0, len(changed), chunk_size)]
+    if workers == 0:
+        _init_worker(base_url)
+        results = map(_render_surveys, tasks)
+        links = _render_register(output) if render_register else None
+    else:
+        # spawned processes, each making its own app
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(base_url,))
+        register_future = pool.submit(_render_register, output) if render_register else None
+        results = pool.map(_render_surveys, tasks)
+    try:
+        for chunk in results:
+            for survey_id, ok in chunk:
+                if ok:
+                    surveys[str(survey_id)] = digests[str(survey_id)]
+                else:
+                    surveys.pop(str(survey_id), None)
+                    failed += 1
+        if workers != 0:
+            links = register_future.result() if register_future is not None else None
+    finally:
+        if workers != 0:
+            pool.shutdown()
+
+    manifest = {
+        'surveys': surveys,
+        'register_links': links if links is not None else manifest.get('register_links', {}),
+        'rendered': time.time(),
+    }
+    _write_json(join(output, 'manifest.json'), manifest)
+    with open(join(output, 'nginx-maps.conf'), 'w') as f:
+        f.write(nginx_maps(output))
+    with open(join(output, 'nginx-locations.conf'), 'w') as f:
+        f.write(nginx_locations(output))
+
+    return {
+        'rendered': len(changed) - failed,
+        'failed': failed,
+        'removed': len(removed),
+        'unchanged': len(digests) - len(changed),
+        'register_pages': len(links) if links is not None else 0,
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description='Pre-renders every survey and register page to files')
+    parser.add_argument('--output', default=_config.PRERENDER_DIR, help='the directory to write to')
+    parser.add_argument('--base-url', default='http://localhost/',
+                        help='the scheme and host the app sees requests for, e.g. http://pid.geoscience.gov.au/')
+    parser.add_argument('--full', action='store_true', help='render every survey, not just the changed ones')
+    parser.add_argument('--workers', type=int, default=_config.PRERENDER_WORKERS, help='0 to not use other processes')
+    args = parser.parse_args()
+
+    start = time.time()
+    counts = prerender(args.output, args.base_url, args.full, args.workers)
+    print('Rendered {rendered} surveys ({failed} failed), removed {removed}, left {unchanged} unchanged and rendered '
+          '{register_pages} register pages'.format(**counts) + ' in {:.1f}s'.format(time.time() - start))
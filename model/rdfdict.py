@@ -0,0 +1,396 @@
+"""
+The whole survey catalogue's RDF as one compact, dictionary-encoded, binary file, for bulk consumers to download and
+query by triple pattern where they are, without parsing or decompressing all of it
+
+    python -m model.rdfdict write                                   # after each harvest, as for model.export
+    python -m model.rdfdict query surveys.rdfd --p '<http://www.w3.org/ns/prov#agent>'
+
+The file holds the distinct triples of the EXPORT_VIEWS of every survey, as made for the N-Triples export, in the way
+HDT (http://www.rdfhdt.org/) does: a dictionary of every distinct term, each written once, and the triples as triples of
+the terms' IDs. It is read with nothing but the Python standard library.
+
+Layout, all integers little endian:
+
+    header          128 bytes: magic, version, block sizes, term count, triple count and section offsets
+    dictionary      every distinct term, in N-Triples syntax, sorted by its UTF-8 bytes, so that a term's ID is its
+                    place in that order. Terms are in blocks of TERM_BLOCK_SIZE, each front coded, i.e. each term as
+                    the length of the prefix it shares with the one before and the rest of it, and zlib compressed.
+                    Sorted IRIs share their namespaces and the repeated agent names, roles, datatypes and so on are
+                    only ever in the dictionary once, however many triples use them.
+    term index      each block's offset and its first term, so a term is found by binary search of the index and the
+                    decompression of one block
+    triples         the triples' IDs in three orders, SPO, POS and OSP, so that every triple pattern is a range of one
+                    of them. Each order is in blocks of TRIPLE_BLOCK_SIZE triples, each with its first column delta
+                    coded and zlib compressed, and an index of each block's offset and first triple.
+
+Blank nodes are relabelled _:b1, _:b2... in the order they are first met, as rdflib's labels are random and don't
+compress.
+"""
+import argparse
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from functools import lru_cache
+from itertools import accumulate
+from os.path import dirname, abspath
+import _config
+
+MIMETYPE = 'application/x-rdf-dictionary'
+
+MAGIC = b'RDFDICT\0'
+VERSION = 1
+# magic, version, term block size, triple block size, terms, triples, then the offsets of the term index, the term
+# blocks and of each order's block index and blocks
+HEADER = struct.Struct('<8sIIIQQ' + 'Q' * 8)
+HEADER_SIZE = 128
+
+TERM_BLOCK_SIZE = 64
+TRIPLE_BLOCK_SIZE = 2048
+# the orders the triples are held in: the positions of the subject, predicate and object in each
+ORDERS = ('spo', 'pos', 'osp')
+
+
+class RDFDictError(ValueError):
+    pass
+
+
+def _le(a):
+    """
+    :return: an array's bytes, little endian
+    """
+    if sys.byteorder != 'little':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_le(typecode, data):
+    a = array(typecode)
+    a.frombytes(data)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a
+
+
+def _term_block(terms):
+    """
+    :param terms: a sorted list of UTF-8 encoded terms
+    :return: the front coded, compressed block of them
+    """
+    shared = array('H')
+    ends = array('I')
+    rest = bytearray()
+    previous = b''
+    for term in terms:
+        n = 0
+        limit = min(len(term), len(previous), 65535)
+        while n < limit and term[n] == previous[n]:
+            n += 1
+        shared.append(n)
+        rest += term[n:]
+        ends.append(len(rest))
+        previous = term
+    return zlib.compress(struct.pack('<I', len(terms)) + _le(shared) + _le(ends) + bytes(rest), 9)
+
+
+def _triple_block(rows):
+    """
+    :param rows: a sorted list of (a, b, c) ID triples
+    :return: the compressed block of them, the first column delta coded
+    """
+    a, b, c = (array('I', column) for column in zip(*rows))
+    deltas = array('I', [a[0]] + [a[i] - a[i - 1] for i in range(1, len(a))])
+    return zlib.compress(_le(deltas) + _le(b) + _le(c), 6)
+
+
+def ntriples_terms(lines, bnodes):
+    """
+    Splits N-Triples lines, as rdflib writes them, into their terms
+
+    :param lines: an iterable of N-Triples lines, without their line ends
+    :param bnodes: a dict of rdflib's blank node labels to the new ones, added to
+    :return: a generator of (subject, predicate, object) strings
+    """
+    for line in lines:
+        if not line:
+            continue
+        s, p, o = line.split(' ', 2)
+        o = o[:-2]  # ' .'
+        if s.startswith('_:'):
+            s = bnodes.setdefault(s, '_:b{}'.format(len(bnodes) + 1))
+        if o.startswith('_:'):
+            o = bnodes.setdefault(o, '_:b{}'.format(len(bnodes) + 1))
+        yield s, p, o
+
+
+def write_rdfdict(path, snapshot_path=_config.CATALOGUE_SNAPSHOT, views=_config.EXPORT_VIEWS,
+                  workers=_config.EXPORT_WORKERS):
+    """
+    Writes the dictionary-encoded RDF file of every survey in a catalogue snapshot, atomically replacing any existing one
+
+    :param workers: the processes making the surveys' RDF, as per model.export.export_chunks()
+    :return: the (number of terms, number of distinct triples) written
+    """
+    from model import export
+
+    ids = {}
+    triples = set()
+    bnodes = {}
+    for chunk, _ in export.export_chunks(snapshot_path, views, workers=workers):
+        for s, p, o in ntriples_terms(chunk.decode('utf-8').split('\n'), bnodes):
+            triples.add((ids.setdefault(s, len(ids)), ids.setdefault(p, len(ids)), ids.setdefault(o, len(ids))))
+
+    # term IDs are their places in the sorted dictionary
+    terms = sorted(term.encode('utf-8') for term in ids)
+    final = {term.decode('utf-8'): i for i, term in enumerate(terms)}
+    remap = array('I', bytes(4 * len(ids)))
+    for term, i in ids.items():
+        remap[i] = final[term]
+    del ids, final
+    spo = sorted((remap[s], remap[p], remap[o]) for s, p, o in triples)
+    del triples
+
+    os.makedirs(dirname(abspath(path)), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(b'\0' * HEADER_SIZE)
+
+            # the dictionary
+            term_blocks_offset = f.tell()
+            block_offsets = array('Q', [0])
+            first_ends = array('I')
+            firsts = bytearray()
+            for start in range(0, len(terms), TERM_BLOCK_SIZE):
+                f.write(_term_block(terms[start:start + TERM_BLOCK_SIZE]))
+                block_offsets.append(f.tell() - term_blocks_offset)
+                firsts += terms[start]
+                first_ends.append(len(firsts))
+            term_index_offset = f.tell()
+            f.write(struct.pack('<I', len(first_ends)) + _le(block_offsets) + _le(first_ends) + bytes(firsts))
+
+            # the triples, in each order
+            order_offsets = []
+            for order in ORDERS:
+                if order == 'spo':
+                    rows = spo
+                else:
+                    positions = ['spo'.index(c) for c in order]
+                    rows = sorted(tuple(t[i] for i in positions) for t in spo)
+                blocks_offset = f.tell()
+                block_offsets = array('Q', [0])
+                block_firsts = array('I')
+                for start in range(0, len(rows), TRIPLE_BLOCK_SIZE):
+                    f.write(_triple_block(rows[start:start + TRIPLE_BLOCK_SIZE]))
+                    block_offsets.append(f.tell() - blocks_offset)
+                    block_firsts.extend(rows[start])
+                index_offset = f.tell()
+                f.write(struct.pack('<I', len(block_firsts) // 3) + _le(block_offsets) + _le(block_firsts))
+                order_offsets.extend((index_offset, blocks_offset))
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, TERM_BLOCK_SIZE, TRIPLE_BLOCK_SIZE, len(terms), len(spo),
+                                term_index_offset, term_blocks_offset, *order_offsets))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return len(terms), len(spo)
+
+
+def get_rdfdict_file(path=_config.RDFDICT_FILE):
+    """
+    :return: the path of the dictionary-encoded RDF file, if one has been written, else None. It's written after each
+        harvest (see model.catalogue.write_derived_files()), never by a request.
+    """
+    return path if os.path.exists(path) else None
+
+
+class RDFDict:
+    """
+    A read-only, memory-mapped, dictionary-encoded RDF file. Only the blocks a lookup or pattern needs are decompressed,
+    and the last few hundred of them are kept.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.term_block_size, self.triple_block_size, self.term_count, self.triple_count, \
+            term_index_offset, self._term_blocks_offset, *order_offsets = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise RDFDictError('{} is not a version {} dictionary-encoded RDF file'.format(path, VERSION))
+
+        n, self._term_block_offsets, self._first_term_ends, offset = self._read_index(term_index_offset, 'I')
+        self._first_terms_offset = offset
+        self._orders = {}
+        for order, index_offset, blocks_offset in zip(ORDERS, order_offsets[0::2], order_offsets[1::2]):
+            n, block_offsets, firsts, _ = self._read_index(index_offset, 'I', 3)
+            self._orders[order] = (blocks_offset, block_offsets, [tuple(firsts[i:i + 3]) for i in range(0, 3 * n, 3)])
+        # each instance has its own caches of decompressed blocks
+        self._term_block = lru_cache(maxsize=256)(self._read_term_block)
+        self._triple_block = lru_cache(maxsize=64)(self._read_triple_block)
+
+    def _read_index(self, offset, typecode, width=1):
+        n = struct.unpack_from('<I', self._mm, offset)[0]
+        offset += 4
+        block_offsets = _from_le('Q', self._mm[offset:offset + 8 * (n + 1)])
+        offset += 8 * (n + 1)
+        items = _from_le(typecode, self._mm[offset:offset + 4 * n * width])
+        return n, block_offsets, items, offset + 4 * n * width
+
+    def _first_term(self, block):
+        start = self._first_term_ends[block - 1] if block > 0 else 0
+        return self._mm[self._first_terms_offset + start:self._first_terms_offset + self._first_term_ends[block]]
+
+    def _read_term_block(self, block):
+        start = self._term_blocks_offset + self._term_block_offsets[block]
+        data = zlib.decompress(self._mm[start:self._term_blocks_offset + self._term_block_offsets[block + 1]])
+        n = struct.unpack_from('<I', data)[0]
+        shared = _from_le('H', data[4:4 + 2 * n])
+        ends = _from_le('I', data[4 + 2 * n:4 + 6 * n])
+        rest = data[4 + 6 * n:]
+        terms = []
+        previous = b''
+        start = 0
+        for length, end in zip(shared, ends):
+            previous = previous[:length] + rest[start:end]
+            terms.append(previous)
+            start = end
+        return terms
+
+    def term(self, term_id):
+        """
+        :return: the term, in N-Triples syntax, of an ID
+        """
+        block, i = divmod(term_id, self.term_block_size)
+        return self._term_block(block)[i].decode('utf-8')
+
+    def term_id(self, term):
+        """
+        :param term: a term in N-Triples syntax, e.g. <http://pid.geoscience.gov.au/survey/ga/921>
+        :return: its ID, or None if it's not in this file
+        """
+        key = term.encode('utf-8')
+        lo, hi = 0, len(self._first_term_ends)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._first_term(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        terms = self._term_block(lo - 1)
+        for i, t in enumerate(terms):
+            if t == key:
+                return (lo - 1) * self.term_block_size + i
+        return None
+
+    def _read_triple_block(self, order, block):
+        blocks_offset, block_offsets, _ = self._orders[order]
+        data = zlib.decompress(self._mm[blocks_offset + block_offsets[block]:blocks_offset + block_offsets[block + 1]])
+        n = len(data) // 12
+        a = list(accumulate(_from_le('I', data[:4 * n])))
+        b = _from_le('I', data[4 * n:8 * n])
+        c = _from_le('I', data[8 * n:])
+        return list(zip(a, b, c))
+
+    def _range(self, order, prefix):
+        """
+        :return: a generator of the ID triples, in an order, that start with a prefix of IDs
+        """
+        _, _, firsts = self._orders[order]
+        n = len(prefix)
+        lo, hi = 0, len(firsts)
+        # the last block starting before the prefix may hold its first triples
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if firsts[mid][:n] < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        block = max(lo - 1, 0)
+        while block < len(firsts) and firsts[block][:n] <= prefix:
+            for row in self._triple_block(order, block):
+                key = row[:n]
+                if key == prefix:
+                    yield row
+                elif key > prefix:
+                    return
+            block += 1
+
+    def triple_ids(self, s=None, p=None, o=None):
+        """
+        :return: a generator of the (s, p, o) ID triples matching a pattern of IDs, None for any
+        """
+        if s is not None and p is None and o is not None:
+            order, prefix = 'osp', (o, s)
+        elif s is not None:
+            order, prefix = 'spo', (s,) if p is None else (s, p) if o is None else (s, p, o)
+        elif p is not None:
+            order, prefix = 'pos', (p,) if o is None else (p, o)
+        elif o is not None:
+            order, prefix = 'osp', (o,)
+        else:
+            order, prefix = 'spo', ()
+        positions = [order.index(c) for c in 'spo']
+        for row in self._range(order, prefix):
+            yield tuple(row[i] for i in positions)
+
+    def triples(self, s=None, p=None, o=None):
+        """
+        :param s: a subject in N-Triples syntax, or None for any
+        :param p: a predicate, likewise
+        :param o: an object, likewise
+        :return: a generator of the matching (s, p, o) triples of terms in N-Triples syntax
+        """
+        pattern = []
+        for term in (s, p, o):
+            if term is None:
+                pattern.append(None)
+            else:
+                term_id = self.term_id(term)
+                if term_id is None:
+                    return
+                pattern.append(term_id)
+        for triple in self.triple_ids(*pattern):
+            yield tuple(self.term(i) for i in triple)
+
+    def count(self, s=None, p=None, o=None):
+        """
+        :return: the number of triples matching a pattern, as per triples()
+        """
+        return sum(1 for _ in self.triples(s, p, o))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description='Writes, or queries, the dictionary-encoded RDF of the catalogue')
+    commands = parser.add_subparsers(dest='command', required=True)
+    write = commands.add_parser('write', help='write the file of the catalogue snapshot')
+    write.add_argument('--output', default=_config.RDFDICT_FILE, help='the file to write')
+    write.add_argument('--snapshot', default=_config.CATALOGUE_SNAPSHOT, help='the catalogue snapshot file')
+    write.add_argument('--workers', type=int, default=_config.EXPORT_WORKERS, help='0 to not use other processes')
+    query = commands.add_parser('query', help='print the triples of a file matching a pattern, as N-Triples')
+    query.add_argument('file', help='a dictionary-encoded RDF file')
+    query.add_argument('--s', help='the subject, in N-Triples syntax, e.g. \'<http://...>\'')
+    query.add_argument('--p', help='the predicate')
+    query.add_argument('--o', help='the object')
+    args = parser.parse_args()
+
+    if args.command == 'write':
+        start = time.time()
+        terms, triples = write_rdfdict(args.output, args.snapshot, workers=args.workers)
+        print('Wrote {:,} terms and {:,} triples to {} ({:,} bytes) in {:.1f}s'.format(
+            terms, triples, args.output, os.path.getsize(args.output), time.time() - start))
+    else:
+        for triple in RDFDict(args.file).triples(args.s, args.p, args.o):
+            print('{} {} {} .'.format(*triple))
@@ -3,17 +3,25 @@ from flask import Response, render_template
 from rdflib import Graph, URIRef, RDF, RDFS, XSD, Namespace, Literal
 from _ldapi.ldapi import LDAPI
 from lxml import etree
-import requests
 from io import BytesIO
-import _config
+from model import upstream
 
 
 class RegisterRenderer(Renderer):
-    def __init__(self, request, uri, endpoints, page, per_page, last_page_no):
+    def __init__(self, request, uri, endpoints, page, per_page, last_page_no, record_type=None):
+        """
+        :param last_page_no: the last page number, None if it isn't known
+        :param record_type: the model.upstream.RecordType registered, by default model.survey.SURVEY
+        """
         Renderer.__init__(self, uri)
 
+        if record_type is None:
+            from model.survey import SURVEY
+            record_type = SURVEY
+
         self.request = request
         self.uri = uri
+        self.record_type = record_type
         self.register = []
         self.g = None
         self.per_page = per_page
@@ -25,7 +33,7 @@ class RegisterRenderer(Renderer):
     def render(self, view, mimetype, extra_headers=None):
         if view == 'reg':
             # is an RDF format requested?
-            if mimetype in LDAPI.get_rdf_mimetypes_list():
+            if LDAPI.is_rdf_mimetype(mimetype):
                 # it is an RDF format so make the graph for serialization
                 self._make_reg_graph(view)
                 rdflib_format = LDAPI.get_rdf_parser_for_mimetype(mimetype)
@@ -41,6 +49,8 @@ class RegisterRenderer(Renderer):
                         'class_register.html',
                         class_name=self.uri,
                         register=self.register,
+                        label=self.record_type.label,
+                        base_uri=self.record_type.base_uri,
                         system_url='http://54.66.133.7'
                     ),
                     mimetype='text/html',
@@ -57,7 +67,7 @@ class RegisterRenderer(Renderer):
         :return: None
         """
         for event, elem in etree.iterparse(xml):
-            if elem.tag == "SURVEYID":
+            if elem.tag == self.record_type.id_tag:
                 self.register.append(elem.text)
 
     def validate_xml(self, xml):
@@ -72,14 +82,12 @@ class RegisterRenderer(Renderer):
 
     def _get_details_from_oracle_api(self, page, per_page):
         """
-        Populates this instance with data from the Oracle Samples table API
+        Populates this instance with a page of the register from its Oracle XML API, over a pooled connection
 
         :param page: the page number of the total resultset from the Samples Set API
         :return: None
         """
-        #os.environ['NO_PROXY'] = 'ga.gov.au'
-        r = requests.get(_config.XML_API_URL_SURVEY_REGISTER.format(page, per_page), timeout=3)
-        xml = r.content
+        xml = upstream.get(self.record_type.register_url.format(page, per_page)).content
 
         if self.validate_xml(xml):
             self._get_details_from_file(BytesIO(xml))
@@ -103,7 +111,7 @@ class RegisterRenderer(Renderer):
 
             register_uri = URIRef(self.request.base_url)
             self.g.add((register_uri, RDF.type, REG.Register))
-            self.g.add((register_uri, RDFS.label, Literal('Samples Register', datatype=XSD.string)))
+            self.g.add((register_uri, RDFS.label, Literal(self.record_type.label + 's Register', datatype=XSD.string)))
 
             page_uri_str = self.request.base_url
             if self.per_page is not None:
@@ -124,7 +132,8 @@ class RegisterRenderer(Renderer):
 
             # links to other pages
             self.g.add((page_uri, XHV.first, URIRef(page_uri_str_no_page_no + '1')))
-            self.g.add((page_uri, XHV.last, URIRef(page_uri_str_no_page_no + str(self.last_page_no))))
+            if self.last_page_no is not None:
+                self.g.add((page_uri, XHV.last, URIRef(page_uri_str_no_page_no + str(self.last_page_no))))
 
             if self.page != 1:
                 self.g.add((page_uri, XHV.prev, URIRef(page_uri_str_no_page_no + str(self.page - 1))))
@@ -136,5 +145,5 @@ class RegisterRenderer(Renderer):
             for item in self.register:
                 item_uri = URIRef(self.request.base_url + item)
                 self.g.add((item_uri, RDF.type, URIRef(self.uri)))
-                self.g.add((item_uri, RDFS.label, Literal('Sample igsn:' + item, datatype=XSD.string)))
+                self.g.add((item_uri, RDFS.label, Literal(self.record_type.label + ' ' + item, datatype=XSD.string)))
                 self.g.add((item_uri, REG.register, page_uri))
@@ -0,0 +1,309 @@
+"""
+Sitemaps (https://www.sitemaps.org/protocol.html) of every survey URI and a VoID (https://www.w3.org/TR/void/)
+description of the survey dataset, written as static files so that crawlers needn't walk the register's pages
+
+    python -m model.sitemap --base-url http://pid.geoscience.gov.au/
+
+Files, under the output directory:
+
+    sitemaps/index.xml.gz               the sitemap index, listing each sitemap and when it last changed
+    sitemaps/surveys-{n}.xml.gz         sitemaps of survey URIs, each with its lastmod, at most SITEMAP_MAX_URLS URIs
+                                        and SITEMAP_MAX_BYTES bytes before gzipping, as the protocol allows
+    void.ttl                            the VoID description: triple counts, in all and per view, and the data dumps
+    robots.txt                          pointing crawlers to the sitemap index
+    manifest.json                       the change log: each survey's record digest, when that last changed, its
+                                        triple counts and the digests of its triples other surveys may share, and each
+                                        sitemap's digest
+    nginx-locations.conf                nginx locations serving these files
+
+The manifest is the catalogue's change log: a survey's lastmod is the date of the catalogue snapshot in which its record
+was first seen as it is now. Rebuilds only count the triples of the surveys whose records have changed and only rewrite
+the sitemaps whose contents have changed. Run it after each harvest.
+
+The VoID triple counts are of distinct triples, as in the data dumps: most of a survey's triples, those about it and its
+blank nodes, are its own, but those about other things, such as its agents, are shared by many surveys, so each survey's
+are kept as digests and counted once across the catalogue.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from os.path import join
+from xml.sax.saxutils import escape
+from rdflib import Graph, Namespace, URIRef, BNode, Literal, RDF, XSD
+from rdflib.namespace import DCTERMS
+from model import catalogue, export, rdfdict
+import _config
+
+VOID = Namespace('http://rdfs.org/ns/void#')
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+# the protocol's limits for one sitemap
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def triple_digest(triple):
+    """
+    :return: a short digest of an rdflib triple, which is as good as unique among a catalogue's triples
+    """
+    return hashlib.sha1(' '.join(term.n3() for term in triple).encode('utf-8')).hexdigest()[:12]
+
+
+def triple_counts(record, views=_config.EXPORT_VIEWS):
+    """
+    :return: a tuple of a dict of view name to the number of a survey's own triples in that view, those about it or with
+        blank nodes, which no other survey has, and None to the number of distinct ones in all its views, as some are
+        in more than one, and a dict of view name to the sorted digests of the view's other triples, those about other
+        things, such as its agents, which other surveys may have too
+    """
+    from model.survey import SurveyRenderer
+
+    survey = SurveyRenderer.from_record(record)
+    survey_uri = URIRef(_config.BASE_URI_SURVEY + str(record.survey_id))
+    counts = {}
+    shared = {}
+    own = set()
+    for view in views:
+        counts[view] = 0
+        digests = set()
+        for triple in survey.make_graph(view, Graph(bind_namespaces='none')):
+            if triple[0] != survey_uri and not any(isinstance(term, BNode) for term in triple):
+                digests.add(triple_digest(triple))
+            else:
+                counts[view] += 1
+                own.add(triple)
+        shared[view] = sorted(digests)
+    counts[None] = len(own)
+    return counts, shared
+
+
+def url_entry(survey_id, lastmod):
+    return '<url><loc>{}</loc><lastmod>{}</lastmod></url>\n'.format(
+        escape(_config.BASE_URI_SURVEY + str(survey_id)), lastmod)
+
+
+def chunk_entries(entries, max_urls=SITEMAP_MAX_URLS, max_bytes=SITEMAP_MAX_BYTES):
+    """
+    Splits sitemap <url> entries into sitemaps within the protocol's limits
+
+    :param entries: a list of (<url> entry, lastmod) tuples
+    :return: a list of lists of them
+    """
+    overhead = len(sitemap_xml([]))
+    chunks = [[]]
+    size = overhead
+    for entry in entries:
+        if len(chunks[-1]) == max_urls or size + len(entry[0]) > max_bytes:
+            chunks.append([])
+            size = overhead
+        chunks[-1].append(entry)
+        size += len(entry[0])
+    return chunks
+
+
+def sitemap_xml(entries):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{}">\n{}</urlset>\n'.format(
+        SITEMAP_NS, ''.join(entry for entry, _ in entries))).encode('utf-8')
+
+
+def sitemap_index_xml(sitemaps):
+    """
+    :param sitemaps: a list of (sitemap URL, lastmod) tuples
+    """
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{}">\n{}</sitemapindex>\n'.format(
+        SITEMAP_NS,
+        ''.join('<sitemap><loc>{}</loc><lastmod>{}</lastmod></sitemap>\n'.format(escape(url), lastmod)
+                for url, lastmod in sitemaps)
+    )).encode('utf-8')
+
+
+def void_graph(base_url, surveys, modified, example_survey_id):
+    """
+    :param base_url: the scheme and host this API is served at, e.g. http://pid.geoscience.gov.au/
+    :param surveys: the manifest's dict of survey ID to [digest, lastmod, dict of view, or 'all', to own triple count,
+        dict of view to shared triple digests], as per triple_counts()
+    :param modified: the date the dataset last changed
+    :return: an rdflib Graph of the VoID description of the survey dataset
+    """
+    g = Graph()
+    g.bind('void', VOID)
+    g.bind('dcterms', DCTERMS)
+
+    dataset = URIRef(base_url + 'void.ttl#surveys')
+    g.add((dataset, RDF.type, VOID.Dataset))
+    g.add((dataset, DCTERMS.title, Literal('Geoscience Australia\'s geophysical surveys', lang='en')))
+    g.add((dataset, DCTERMS.publisher, URIRef('http://pid.geoscience.gov.au/org/ga/geoscienceaustralia')))
+    g.add((dataset, DCTERMS.license, URIRef('http://creativecommons.org/licenses/by/4.0/')))
+    g.add((dataset, DCTERMS.modified, Literal(modified, datatype=XSD.date)))
+    g.add((dataset, VOID.entities, Literal(len(surveys))))
+    g.add((dataset, VOID.uriSpace, Literal(_config.BASE_URI_SURVEY)))
+    g.add((dataset, VOID.rootResource, URIRef(_config.BASE_URI_SURVEY)))
+    if example_survey_id is not None:
+        g.add((dataset, VOID.exampleResource, URIRef(_config.BASE_URI_SURVEY + str(example_survey_id))))
+    g.add((dataset, VOID.sparqlEndpoint, URIRef(base_url + 'sparql')))
+    for mimetype in list(export.MIMETYPES.values()) + [rdfdict.MIMETYPE]:
+        g.add((dataset, VOID.dataDump, URIRef('{}survey/export?_format={}'.format(base_url, mimetype))))
+
+    # each survey's own triples and, once however many surveys have them, the shared ones
+    views = {}
+    shared = {'all': set()}
+    for _, _, counts, digests in surveys.values():
+        for view, count in counts.items():
+            views[view] = views.get(view, 0) + count
+        for view, view_digests in digests.items():
+            shared.setdefault(view, set()).update(view_digests)
+            shared['all'].update(view_digests)
+    views = {view: count + len(shared.get(view, ())) for view, count in views.items()}
+    g.add((dataset, VOID.triples, Literal(views.pop('all', 0))))
+    for view, count in sorted(views.items()):
+        subset = URIRef('{}void.ttl#surveys-{}'.format(base_url, view))
+        g.add((dataset, VOID.subset, subset))
+        g.add((subset, RDF.type, VOID.Dataset))
+        g.add((subset, DCTERMS.title, Literal('The {} view of every survey'.format(view), lang='en')))
+        g.add((subset, VOID.triples, Literal(count)))
+    return g
+
+
+def nginx_locations(output):
+    return '''# Made by python -m model.sitemap. Include in nginx's server block.
+
+location /sitemaps/ {{
+    root {root};
+    types {{
+        application/gzip gz;
+    }}
+}}
+
+location = /void.ttl {{
+    root {root};
+    types {{
+        text/turtle ttl;
+    }}
+}}
+
+location = /.well-known/void {{
+    default_type text/turtle;
+    alias {root}/void.ttl;
+}}
+
+location = /robots.txt {{
+    root {root};
+}}
+'''.format(root=os.path.abspath(output))
+
+
+def write_sitemaps(output=_config.SITEMAP_DIR, base_url='http://pid.geoscience.gov.au/', full=False,
+                   snapshot_path=_config.CATALOGUE_SNAPSHOT):
+    """
+    Writes the sitemaps and VoID description of the catalogue, counting the triples of only the surveys whose records
+    have changed since the last run and rewriting only the sitemaps that have changed
+
+    :param output: the directory to write to
+    :param base_url: the scheme and host this API is served at, for the sitemaps' and VoID description's URLs
+    :param full: count every survey's triples and rewrite every file, though a survey whose record hasn't changed keeps
+        its lastmod
+    :return: a dict of counts of the surveys counted, removed and unchanged and the sitemaps written and unchanged
+    """
+    os.makedirs(output, exist_ok=True)
+    manifest = _read_json(join(output, 'manifest.json'))
+    previous = manifest.get('surveys', {})
+    previous_sitemaps = manifest.get('sitemaps', {})
+
+    snapshot = catalogue.CatalogueSnapshot(snapshot_path)
+    today = datetime.fromtimestamp(snapshot.created, timezone.utc).date().isoformat()
+    surveys = {}
+    counted = 0
+    for record in snapshot:
+        survey_id = str(record.survey_id)
+        digest = record.digest()
+        known = previous.get(survey_id)
+        unchanged = known is not None and known[0] == digest
+        # manifests from before shared triples were counted apart have no digests of them
+        if unchanged and len(known) == 4 and not full:
+            surveys[survey_id] = known
+        else:
+            counts, shared = triple_counts(record)
+            counts['all'] = counts.pop(None)
+            surveys[survey_id] = [digest, known[1] if unchanged else today, counts, shared]
+            counted += 1
+    removed = len([survey_id for survey_id in previous if survey_id not in surveys])
+
+    # snapshots are in survey ID order, so a survey stays in the same sitemap unless surveys are added before it
+    entries = [(url_entry(survey_id, lastmod), lastmod) for survey_id, (_, lastmod, _, _) in surveys.items()]
+    sitemaps = {}
+    index = []
+    written = 0
+    for n, chunk in enumerate(chunk_entries(entries), 1):
+        name = 'surveys-{}.xml.gz'.format(n)
+        xml = sitemap_xml(chunk)
+        digest = hashlib.sha1(xml).hexdigest()
+        path = join(output, 'sitemaps', name)
+        if full or previous_sitemaps.get(name) != digest or not os.path.exists(path):
+            # mtime=0 so that the same sitemap is always the same bytes
+            _write(path, gzip.compress(xml, 9, mtime=0))
+            written += 1
+        sitemaps[name] = digest
+        index.append((base_url + 'sitemaps/' + name, max(lastmod for _, lastmod in chunk)))
+    for name in previous_sitemaps:
+        if name not in sitemaps and os.path.exists(join(output, 'sitemaps', name)):
+            os.remove(join(output, 'sitemaps', name))
+
+    _write(join(output, 'sitemaps', 'index.xml.gz'), gzip.compress(sitemap_index_xml(index), 9, mtime=0))
+    modified = max((lastmod for _, lastmod, _, _ in surveys.values()), default=today)
+    example = snapshot.record(0).survey_id if len(snapshot) > 0 else None
+    _write(join(output, 'void.ttl'), void_graph(base_url, surveys, modified, example).serialize(format='turtle')
+           .encode('utf-8'))
+    _write(join(output, 'robots.txt'), 'User-agent: *\nAllow: /\nSitemap: {}sitemaps/index.xml.gz\n'.format(
+        base_url).encode('utf-8'))
+    _write(join(output, 'nginx-locations.conf'), nginx_locations(output).encode('utf-8'))
+    _write(join(output, 'manifest.json'), json.dumps({
+        'surveys': surveys,
+        'sitemaps': sitemaps,
+        'written': time.time(),
+    }).encode('utf-8'))
+
+    return {
+        'counted': counted,
+        'removed': removed,
+        'unchanged': len(surveys) - counted,
+        'sitemaps_written': written,
+        'sitemaps_unchanged': len(sitemaps) - written,
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description='Writes the sitemaps and VoID description of the survey catalogue')
+    parser.add_argument('--output', default=_config.SITEMAP_DIR, help='the directory to write to')
+    parser.add_argument('--base-url', default='http://pid.geoscience.gov.au/',
+                        help='the scheme and host this API is served at')
+    parser.add_argument('--snapshot', default=_config.CATALOGUE_SNAPSHOT, help='the catalogue snapshot file')
+    parser.add_argument('--full', action='store_true', help='count every survey\'s triples, not just the changed ones')
+    args = parser.parse_args()
+
+    start = time.time()
+    counts = write_sitemaps(args.output, args.base_url, args.full, args.snapshot)
+    print('Counted the triples of {counted} surveys, removed {removed}, left {unchanged} unchanged, wrote '
+          '{sitemaps_written} sitemaps and left {sitemaps_unchanged} unchanged'.format(**counts) +
+          ' in {:.1f}s'.format(time.time() - start))
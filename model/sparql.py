@@ -0,0 +1,329 @@
+"""
+The /sparql endpoint's store and query running
+
+The store is one in-memory rdflib Graph of the _config.EXPORT_VIEWS triples of every survey in a catalogue Generation,
+built as a lazy index (see model/generations.py) by a worker when it gets its first query. Queries are read-only, may
+not reach out to other endpoints or load remote graphs, run for at most _config.SPARQL_TIMEOUT_SECONDS, each in a forked
+process that is killed when its time is up, and give at most _config.SPARQL_MAX_ROWS rows. Their results are cached, by
+Generation and normalised query text, so that repeats of the same query, however it's laid out, are served from memory.
+"""
+import functools
+import multiprocessing
+import re
+import threading
+import time
+import rdflib.plugins.sparql
+from rdflib import Graph
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.algebra import traverse
+from rdflib.query import Result
+from model import checkpoint, generations
+from model.cache import LRUCache
+import _config
+
+# never fetch the graphs named in a query's FROM clauses
+rdflib.plugins.sparql.SPARQL_LOAD_GRAPHS = False
+
+RESULTS_MIMETYPES = [
+    'application/sparql-results+json',
+    'application/sparql-results+xml',
+    'text/csv',
+]
+GRAPH_MIMETYPES = [
+    'text/turtle',
+    'application/n-triples',
+    'application/rdf+xml',
+    'application/ld+json',
+]
+RESULTS_FORMATS = {
+    'application/sparql-results+json': 'json',
+    'application/sparql-results+xml': 'xml',
+    'text/csv': 'csv',
+}
+GRAPH_FORMATS = {
+    'text/turtle': 'turtle',
+    'application/n-triples': 'nt',
+    'application/rdf+xml': 'xml',
+    'application/ld+json': 'json-ld',
+}
+
+# the tokens of a query that normalising leaves alone: strings, long strings first, and IRIs. Then runs of whitespace
+# and comments, which it replaces with a single space.
+QUERY_TOKENS = re.compile(r'''
+    (?P<keep>"""(?:[^"\\]|\\.|"(?!""))*"""|\'\'\'(?:[^'\\]|\\.|'(?!''))*\'\'\'|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'
+        |<[^<>"{}|^`\\\s]*>)
+    |(?P<space>(?:\s|\#[^\n]*)+)
+''', re.VERBOSE)
+
+results_cache = LRUCache(max_items=_config.SPARQL_CACHE_ITEMS)
+checkpoint.register('sparql', results_cache, per_generation=True)
+_running = threading.BoundedSemaphore(_config.SPARQL_MAX_RUNNING)
+# queries are run in forked processes, which can be killed, where there's fork()
+_fork = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+
+class SparqlError(ValueError):
+    """A query that can't be run, e.g. a syntax error, to be reported to the client as a 400"""
+    pass
+
+
+class SparqlTimeout(Exception):
+    pass
+
+
+class SparqlBusy(Exception):
+    pass
+
+
+@generations.register_index('sparql', lazy=True)
+def build_store(snapshot, previous):
+    """
+    :return: an rdflib Graph of the _config.EXPORT_VIEWS triples of every survey in the snapshot
+    """
+    from model.survey import SurveyRenderer
+
+    g = Graph()
+    for record in snapshot:
+        survey = SurveyRenderer.from_record(record)
+        for view in _config.EXPORT_VIEWS:
+            survey.make_graph(view, g)
+    return g
+
+
+def normalise_query(query):
+    """
+    Lays a query out canonically, without comments and with single spaces, so that differently laid out copies of a
+    query share a cache entry
+
+    :param query: SPARQL query text
+    :return: the normalised query text
+    """
+    def replace(match):
+        if match.group('keep') is not None:
+            return match.group('keep')
+        return ' '
+
+    return QUERY_TOKENS.sub(replace, query).strip()
+
+
+def _uses_service(algebra):
+    found = []
+
+    def visit(node):
+        if getattr(node, 'name', None) == 'ServiceGraphPattern':
+            found.append(node)
+
+    traverse(algebra, visitPre=visit)
+    return len(found) > 0
+
+
+@functools.lru_cache(maxsize=_config.SPARQL_CACHE_ITEMS)
+def prepare(query):
+    """
+    Parses a query and checks it's one that this endpoint will run. Parsing takes milliseconds so prepared queries are
+    memoised, by their normalised text.
+
+    :param query: SPARQL query text
+    :return: the prepared query
+    :raises SparqlError: if the query is not valid SPARQL or uses SERVICE
+    """
+    try:
+        prepared = prepareQuery(query)
+    except Exception as e:
+        raise SparqlError('Could not parse the query: {}'.format(e))
+    if _uses_service(prepared.algebra):
+        raise SparqlError('SERVICE queries are not supported')
+    return prepared
+
+
+def query_type(prepared):
+    """
+    :return: 'SELECT', 'ASK', 'CONSTRUCT' or 'DESCRIBE'
+    """
+    return prepared.algebra.name[:-len('Query')].upper()
+
+
+def mimetypes_for(prepared):
+    """
+    :return: the mimetypes a query's results can be given in, the default first
+    """
+    return GRAPH_MIMETYPES if query_type(prepared) in ('CONSTRUCT', 'DESCRIBE') else RESULTS_MIMETYPES
+
+
+def _run(store, prepared, deadline, max_rows, cancelled=None):
+    """
+    :return: an (rdflib Result, whether its rows were cut off at max_rows) tuple
+    :raises SparqlTimeout: if the deadline passes, or the query is cancelled, between rows
+    :raises SparqlError: if the query fails
+    """
+    try:
+        result = store.query(prepared)
+        if result.type == 'ASK':
+            return result, False
+        # rows are made lazily, so a query can be stopped between them
+        rows = []
+        truncated = False
+        for row in result:
+            if (cancelled is not None and cancelled.is_set()) or time.time() > deadline:
+                raise SparqlTimeout()
+            if len(rows) == max_rows:
+                truncated = True
+                break
+            rows.append(row)
+        limited = Result(result.type)
+        if result.type == 'SELECT':
+            limited.vars = result.vars
+            limited.bindings = [{v: row[v] for v in result.vars if row[v] is not None} for row in rows]
+        else:
+            g = Graph()
+            for prefix, namespace in store.namespaces():
+                g.bind(prefix, namespace)
+            for triple in rows:
+                g.add(triple)
+            limited.graph = g
+        return limited, truncated
+    except (SparqlTimeout, SparqlError):
+        raise
+    except Exception as e:
+        raise SparqlError('Could not run the query: {}'.format(e))
+
+
+def _run_in_child(store, prepared, mimetype, deadline, max_rows, conn):
+    # in a forked process, which has the store copy-on-write and is killed if it runs too long
+    try:
+        result, truncated = _run(store, prepared, deadline, max_rows)
+        conn.send((serialize(result, mimetype), truncated, None))
+    except SparqlTimeout:
+        conn.send((None, False, 'timeout'))
+    except SparqlError as e:
+        conn.send((None, False, str(e)))
+    except Exception as e:
+        conn.send((None, False, 'Could not run the query: {}'.format(e)))
+    finally:
+        conn.close()
+
+
+def _run_in_process(store, prepared, mimetype, timeout, max_rows):
+    receiver, sender = _fork.Pipe(duplex=False)
+    process = _fork.Process(
+        target=_run_in_child,
+        args=(store, prepared, mimetype, time.time() + timeout, max_rows, sender),
+        name='sparql-query',
+        daemon=True
+    )
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise SparqlTimeout()
+        try:
+            data, truncated, error = receiver.recv()
+        except EOFError:
+            raise SparqlError('Could not run the query: its process ended with code {}'.format(process.exitcode))
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+    if error == 'timeout':
+        raise SparqlTimeout()
+    if error is not None:
+        raise SparqlError(error)
+    return data, truncated
+
+
+def _run_in_thread(store, prepared, mimetype, timeout, max_rows):
+    outcome = {}
+    cancelled = threading.Event()
+
+    def target():
+        try:
+            result, truncated = _run(store, prepared, time.time() + timeout, max_rows, cancelled)
+            outcome['answer'] = serialize(result, mimetype), truncated
+        except (SparqlTimeout, SparqlError) as e:
+            outcome['error'] = e
+        except Exception as e:
+            outcome['error'] = SparqlError('Could not run the query: {}'.format(e))
+        finally:
+            _running.release()
+
+    thread = threading.Thread(target=target, name='sparql-query', daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        cancelled.set()
+        raise SparqlTimeout()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['answer']
+
+
+def run_query(store, prepared, mimetype, timeout=_config.SPARQL_TIMEOUT_SECONDS, max_rows=_config.SPARQL_MAX_ROWS):
+    """
+    Runs a query in a forked process of its own, which is killed if it runs for longer than timeout seconds: rdflib
+    can spend any time before a query's first row, e.g. sorting or grouping a cartesian product, and a thread can't
+    be stopped then. Where processes can't be forked it runs on a thread, which the request gives up on but which
+    carries on, until its next row, holding one of the _config.SPARQL_MAX_RUNNING places.
+
+    :param store: the rdflib Graph to query
+    :param prepared: a query from prepare()
+    :param mimetype: the mimetype to give the results in, one of mimetypes_for()
+    :return: a (results bytes, whether their rows were cut off at max_rows) tuple
+    :raises SparqlBusy: if _config.SPARQL_MAX_RUNNING queries are already running
+    :raises SparqlTimeout: if the query runs for longer than timeout seconds
+    :raises SparqlError: if the query fails
+    """
+    if not _running.acquire(blocking=False):
+        raise SparqlBusy()
+    if _fork is None:
+        return _run_in_thread(store, prepared, mimetype, timeout, max_rows)
+    try:
+        return _run_in_process(store, prepared, mimetype, timeout, max_rows)
+    finally:
+        _running.release()
+
+
+def serialize(result, mimetype):
+    """
+    :return: the bytes of a query result in a mimetype from mimetypes_for()
+    """
+    if result.type in ('CONSTRUCT', 'DESCRIBE'):
+        data = result.graph.serialize(format=GRAPH_FORMATS[mimetype])
+        return data.encode('utf-8') if isinstance(data, str) else data
+    return result.serialize(format=RESULTS_FORMATS[mimetype])
+
+
+def query(generation, query_text, mimetype=None, accept=None):
+    """
+    Answers a query against a catalogue Generation's store, from the cache if it has been asked before
+
+    :param generation: a model.generations.Generation
+    :param query_text: SPARQL query text
+    :param mimetype: the results mimetype, if the client named one, else it is negotiated from accept
+    :param accept: the request's Accept header
+    :return: a (results bytes, mimetype, whether the rows were cut off) tuple, or None while the store is being built
+    :raises SparqlError: if the query or mimetype is not valid
+    """
+    from _ldapi.ldapi import LDAPI
+
+    normalised = normalise_query(query_text)
+    prepared = prepare(normalised)
+    mimetypes = mimetypes_for(prepared)
+    if mimetype is None:
+        mimetype = LDAPI.negotiate_mimetype(accept, tuple(mimetypes)) or mimetypes[0]
+    elif mimetype not in mimetypes:
+        raise SparqlError('The results of {} queries can be given in {}, not {}'.format(
+            query_type(prepared), ', '.join(mimetypes), mimetype))
+
+    key = (generation.number, normalised, mimetype)
+    cached = results_cache.get(key)
+    if cached is not None:
+        return cached
+
+    store = generation.lazy_index('sparql')
+    if store is None:
+        return None
+    data, truncated = run_query(store, prepared, mimetype)
+    answer = data, mimetype, truncated
+    results_cache.set(key, answer)
+    return answer
@@ -0,0 +1,243 @@
+"""
+Statistics of the survey catalogue, for dashboards: survey counts and line km by year, state, survey type and data type,
+and timelines of each of the last three by year
+
+The statistics are an index of each catalogue Generation. They're counted in one pass over the snapshot's columns, each
+distinct string decoded once, into a "fact" of each survey's year, state, survey type, data types and line km. When a
+new Generation replaces one whose statistics are known, only the surveys whose facts have changed, been added or gone
+are counted again: their old facts are taken away from the previous counts and their new ones added. The JSON of every
+cube is made with the index, and each cube's RDF Data Cube (https://www.w3.org/TR/vocab-data-cube/) observations the
+first time they're asked for, so every request is answered from a ready-made document.
+"""
+import json
+import threading
+from datetime import date
+from urllib.parse import quote
+from rdflib import Graph, Namespace, URIRef, Literal, RDF, RDFS, XSD
+from _ldapi.ldapi import LDAPI
+from model import generations
+import _config
+
+QB = Namespace('http://purl.org/linked-data/cube#')
+SDMX_DIMENSION = Namespace('http://purl.org/linked-data/sdmx/2009/dimension#')
+STATS = Namespace(_config.BASE_URI_STATS + 'def#')
+
+JSON_MIMETYPE = 'application/json'
+MIMETYPES = (JSON_MIMETYPE,) + LDAPI.get_rdf_mimetypes_list()
+
+# the cubes counted, by their dimensions: each dimension alone and the timelines of the others
+CUBES = [
+    ('year',),
+    ('state',),
+    ('survey_type',),
+    ('data_type',),
+    ('year', 'state'),
+    ('year', 'survey_type'),
+    ('year', 'data_type'),
+]
+# dimension -> (its RDF property, the datatype of its values)
+DIMENSION_PROPERTIES = {
+    'year': (SDMX_DIMENSION.refPeriod, XSD.gYear),
+    'state': (STATS.state, XSD.string),
+    'survey_type': (STATS.surveyType, XSD.string),
+    'data_type': (STATS.dataType, XSD.string),
+}
+
+
+def parse_cube(value):
+    """
+    :param value: a by query parameter, a cube's dimensions separated by commas, e.g. "year,state"
+    :return: the cube, one of CUBES
+    :raises ValueError: if there's no such cube
+    """
+    cube = tuple(d.strip() for d in value.split(','))
+    if cube not in CUBES:
+        raise ValueError('by must be one of {}'.format(', '.join(','.join(c) for c in CUBES)))
+    return cube
+
+
+def cube_name(cube):
+    return ','.join(cube)
+
+
+def _facts(snapshot):
+    """
+    :return: a dict of survey ID to its (year, state, survey type, data types, line km) fact
+    """
+    strings = {0: None}
+
+    def string(ref):
+        s = strings.get(ref, False)
+        if s is False:
+            s = strings[ref] = snapshot.string(ref)
+        return s
+
+    data_types = {0: ()}
+    years = {0: None}
+    facts = {}
+    for survey_id, start, state, survey_type, types, line_km in zip(
+            snapshot.columns['survey_id'],
+            snapshot.columns['start_date'],
+            snapshot.columns['state'],
+            snapshot.columns['survey_type'],
+            snapshot.columns['data_types'],
+            snapshot.columns['line_km']):
+        year = years.get(start)
+        if year is None and start != 0:
+            year = years[start] = date.fromordinal(start).year
+        split = data_types.get(types)
+        if split is None:
+            split = data_types[types] = tuple(sorted({t.strip() for t in string(types).split(',') if t.strip()}))
+        # NaN, no line km, is the only value not equal to itself
+        facts[survey_id] = (year, string(state), string(survey_type), split, line_km if line_km == line_km else 0.0)
+    return facts
+
+
+def _cells(cube, fact):
+    """
+    :return: the keys of the cells of a cube that a survey's fact is counted in
+    """
+    year, state, survey_type, data_types, _ = fact
+    values = {'year': year, 'state': state, 'survey_type': survey_type}
+    if 'data_type' in cube:
+        return [tuple(values[d] if d != 'data_type' else t for d in cube) for t in data_types]
+    return [tuple(values[d] for d in cube)]
+
+
+class CatalogueStats:
+    """
+    The cubes of survey counts and line km of a catalogue snapshot
+    """
+
+    def __init__(self, snapshot, previous=None):
+        """
+        :param snapshot: a model.catalogue.CatalogueSnapshot
+        :param previous: the CatalogueStats of the previous Generation, to count only the surveys that have changed
+        """
+        self.facts = _facts(snapshot)
+        if previous is None:
+            self.cubes = {cube: {} for cube in CUBES}
+            changes = [(None, fact) for fact in self.facts.values()]
+        else:
+            self.cubes = {cube: dict(cells) for cube, cells in previous.cubes.items()}
+            changes = [(fact, self.facts.get(survey_id)) for survey_id, fact in previous.facts.items()
+                       if self.facts.get(survey_id) != fact]
+            changes.extend((None, fact) for survey_id, fact in self.facts.items() if survey_id not in previous.facts)
+        self.changed = len(changes)
+
+        for old, new in changes:
+            for cube, cells in self.cubes.items():
+                if old is not None:
+                    for key in _cells(cube, old):
+                        count, line_km = cells[key]
+                        if count == 1:
+                            del cells[key]
+                        else:
+                            cells[key] = (count - 1, line_km - old[4])
+                if new is not None:
+                    for key in _cells(cube, new):
+                        count, line_km = cells.get(key, (0, 0.0))
+                        cells[key] = (count + 1, line_km + new[4])
+
+        self.surveys = len(self.facts)
+        self.line_km = sum(fact[4] for fact in self.facts.values())
+        self._json = {cube: json.dumps(self.cube_dict(cube)).encode('utf-8') for cube in CUBES}
+        self._json[None] = json.dumps(self.summary_dict()).encode('utf-8')
+        self._rdf = {}
+        self._rdf_lock = threading.Lock()
+
+    def observations(self, cube):
+        """
+        :return: a list of (cell key, survey count, line km) observations of a cube, in key order with unknowns last
+        """
+        cells = self.cubes[cube]
+        keys = sorted(cells, key=lambda key: tuple((v is None, v if v is not None else 0) for v in key))
+        return [(key, cells[key][0], round(cells[key][1], 3)) for key in keys]
+
+    def cube_dict(self, cube):
+        return {
+            'dimensions': list(cube),
+            'observations': [
+                dict(zip(cube, key), surveys=count, line_km=line_km)
+                for key, count, line_km in self.observations(cube)
+            ]
+        }
+
+    def summary_dict(self):
+        return {
+            'surveys': self.surveys,
+            'line_km': round(self.line_km, 3),
+            'cubes': {cube_name(cube): self.cube_dict(cube) for cube in CUBES},
+        }
+
+    def make_graph(self, cube):
+        """
+        :return: an rdflib Graph of a cube as an RDF Data Cube qb:DataSet, its structure and its observations. Cells of
+            an unknown year, state, survey type or data type are left out, as an observation must have every dimension.
+        """
+        g = Graph()
+        g.bind('qb', QB)
+        g.bind('sdmx-dimension', SDMX_DIMENSION)
+        g.bind('stats', STATS)
+
+        dataset_uri = _config.BASE_URI_STATS + 'by-' + '-'.join(d.replace('_', '-') for d in cube)
+        dataset = URIRef(dataset_uri)
+        structure = URIRef(dataset_uri + '/structure')
+        g.add((dataset, RDF.type, QB.DataSet))
+        g.add((dataset, RDFS.label, Literal('Surveys and line km by ' + ' and '.join(d.replace('_', ' ') for d in cube),
+                                            datatype=XSD.string)))
+        g.add((dataset, QB.structure, structure))
+        g.add((structure, RDF.type, QB.DataStructureDefinition))
+        for order, d in enumerate(cube, 1):
+            component = URIRef('{}#{}'.format(structure, d))
+            g.add((structure, QB.component, component))
+            g.add((component, QB.dimension, DIMENSION_PROPERTIES[d][0]))
+            g.add((component, QB.order, Literal(order)))
+        for measure in (STATS.surveyCount, STATS.lineKm):
+            component = URIRef('{}#{}'.format(structure, measure.split('#')[-1]))
+            g.add((structure, QB.component, component))
+            g.add((component, QB.measure, measure))
+            g.add((measure, RDF.type, QB.MeasureProperty))
+        for d in cube:
+            g.add((DIMENSION_PROPERTIES[d][0], RDF.type, QB.DimensionProperty))
+
+        for key, count, line_km in self.observations(cube):
+            if None in key:
+                continue
+            observation = URIRef(dataset_uri + '/' + '/'.join(quote(str(v), safe='') for v in key))
+            g.add((observation, RDF.type, QB.Observation))
+            g.add((observation, QB.dataSet, dataset))
+            for d, value in zip(cube, key):
+                prop, datatype = DIMENSION_PROPERTIES[d]
+                g.add((observation, prop, Literal(str(value), datatype=datatype)))
+            g.add((observation, STATS.surveyCount, Literal(count)))
+            g.add((observation, STATS.lineKm, Literal(line_km, datatype=XSD.decimal)))
+        return g
+
+    def document(self, cube, mimetype):
+        """
+        :param cube: one of CUBES, or None for all the cubes, in JSON only
+        :param mimetype: one of MIMETYPES
+        :return: the bytes of a cube, or of all of them, in a mimetype, made the first time it's asked for
+        :raises ValueError: if RDF of all the cubes is asked for
+        """
+        if mimetype == JSON_MIMETYPE:
+            return self._json[cube]
+        if cube is None:
+            raise ValueError('The RDF Data Cube of the statistics is available one cube at a time, e.g. ?by=year')
+        key = (cube, mimetype)
+        data = self._rdf.get(key)
+        if data is None:
+            with self._rdf_lock:
+                data = self._rdf.get(key)
+                if data is None:
+                    data = self.make_graph(cube).serialize(format=LDAPI.get_rdf_parser_for_mimetype(mimetype))
+                    if isinstance(data, str):
+                        data = data.encode('utf-8')
+                    self._rdf[key] = data
+        return data
+
+
+@generations.register_index('stats')
+def build_stats_index(snapshot, previous):
+    return CatalogueStats(snapshot, previous.indexes.get('stats') if previous is not None else None)
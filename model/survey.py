@@ -1,12 +1,19 @@
 from lxml import etree
-from lxml import objectify
 from rdflib import Graph, URIRef, RDF, RDFS, XSD, Namespace, Literal, BNode
-import requests
 from datetime import datetime
+from urllib.parse import quote
+from functools import cached_property
 from _ldapi.ldapi import LDAPI
 from flask import Response, render_template, redirect
+from model import catalogue, generations, jsonld, upstream
+from model.agents import agent_uri
 import _config
 
+SURVEY = upstream.RecordType(
+    'survey', 'Survey', catalogue.SURVEY_FIELDS,
+    _config.XML_API_URL_SURVEY, _config.XML_API_URL_SURVEY_REGISTER, _config.BASE_URI_SURVEY
+)
+
 
 class SurveyRenderer:
     """
@@ -18,9 +25,30 @@ class SurveyRenderer:
     URI_MISSSING = 'http://www.opengis.net/def/nil/OGC/0/missing'
     URI_INAPPLICABLE = 'http://www.opengis.net/def/nil/OGC/0/inapplicable'
     URI_GA = 'http://pid.geoscience.gov.au/org/ga'
+    URI_INSTRUMENT = 'http://pid.geoscience.gov.au/instrument/'
+
+    # the survey's data attributes, which are only populated, from the catalogue or the API, when one is first read
+    DATA_ATTRIBUTES = frozenset(attr for _, attr, _ in catalogue.SURVEY_FIELDS[1:])
 
     def __init__(self, survey_id):
         self.survey_id = survey_id
+        self.srid = 8311  # TODO: replace this magic number with a value from the DB
+
+        # views such as argus, and HEAD requests, need no data so nothing is populated until some is asked for
+        self._populated = False
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't set, i.e. the data attributes before population
+        if name in SurveyRenderer.DATA_ATTRIBUTES and not self._populated:
+            self._populate()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def _populate(self):
+        """
+        Populates all instance variables from the catalogue snapshot if it has this survey, otherwise from the API
+        """
+        self._populated = True
         self.survey_name = None
         self.state = None
         self.operator = None
@@ -53,29 +81,56 @@ class SurveyRenderer:
         self.mag_instrument = None
         self.rad_instrument = None
 
-        self.srid = 8311  # TODO: replace this magic number with a value from the DB
+        record = generations.get_record(self.survey_id)
+        if record is not None:
+            self._populate_from_record(record)
+        else:
+            self._populate_from_oracle_api(self.survey_id)
+
+        self._clean_up()
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Makes a SurveyRenderer already populated from a catalogue snapshot record, e.g. for bulk exports
+
+        :param record: a model.catalogue.SurveyRecord
+        :return: a SurveyRenderer
+        """
+        s = cls(str(record.survey_id))
+        s._populated = True
+        s._populate_from_record(record)
+        s._clean_up()
+        return s
 
-        # populate all instance variables from API
-        # TODO: lazy load this, i.e. only populate if a controller that need populating is loaded which is every controller except for Alternates
-        self._populate_from_oracle_api(survey_id)
+    def _clean_up(self):
+        # clean-up required vars
+        if self.end_date is None:
+            self.end_date = datetime(1900, 1, 1)
 
-        self.wkt_polygon = 'SRID={};POLYGON(({} {}, {} {}, {} {}, {} {}, {} {}))'.format(
+    @cached_property
+    def wkt_polygon(self):
+        return 'SRID={};POLYGON(({} {}, {} {}, {} {}, {} {}, {} {}))'.format(
             self.srid,
             self.w_long, self.n_lat,
             self.e_long, self.n_lat,
             self.e_long, self.s_lat,
-            self.e_long, self.s_lat,
+            self.w_long, self.s_lat,
             self.w_long, self.n_lat
         )
 
-        self.centroid_lat = (self.n_lat + self.s_lat) / 2
-        self.centroid_lon = (self.e_long + self.w_long) / 2
+    @cached_property
+    def centroid_lat(self):
+        return (self.n_lat + self.s_lat) / 2
 
-        # clean-up required vars
-        if self.end_date is None:
-            self.end_date = datetime(1900, 1, 1)
+    @cached_property
+    def centroid_lon(self):
+        return (self.e_long + self.w_long) / 2
 
     def render(self, view, mimetype):
+        if view == 'argus':  # XML only for this controller, a redirect needing no data
+            return redirect(_config.XML_API_URL_SURVEY.format(self.survey_id), code=303)
+
         if self.survey_name is None:
             return Response('Survey with ID {} not found.'.format(self.survey_id), status=404, mimetype='text/plain')
 
@@ -84,8 +139,6 @@ class SurveyRenderer:
                 return self.export_html(model_view=view)
             else:
                 return Response(self.export_rdf(view, mimetype), mimetype=mimetype)
-        elif view == 'argus':  # XML only for this controller
-            return redirect(_config.XML_API_URL_SURVEY.format(self.survey_id), code=303)
         elif view == 'prov':
             if mimetype == 'text/html':
                 return self.export_html(model_view=view)
@@ -94,6 +147,54 @@ class SurveyRenderer:
         elif view == 'sosa':  # RDF only for this controller
             return Response(self.export_rdf(view, mimetype), mimetype=mimetype)
 
+    def nearby_surveys(self, k):
+        """
+        :return: a list of (distance in km, model.catalogue.SurveyRecord) of the k surveys nearest this one, nearest
+            first, or an empty list if there's no catalogue or this survey has no footprint
+        """
+        gen = generations.current_generation()
+        if gen is None or None in (self.n_lat, self.s_lat, self.w_long, self.e_long):
+            return []
+        neighbours = gen.index('nearby').nearest(
+            self.centroid_lat, self.centroid_lon, k, gen.snapshot.index_of(self.survey_id))
+        return [(km, gen.snapshot.record(row)) for km, row in neighbours]
+
+    def render_nearby(self, mimetype, k):
+        """
+        Renders the nearby view: the k surveys nearest this one, as HTML or GeoJSON
+
+        :return: a Flask Response
+        """
+        from model import nearby
+
+        gen = generations.current_generation()
+        if gen is None:
+            return Response('The survey catalogue has not been harvested yet.', status=503, mimetype='text/plain')
+        if self.survey_name is None:
+            return Response('Survey with ID {} not found.'.format(self.survey_id), status=404, mimetype='text/plain')
+        if None in (self.n_lat, self.s_lat, self.w_long, self.e_long):
+            return Response('Survey {} has no footprint.'.format(self.survey_id), status=404, mimetype='text/plain')
+        return nearby.render(gen, self.centroid_lat, self.centroid_lon, k, mimetype, self.survey_id)
+
+    def render_head(self, view, mimetype):
+        """
+        Answers a HEAD request without getting this survey's data from the API, if the catalogue says what a GET would:
+        that the survey exists. Otherwise, e.g. if there's no catalogue or the survey isn't in it but may be in ARGUS,
+        or for the nearby view, which depends on the survey's footprint, a GET's response is needed, without its body.
+
+        :return: a Flask Response with no body, or None if the GET response is needed
+        """
+        if view == 'argus':
+            return redirect(_config.XML_API_URL_SURVEY.format(self.survey_id), code=303)
+
+        gen = generations.current_generation()
+        if view == 'nearby' or gen is None:
+            return None
+        record = gen.get_record(self.survey_id)
+        if record is None or record.survey_name is None:
+            return None
+        return Response(status=200, mimetype=mimetype)
+
     def validate_xml(self, xml):
         parser = etree.XMLParser(dtd_validation=False)
 
@@ -106,23 +207,27 @@ class SurveyRenderer:
 
     def _populate_from_oracle_api(self, survey_id):
         """
-        Populates this instance with data from the Oracle ARGUS table API
+        Populates this instance with data from the Oracle ARGUS table API, over a pooled connection, or from the
+        records recently got from it
         """
-        # internal URI
-        # os.environ['NO_PROXY'] = 'ga.gov.au'
-        # call API
-        r = requests.get(_config.XML_API_URL_SURVEY.format(survey_id))
-        # deal with missing XML declaration
-        if "No data" in r.text:
+        record = upstream.get_record(SURVEY, survey_id)
+        if record is None:
             raise ParameterError('No Data')
 
-        xml = r.text
+        for attr, value in record.items():
+            if attr != 'survey_id':
+                setattr(self, attr, value)
+        return True
 
-        if self.validate_xml(xml):
-            self._populate_from_xml_file(xml)
-            return True
-        else:
-            return False
+    def _populate_from_record(self, record):
+        """
+        Populates this instance with data from a catalogue snapshot record
+
+        :param record: a model.catalogue.SurveyRecord
+        :return: None
+        """
+        for _, attr, _ in catalogue.SURVEY_FIELDS[1:]:
+            setattr(self, attr, getattr(record, attr))
 
     def _populate_from_xml_file(self, xml):
         """
@@ -172,71 +277,12 @@ class SurveyRenderer:
             </ROW>
         </ROWSET>
         '''
-        # turn the XML doc into a Python object
-        root = objectify.fromstring(xml)
-
-        if hasattr(root.ROW, 'SURVEYNAME'):
-            self.survey_name = root.ROW.SURVEYNAME
-        if hasattr(root.ROW, 'STATE'):
-            self.state = root.ROW.STATE
-        if hasattr(root.ROW, 'OPERATOR'):
-            self.operator = root.ROW.OPERATOR
-        if hasattr(root.ROW, 'CONTRACTOR'):
-            self.contractor = root.ROW.CONTRACTOR
-        if hasattr(root.ROW, 'PROCESSOR'):
-            self.processor = root.ROW.PROCESSOR
-        if hasattr(root.ROW, 'SURVEY_TYPE'):
-            self.survey_type = root.ROW.SURVEY_TYPE
-        if hasattr(root.ROW, 'DATATYPES'):
-            self.data_types = root.ROW.DATATYPES
-        if hasattr(root.ROW, 'VESSEL'):
-            self.vessel = root.ROW.VESSEL
-        if hasattr(root.ROW, 'VESSEL_TYPE'):
-            self.vessel_type = root.ROW.VESSEL_TYPE
-        if hasattr(root.ROW, 'RELEASEDATE'):
-            self.release_date = datetime.strptime(root.ROW.RELEASEDATE.text, "%Y-%m-%dT%H:%M:%S") if root.ROW.RELEASEDATE.text is not None else None
-        if hasattr(root.ROW, 'ONSHORE_OFFSHORE'):
-            self.onshore_offshore = root.ROW.ONSHORE_OFFSHORE
-        if hasattr(root.ROW, 'STARTDATE'):
-            self.start_date = datetime.strptime(root.ROW.STARTDATE.text, "%Y-%m-%dT%H:%M:%S") if root.ROW.STARTDATE.text is not None else None
-        if hasattr(root.ROW, 'ENDDATE'):
-            self.end_date = datetime.strptime(root.ROW.ENDDATE.text, "%Y-%m-%dT%H:%M:%S") if root.ROW.ENDDATE.text is not None else None
-        if hasattr(root.ROW, 'WLONG'):
-            self.w_long = root.ROW.WLONG
-        if hasattr(root.ROW, 'ELONG'):
-            self.e_long = root.ROW.ELONG
-        if hasattr(root.ROW, 'SLAT'):
-            self.s_lat = root.ROW.SLAT
-        if hasattr(root.ROW, 'NLAT'):
-            self.n_lat = root.ROW.NLAT
-        if hasattr(root.ROW, 'LINE_KM'):
-            self.line_km = root.ROW.LINE_KM
-        if hasattr(root.ROW, 'TOTAL_KM'):
-            self.total_km = root.ROW.TOTAL_KM
-        if hasattr(root.ROW, 'LINE_SPACING'):
-            self.line_spacing = root.ROW.LINE_SPACING
-        if hasattr(root.ROW, 'LINE_DIRECTION'):
-            self.line_direction = root.ROW.LINE_DIRECTION
-        if hasattr(root.ROW, 'TIE_SPACING'):
-            self.tie_spacing = root.ROW.TIE_SPACING
-        if hasattr(root.ROW, 'SQUARE_KM'):
-            self.square_km = root.ROW.SQUARE_KM
-        if hasattr(root.ROW, 'CRYSTAL_VOLUME'):
-            self.crystal_volume = root.ROW.CRYSTAL_VOLUME
-        if hasattr(root.ROW, 'UP_CRYSTAL_VOLUME'):
-            self.up_crystal_volume = root.ROW.UP_CRYSTAL_VOLUME
-        if hasattr(root.ROW, 'DIGITAL_DATA'):
-            self.digital_data = root.ROW.DIGITAL_DATA
-        if hasattr(root.ROW, 'GEODETIC_DATUM'):
-            self.geodetic_datum = root.ROW.GEODETIC_DATUM
-        if hasattr(root.ROW, 'ASL'):
-            self.asl = root.ROW.ASL
-        if hasattr(root.ROW, 'AGL'):
-            self.agl = root.ROW.AGL
-        if hasattr(root.ROW, 'MAG_INSTRUMENT'):
-            self.mag_instrument = root.ROW.MAG_INSTRUMENT
-        if hasattr(root.ROW, 'RAD_INSTRUMENT'):
-            self.rad_instrument = root.ROW.RAD_INSTRUMENT
+        # read the XML doc in one pass, with the same value types as catalogue snapshot records
+        rows = catalogue.parse_rows(xml)
+        if len(rows) > 0:
+            for attr, value in rows[0].items():
+                if attr != 'survey_id':
+                    setattr(self, attr, value)
 
     def _generate_survey_gml(self):
         if self.z is not None:
@@ -253,6 +299,14 @@ class SurveyRenderer:
 
         return gml
 
+    @staticmethod
+    def _agent_node(name):
+        """
+        :return: the URIRef of the agent with a name (see model/agents.py), or a BNode if there's no name
+        """
+        uri = agent_uri(name)
+        return URIRef(uri) if uri is not None else BNode()
+
     def export_rdf(self, model_view='default', rdf_mime='text/turtle'):
         """
         Exports this instance in RDF, according to a given model from the list of supported models,
@@ -264,9 +318,24 @@ class SurveyRenderer:
             'trix', 'turtle', 'xml'], from http://rdflib3.readthedocs.io/en/latest/plugin_serializers.html
         :return: RDF string
         """
+        rdf_format = LDAPI.get_rdf_parser_for_mimetype(rdf_mime)
+        if rdf_format == 'json-ld' and model_view in jsonld.VIEWS:
+            # compacted JSON-LD straight from this survey's values, much faster than rdflib's json-ld serializer
+            return jsonld.survey_jsonld(self, model_view)
+        return self.make_graph(model_view).serialize(format=rdf_format)
+
+    def make_graph(self, model_view='default', g=None):
+        """
+        Makes an RDF graph of this instance according to a given model from the list of supported models
+
+        :param model_view: string of one of the model controller names available for Sample objects
+        :param g: an empty rdflib Graph to add to, by default a new Graph
+        :return: an rdflib Graph
+        """
 
         # things that are applicable to all model views; the graph and some namespaces
-        g = Graph()
+        if g is None:
+            g = Graph()
 
         # URI for this survey
         base_uri = 'http://pid.geoscience.gov.au/survey/ga/'
@@ -292,9 +361,9 @@ class SurveyRenderer:
             # Activity properties
             # TODO: add in label, startedAtTime, endedAtTime, atLocation
 
-            # Agents
+            # Agents, with URIs so that they are the same agents in every survey
             contractor = BNode()
-            contractor_agent = BNode()
+            contractor_agent = SurveyRenderer._agent_node(self.contractor)
             g.add((contractor_agent, RDF.type, PROV.Agent))
             g.add((contractor, RDF.type, PROV.Attribution))
             g.add((contractor, PROV.agent, contractor_agent))
@@ -303,7 +372,7 @@ class SurveyRenderer:
             g.add((this_survey, PROV.qualifiedAttribution, contractor))
 
             operator = BNode()
-            operator_agent = BNode()
+            operator_agent = SurveyRenderer._agent_node(self.operator)
             g.add((operator_agent, RDF.type, PROV.Agent))
             g.add((operator, RDF.type, PROV.Attribution))
             g.add((operator, PROV.agent, operator_agent))
@@ -312,7 +381,7 @@ class SurveyRenderer:
             g.add((this_survey, PROV.qualifiedAttribution, operator))
 
             processor = BNode()
-            processor_agent = BNode()
+            processor_agent = SurveyRenderer._agent_node(self.processor)
             g.add((processor_agent, RDF.type, PROV.Agent))
             g.add((processor, RDF.type, PROV.Attribution))
             g.add((processor, PROV.agent, processor_agent))
@@ -391,21 +460,22 @@ class SurveyRenderer:
 
             # Platform  # TODO: add lookup for 'Plane' etc to a vessel type vocab
             platform = BNode()
-            g.add((platform, RDF.type, URIRef('http://pid.geoscience.gov.au/platform/' + self.vessel_type)))
+            if self.vessel_type is not None:
+                g.add((platform, RDF.type, URIRef('http://pid.geoscience.gov.au/platform/' + quote(self.vessel_type))))
             g.add((platform, RDFS.subClassOf, SOSA.Platform))
             g.add((platform, RDFS.label, Literal(self.vessel, datatype=XSD.string)))
 
             # Sampler
             if self.mag_instrument is not None:
                 sampler_mag = BNode()
-                g.add((sampler_mag, RDF.type, URIRef(self.mag_instrument)))
+                g.add((sampler_mag, RDF.type, URIRef(SurveyRenderer.URI_INSTRUMENT + quote(self.mag_instrument))))
                 g.add((sampler_mag, RDFS.subClassOf, SOSA.Sampler))
                 g.add((sampler_mag, SOSA.madeSampling, this_survey))  # associate # TODO: resolve double madeSampling
                 g.add((sampler_mag, SOSA.isHostedBy, platform))  # associate
 
             if self.rad_instrument is not None:
                 sampler_rad = BNode()
-                g.add((sampler_rad, RDF.type, URIRef(self.rad_instrument)))
+                g.add((sampler_rad, RDF.type, URIRef(SurveyRenderer.URI_INSTRUMENT + quote(self.rad_instrument))))
                 g.add((sampler_rad, RDFS.subClassOf, SOSA.Sampler))
                 g.add((sampler_rad, SOSA.madeSampling, this_survey))  # associate
                 g.add((sampler_rad, SOSA.isHostedBy, platform))  # associate
@@ -435,7 +505,7 @@ class SurveyRenderer:
             g.add((geometry, GEOSP.asWKT, Literal(self.wkt_polygon, datatype=GEOSP.wktLiteral)))
             g.add((sample, GEOSP.hasGeometry, geometry))  # associate
 
-        return g.serialize(format=LDAPI.get_rdf_parser_for_mimetype(rdf_mime))
+        return g
 
     # TODO: split these RDF --> SVG parts into a stand-alone module
     def __graph_preconstruct(self, g):
@@ -608,6 +678,7 @@ class SurveyRenderer:
                 operator=self.operator,
                 contractor=self.contractor,
                 processor=self.processor,
+                agent_uri=agent_uri,
                 survey_type=self.survey_type,
                 data_types=self.data_types,
                 vessel=self.vessel,
@@ -630,7 +701,8 @@ class SurveyRenderer:
                 agl=self.agl,
                 mag_instrument=self.mag_instrument,
                 rad_instrument=self.rad_instrument,
-                wkt_polygon=self.wkt_polygon
+                wkt_polygon=self.wkt_polygon,
+                nearby=self.nearby_surveys(_config.NEARBY_K)
             )
         elif model_view == 'prov':
             prov_turtle = self.export_rdf('prov', 'text/turtle')
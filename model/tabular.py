@@ -0,0 +1,154 @@
+"""
+The survey catalogue as tables, for analysts' tools such as pandas: streamed CSV and a Parquet file
+
+Both have a column for the survey ID and each of the 31 ARGUS fields, named as per model.catalogue.SURVEY_FIELDS, and
+are read straight from the snapshot's columns, each distinct string decoded once, rather than survey by survey.
+
+CSV is streamed a batch of rows at a time, of the whole catalogue or the surveys chosen as for GeoJSON (see
+model/geojson.py). The Parquet file, written with pyarrow if it's installed, has typed columns: int32 IDs, float64
+measurements, date32 dates and dictionary-encoded strings. It's written to PARQUET_FILE after each harvest that changes
+the catalogue, by model.catalogue.write_derived_files(), or by running
+
+    python -m model.tabular --output surveys.parquet
+
+never by a request, and served as a file, so that clients can revalidate it and fetch ranges of it.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import time
+from datetime import date
+from os.path import dirname, abspath
+from model import catalogue
+import _config
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CSV_MIMETYPE = 'text/csv'
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+
+# CSV rows are streamed in batches of this many
+BATCH_SIZE = 1000
+
+
+def _column_formatter(snapshot, kind):
+    """
+    :return: a function of a column value to its CSV text, as a SurveyRecord attribute would give it
+    """
+    if kind == catalogue.STR:
+        strings = {0: ''}
+
+        def format_value(ref):
+            s = strings.get(ref)
+            if s is None:
+                s = strings[ref] = snapshot.string(ref)
+            return s
+    elif kind == catalogue.DATE:
+        def format_value(ordinal):
+            return date.fromordinal(ordinal).isoformat() if ordinal != 0 else ''
+    elif kind == catalogue.FLOAT:
+        def format_value(v):
+            if math.isnan(v):
+                return ''
+            return str(int(v)) if v.is_integer() else repr(v)
+    else:
+        format_value = str
+    return format_value
+
+
+def csv_rows(snapshot, rows=None):
+    """
+    Streams surveys as CSV, with a header row
+
+    :param snapshot: a model.catalogue.CatalogueSnapshot
+    :param rows: the record indexes of the surveys, e.g. as per model.geojson.matching_rows(), None for all of them
+    :return: a generator of UTF-8 bytes
+    """
+    if rows is None:
+        rows = range(len(snapshot))
+    columns = [(snapshot.columns[attr], _column_formatter(snapshot, kind)) for _, attr, kind in catalogue.SURVEY_FIELDS]
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\r\n')
+    writer.writerow([attr for _, attr, _ in catalogue.SURVEY_FIELDS])
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        writer.writerows(zip(*([format_value(column[i]) for i in batch] for column, format_value in columns)))
+        yield out.getvalue().encode('utf-8')
+        out.seek(0)
+        out.truncate()
+    if out.tell() > 0:
+        yield out.getvalue().encode('utf-8')
+
+
+def arrow_table(snapshot):
+    """
+    :return: a pyarrow Table of every survey in a catalogue snapshot, with a typed column per field
+    """
+    arrays = []
+    for _, attr, kind in catalogue.SURVEY_FIELDS:
+        column = snapshot.columns[attr]
+        if kind == catalogue.STR:
+            # the column's refs, 0 for none, index a dictionary of the distinct strings used
+            refs = sorted(set(column) - {0})
+            codes = {ref: code for code, ref in enumerate(refs)}
+            arrays.append(pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array([codes.get(ref) for ref in column], type=pyarrow.int32()),
+                pyarrow.array([snapshot.string(ref) for ref in refs], type=pyarrow.string())
+            ))
+        elif kind == catalogue.DATE:
+            # date32 is days since 1970-01-01
+            epoch = date(1970, 1, 1).toordinal()
+            arrays.append(pyarrow.array([v - epoch if v != 0 else None for v in column], type=pyarrow.date32()))
+        elif kind == catalogue.FLOAT:
+            arrays.append(pyarrow.array(column.tolist(), type=pyarrow.float64(), from_pandas=True))
+        else:
+            arrays.append(pyarrow.array(column.tolist(), type=pyarrow.int32()))
+    return pyarrow.Table.from_arrays(arrays, names=[attr for _, attr, _ in catalogue.SURVEY_FIELDS])
+
+
+def write_parquet(path, snapshot_path=_config.CATALOGUE_SNAPSHOT):
+    """
+    Writes a Parquet file of a catalogue snapshot, atomically replacing any existing one
+
+    :return: the number of surveys written
+    """
+    snapshot = catalogue.CatalogueSnapshot(snapshot_path)
+    table = arrow_table(snapshot)
+    os.makedirs(dirname(abspath(path)), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        pyarrow.parquet.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return len(snapshot)
+
+
+def get_parquet_file(path=_config.PARQUET_FILE):
+    """
+    :return: the path of the Parquet file of the catalogue, if one has been written, else None. It's written after each
+        harvest (see model.catalogue.write_derived_files()), never by a request.
+    """
+    return path if os.path.exists(path) else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes the survey catalogue as a Parquet file')
+    parser.add_argument('--output', default=_config.PARQUET_FILE, help='the Parquet file')
+    parser.add_argument('--snapshot', default=_config.CATALOGUE_SNAPSHOT, help='the catalogue snapshot file')
+    args = parser.parse_args()
+
+    if pyarrow is None:
+        raise SystemExit('Writing Parquet needs pyarrow: pip install pyarrow')
+    start = time.time()
+    n = write_parquet(args.output, args.snapshot)
+    print('Wrote {:,} surveys to {} ({:,} bytes) in {:.1f}s'.format(
+        n, args.output, os.path.getsize(args.output), time.time() - start))
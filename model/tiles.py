@@ -0,0 +1,265 @@
+"""
+Web map tiles, /survey/tiles/{z}/{x}/{y}, of survey footprints, for showing many surveys at once on a slippy map
+
+Tiles are in the usual Web Mercator z/x/y scheme. Each survey's bounding box is given the quadkey of the smallest tile,
+down to TILES_INDEX_ZOOM, that contains it entirely: its home tile. The surveys in any tile are then those homed in the
+tile itself or in one of its descendants, a contiguous range of the sorted quadkeys, plus those homed in one of its few
+ancestors, each a dictionary lookup, so finding a tile's surveys never scans the catalogue.
+
+At zooms up to TILES_CLUSTER_MAX_ZOOM, surveys are too dense to draw one by one, so a tile gives clusters instead: the
+centroids of the surveys centred in the tile are grouped by a grid of TILES_CLUSTER_CELL_PIXELS cells, each non-empty
+cell a point of its surveys' mean centroid and count. Deeper tiles give each survey's footprint polygon.
+
+Tiles are Mapbox Vector Tiles, if the mapbox_vector_tile package is installed, or compact GeoJSON, its coordinates
+rounded to about a pixel at the tile's zoom. Tiles are cached per catalogue Generation.
+"""
+import json
+import math
+from bisect import bisect_left
+from array import array
+from model import checkpoint, generations
+from model.cache import LRUCache
+import _config
+
+try:
+    import mapbox_vector_tile
+except ImportError:
+    mapbox_vector_tile = None
+
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+GEOJSON_MIMETYPE = 'application/geo+json'
+# the formats tiles can be had in, the default first
+MIMETYPES = [MVT_MIMETYPE, GEOJSON_MIMETYPE] if mapbox_vector_tile is not None else [GEOJSON_MIMETYPE]
+
+TILE_SIZE = 256  # pixels
+MVT_EXTENT = 4096
+MVT_BUFFER = 64  # tile units beyond the tile's edges that footprints are clipped to
+MAX_LATITUDE = 85.0511287798  # the latitude of Web Mercator's square world's edges
+
+tile_cache = LRUCache(max_items=_config.TILES_CACHE_ITEMS)
+checkpoint.register('tiles', tile_cache, per_generation=True)
+
+
+def world_pixel(lon, lat, z):
+    """
+    :return: the (x, y) Web Mercator pixel coordinates of a point at a zoom, with y down from the world's top edge
+    """
+    size = TILE_SIZE * 2 ** z
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180) / 360 * size
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * size
+    return x, y
+
+
+def tile_of(lon, lat, z):
+    """
+    :return: the (x, y) of the tile at zoom z containing a point
+    """
+    x, y = world_pixel(lon, lat, z)
+    last = 2 ** z - 1
+    return min(last, max(0, int(x // TILE_SIZE))), min(last, max(0, int(y // TILE_SIZE)))
+
+
+def tile_bounds(z, x, y):
+    """
+    :return: the (west, south, east, north) bounds of a tile in decimal degrees
+    """
+    n = 2 ** z
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def quadkey(z, x, y):
+    """
+    :return: a tile's quadkey, e.g. '3102' for 4/13/9, '' for the single tile at zoom 0
+    """
+    digits = []
+    for i in range(z, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def home_quadkey(w, s, e, n, max_zoom=_config.TILES_INDEX_ZOOM):
+    """
+    :return: the quadkey of the smallest tile, to max_zoom, containing a bounding box
+    """
+    nw = quadkey(max_zoom, *tile_of(w, n, max_zoom))
+    se = quadkey(max_zoom, *tile_of(e, s, max_zoom))
+    length = 0
+    while length < max_zoom and nw[length] == se[length]:
+        length += 1
+    return nw[:length]
+
+
+class TileIndex:
+    """
+    The surveys of a catalogue snapshot, by the quadkeys of their home tiles
+    """
+
+    def __init__(self, snapshot):
+        w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+        s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+        homes = []
+        for i in range(len(snapshot)):
+            w, s, e, n = w_long[i], s_lat[i], e_long[i], n_lat[i]
+            # NaN, no footprint, fails every comparison
+            if w <= e and s <= n:
+                homes.append((home_quadkey(w, s, e, n), i))
+        homes.sort()
+        self.quadkeys = [qk for qk, _ in homes]
+        self.rows = array('i', (i for _, i in homes))
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.rows)
+
+    def candidates(self, z, x, y):
+        """
+        :return: the record indexes of the surveys that may intersect a tile: those homed in it, its descendants or its
+            ancestors
+        """
+        qk = quadkey(z, x, y)
+        # '4' sorts after the quadkey digits 0-3, so [qk, qk + '4') is the tile and all its descendants
+        rows = list(self.rows[bisect_left(self.quadkeys, qk):bisect_left(self.quadkeys, qk + '4')])
+        for length in range(len(qk)):
+            ancestor = qk[:length]
+            start = bisect_left(self.quadkeys, ancestor)
+            stop = start
+            while stop < len(self.quadkeys) and self.quadkeys[stop] == ancestor:
+                stop += 1
+            rows.extend(self.rows[start:stop])
+        return rows
+
+
+@generations.register_index('tiles')
+def build_tile_index(snapshot, previous):
+    return TileIndex(snapshot)
+
+
+def clusters(snapshot, rows, z, x, y, cell=_config.TILES_CLUSTER_CELL_PIXELS):
+    """
+    Groups the surveys centred in a tile by a grid of cells
+
+    :return: a list of (lon, lat, survey IDs) clusters
+    """
+    w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+    s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+    ids = snapshot.columns['survey_id']
+    cells = {}
+    for i in rows:
+        lon = (w_long[i] + e_long[i]) / 2
+        lat = (s_lat[i] + n_lat[i]) / 2
+        px, py = world_pixel(lon, lat, z)
+        px -= x * TILE_SIZE
+        py -= y * TILE_SIZE
+        if 0 <= px < TILE_SIZE and 0 <= py < TILE_SIZE:
+            cells.setdefault((int(px // cell), int(py // cell)), []).append((lon, lat, ids[i]))
+    result = []
+    for key in sorted(cells):
+        members = cells[key]
+        result.append((
+            sum(m[0] for m in members) / len(members),
+            sum(m[1] for m in members) / len(members),
+            [m[2] for m in members]
+        ))
+    return result
+
+
+def footprints(snapshot, rows, bounds):
+    """
+    :return: a list of (west, south, east, north, survey ID) footprints of the surveys that intersect a tile's bounds
+    """
+    w_long, e_long = snapshot.columns['w_long'], snapshot.columns['e_long']
+    s_lat, n_lat = snapshot.columns['s_lat'], snapshot.columns['n_lat']
+    ids = snapshot.columns['survey_id']
+    tw, ts, te, tn = bounds
+    return sorted(
+        (w_long[i], s_lat[i], e_long[i], n_lat[i], ids[i]) for i in rows
+        if w_long[i] <= te and e_long[i] >= tw and s_lat[i] <= tn and n_lat[i] >= ts
+    )
+
+
+def _geojson_tile(z, tile_clusters, tile_footprints):
+    # about one pixel at this zoom
+    precision = max(0, math.ceil(math.log10(TILE_SIZE * 2 ** z / 360)))
+    features = []
+    for lon, lat, survey_ids in tile_clusters:
+        properties = {'count': len(survey_ids)}
+        if len(survey_ids) == 1:
+            properties['id'] = survey_ids[0]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lon, precision), round(lat, precision)]},
+            'properties': properties,
+        })
+    for w, s, e, n, survey_id in tile_footprints:
+        w, s, e, n = (round(v, precision) for v in (w, s, e, n))
+        features.append({
+            'type': 'Feature',
+            'id': survey_id,
+            'geometry': {'type': 'Polygon', 'coordinates': [[[w, s], [e, s], [e, n], [w, n], [w, s]]]},
+        })
+    return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')).encode('utf-8')
+
+
+def _mvt_tile(z, x, y, tile_clusters, tile_footprints):
+    scale = MVT_EXTENT / TILE_SIZE
+
+    def tile_point(lon, lat):
+        # mapbox_vector_tile takes y up from the tile's bottom edge
+        px, py = world_pixel(lon, lat, z)
+        return (px - x * TILE_SIZE) * scale, MVT_EXTENT - (py - y * TILE_SIZE) * scale
+
+    def clip(v):
+        return max(-MVT_BUFFER, min(MVT_EXTENT + MVT_BUFFER, v))
+
+    features = []
+    for lon, lat, survey_ids in tile_clusters:
+        properties = {'count': len(survey_ids)}
+        if len(survey_ids) == 1:
+            properties['id'] = survey_ids[0]
+        features.append({'geometry': 'POINT({} {})'.format(*tile_point(lon, lat)), 'properties': properties})
+    for w, s, e, n, survey_id in tile_footprints:
+        # a bounding box is a rectangle in Web Mercator too, so clipping it to the tile is clamping its corners
+        left, bottom = (clip(v) for v in tile_point(w, s))
+        right, top = (clip(v) for v in tile_point(e, n))
+        features.append({
+            'geometry': 'POLYGON(({0} {1}, {2} {1}, {2} {3}, {0} {3}, {0} {1}))'.format(left, bottom, right, top),
+            'properties': {'id': survey_id},
+        })
+    return mapbox_vector_tile.encode([{'name': 'surveys', 'features': features}])
+
+
+def make_tile(index, z, x, y, mimetype):
+    """
+    Makes a tile of survey clusters, at low zooms, or footprints
+
+    :param index: a TileIndex
+    :param mimetype: one of MIMETYPES
+    :return: the tile's bytes
+    """
+    rows = index.candidates(z, x, y)
+    if z <= _config.TILES_CLUSTER_MAX_ZOOM:
+        tile_clusters, tile_footprints = clusters(index.snapshot, rows, z, x, y), []
+    else:
+        tile_clusters, tile_footprints = [], footprints(index.snapshot, rows, tile_bounds(z, x, y))
+    if mimetype == MVT_MIMETYPE:
+        return _mvt_tile(z, x, y, tile_clusters, tile_footprints)
+    return _geojson_tile(z, tile_clusters, tile_footprints)
+
+
+def get_tile(generation, z, x, y, mimetype):
+    """
+    :return: a tile of a catalogue Generation, from the cache if it has been made before
+    """
+    key = (generation.number, z, x, y, mimetype)
+    tile = tile_cache.get(key)
+    if tile is None:
+        tile = make_tile(generation.index('tiles'), z, x, y, mimetype)
+        tile_cache.set(key, tile)
+    return tile
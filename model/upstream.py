@@ -0,0 +1,128 @@
+"""
+The Oracle XML APIs behind this API, ARGUS's and the entities', and the records got from them
+
+Every call to them goes through one pooled requests Session per process, so keep-alive connections are reused rather
+than one opened per call. A RecordType is all that's needed to read a kind of record: the API URLs of one record and of
+a page of the register, and the (XML element, attribute, type) fields of its ROWs, which
+model.catalogue.parse_rows() reads in one pass. Records are kept, for UPSTREAM_CACHE_SECONDS, in an LRU cache shared by
+every record type, as are the IDs the APIs have no record of, so that a record is got from its API at most once in that
+time however often it's asked for.
+"""
+import logging
+import os
+import threading
+import requests
+from lxml import etree
+from model import catalogue, checkpoint
+from model.cache import LRUCache
+import _config
+
+
+class RecordType:
+    """
+    A kind of record the XML APIs deliver, e.g. a survey or an entity
+    """
+
+    def __init__(self, name, label, fields, url, register_url, base_uri):
+        """
+        :param name: the record type's name, e.g. 'survey'
+        :param label: its name for people, e.g. 'Survey'
+        :param fields: a list of (XML element, attribute, type) of the record's ID and then its other fields, as per
+            model.catalogue.SURVEY_FIELDS
+        :param url: the API URL of one record, formatted with its ID
+        :param register_url: the API URL of a page of the register of records, formatted with the page number and
+            page size, or '' if the API has none
+        :param base_uri: the base of the records' URIs
+        """
+        self.name = name
+        self.label = label
+        self.fields = fields
+        self.fields_by_tag = {tag: (attr, kind) for tag, attr, kind in fields}
+        self.id_tag = fields[0][0]
+        self.attributes = frozenset(attr for _, attr, _ in fields[1:])
+        self.url = url
+        self.register_url = register_url
+        self.base_uri = base_uri
+
+
+def new_session(pool_size=_config.UPSTREAM_POOL_SIZE):
+    """
+    :return: a requests Session keeping up to pool_size connections to each host alive
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# (record type name, record ID) -> the record dict, or {} if the API has no such record
+records = LRUCache(_config.UPSTREAM_CACHE_ITEMS, _config.UPSTREAM_CACHE_SECONDS)
+checkpoint.register('records', records)
+# the calls made to the APIs by this process, other than the harvester's
+calls = 0
+
+
+def session():
+    """
+    :return: this process's pooled Session. A worker forked from a preloaded master makes its own rather than sharing
+        the master's sockets.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = new_session()
+                _session_pid = os.getpid()
+    return _session
+
+
+def get(url):
+    """
+    :return: the requests Response of a GET of an API URL, over a pooled connection
+    :raises requests.RequestException: if the API can't be reached, doesn't answer in time or answers with an error
+    """
+    global calls
+    calls += 1
+    r = session().get(url, timeout=_config.UPSTREAM_TIMEOUT_SECONDS)
+    r.raise_for_status()
+    return r
+
+
+def parse_record(record_type, xml):
+    """
+    :param xml: an API's answer to a call for one record, bytes
+    :return: the record's dict of attribute name to value, as per model.catalogue.parse_rows(), or {} if the API said
+        it has no such record or its answer can't be read
+    """
+    # the APIs answer "No data found", not XML, for IDs they don't know
+    if b'No data' in xml[:100]:
+        return {}
+    try:
+        rows = catalogue.parse_rows(xml, record_type.fields_by_tag)
+    except etree.XMLSyntaxError as e:
+        logging.warning('Could not read a {} from the XML API: {}'.format(record_type.name, e))
+        return {}
+    return rows[0] if rows else {}
+
+
+def get_record(record_type, record_id):
+    """
+    Gets a record from its API, or from the cache of records got recently
+
+    :param record_type: a RecordType
+    :param record_id: the record's ID
+    :return: the record's dict of attribute name to value, as per model.catalogue.parse_rows(), or None if the API has
+        no such record. The dict is shared, so mustn't be changed.
+    :raises requests.RequestException: if the API can't be reached or answers with an error, which isn't cached
+    """
+    key = (record_type.name, str(record_id))
+    record = records.get(key)
+    if record is None:
+        record = parse_record(record_type, get(record_type.url.format(record_id)).content)
+        records.set(key, record)
+    return record or None